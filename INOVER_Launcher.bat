@@ -51,6 +51,11 @@ if not exist "%STREAMLIT%app_acc.py" (
     exit /b 1
 )
 
+:: Import automatique des exports MES déposés dans le dossier depot_mes
+if exist "%STREAMLIT%watcher.py" (
+    start "INOVER - Import automatique" /min python "%STREAMLIT%watcher.py"
+)
+
 streamlit run "%STREAMLIT%app_acc.py"
 pause
 exit
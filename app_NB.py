@@ -3,6 +3,9 @@ import plotly.express as px
 import streamlit as st
 import subprocess
 import sys
+from ingest import ingest_report
+from periods import current_period, make_period, weeks_in_year
+from store import load_week
 
 # Interface utilisateur
 
@@ -32,10 +35,15 @@ if st.button("Analyse des arrêts"):
 
 # Formulaire de saisie
 with st.sidebar.form(key='form1'):
-    # Sélecteur de semaine (1 à 52)
-    week = st.selectbox("Numéro de semaine", options=list(range(1, 53)), index=None, placeholder="Sélectionnez la semaine")
+    # Sélecteurs d'année et de semaine ISO (1 à 52, ou 53 certaines années)
+    year = st.number_input("Année", min_value=2000, max_value=2100, value=current_period().year)
+    week = st.selectbox("Numéro de semaine", options=list(range(1, 54)), index=None, placeholder="Sélectionnez la semaine")
     
     TO = st.number_input("Temps d'ouverture (heures)", value=8235)
+    replace = st.checkbox("Remplacer la semaine enregistrée", value=False,
+                          help="Enregistre ce fichier et ce TO à la place de la semaine déjà importée, "
+                               "arrêts ajoutés par les exports journaliers compris. Sinon, le rapport "
+                               "est affiché sans modifier l'historique")
     datafile = st.file_uploader("Importer un fichier Excel", type=['xlsx'])
     submit_button = st.form_submit_button(label='Générer le rapport')
 
@@ -44,37 +52,27 @@ with st.sidebar.form(key='form1'):
         st.session_state.week = week
 
 # Traitement des données et affichage des résultats
-if submit_button and datafile is not None:
+if submit_button and datafile is not None and week is None:
+    st.warning("Sélectionnez la semaine correspondant au fichier")
+elif submit_button and datafile is not None and week > weeks_in_year(year):
+    st.warning(f"La semaine {week} n'existe pas en {year}")
+elif submit_button and datafile is not None:
     # Mettre à jour le titre avec le numéro de semaine
     st.title(f"Rapport de Maintenance - Semaine {week}")
     
-    # Charger les données
-    df = pd.read_excel(datafile, header=9, usecols='B:X')
-
-    # Nettoyer les données
-    df1 = df.dropna(how='all', axis=1)
-
-    # Supprimer les lignes inutiles (PREVENTIVE MAINTENANCE et DEMARRAGE PARC)
-    df1['Type Of Failure'] = df1['Type Of Failure'].str.strip()
-    indexes = df1[
-        (df1['Type Of Failure'] == 'DEMARRAGE PARC') | 
-        (df1['Type Of Failure'] == 'PREVENTIVE MAINTENANCE')
-    ].index
-    df2 = df1.drop(indexes, inplace=False).copy()
-
-    # Supprimer la dernière ligne (si elle est inutile)
-    df3 = df2.drop(index=df2.index[-1], axis=0)
-
-    # Convertir les colonnes de temps
-    df3['Down Time'] = pd.to_datetime(df3['Down Time'], format="%H:%M:%S")
-    df3['Delay Time'] = pd.to_datetime(df3['Delay Time'], format="%H:%M:%S")
-
-    # Convertir les temps en heures décimales
-    df3['Down Time'] = round((df3['Down Time'].dt.hour + df3['Down Time'].dt.minute/60 + df3['Down Time'].dt.second/3600), 2)
-    df3['Delay Time'] = round((df3['Delay Time'].dt.hour + df3['Delay Time'].dt.minute/60 + df3['Delay Time'].dt.second/3600), 2)
-
-    # Ajouter une nouvelle colonne 'T, I' (Temps d'intervention)
-    df3.insert(loc=11, column='T, I', value=(df3['Down Time'] - df3['Delay Time']))
+    # Importer le fichier via le pipeline commun : une semaine déjà enregistrée n'est
+    # remplacée que sur demande, sinon le rapport porte sur le fichier nettoyé
+    status, df3, warnings = ingest_report(datafile.getvalue(), make_period(year, week), TO, replace=replace)
+    for warning in warnings:
+        st.warning(warning)
+    if status == 'vide':
+        st.error("Aucune donnée valide dans le fichier")
+        st.stop()
+    if status == 'non enregistré':
+        st.warning(f"La semaine {week} est déjà enregistrée : ce rapport porte sur le fichier importé, "
+                   "qui n'a pas été enregistré. Cochez « Remplacer la semaine enregistrée » pour l'enregistrer.")
+    else:
+        df3, _ = load_week(make_period(year, week))
 
     # Calcul des indicateurs globaux
     TA = df3['Down Time'].sum()
@@ -98,9 +96,9 @@ if submit_button and datafile is not None:
 
     # --- NOUVEAU : Pareto empilé machines KOMAX par type de panne (basé sur NB) ---
     df_komax = df3[df3['Machine'].str.contains('KOMAX', na=False)]
-    df_grouped = df_komax.groupby(['Machine', 'Type Of Failure']).size().reset_index(name='NB')
+    df_grouped = df_komax.groupby(['Machine', 'Type Of Failure'], observed=True).size().reset_index(name='NB')
     df_grouped = df_grouped[df_grouped['NB'] > 0]
-    df_totals = df_grouped.groupby('Machine')['NB'].sum().reset_index().rename(columns={'NB': 'Total'})
+    df_totals = df_grouped.groupby('Machine', observed=True)['NB'].sum().reset_index().rename(columns={'NB': 'Total'})
     df_final = df_grouped.merge(df_totals, on='Machine')
     df_final = df_final.sort_values(by='Total', ascending=False)
 
@@ -110,7 +108,7 @@ if submit_button and datafile is not None:
     st.plotly_chart(fig_stacked)
 
     # Diagramme de Pareto des top 3 pannes (basé sur NB)
-    df_pareto = df3.groupby('Type Of Failure').size().reset_index(name='NB')
+    df_pareto = df3.groupby('Type Of Failure', observed=True).size().reset_index(name='NB')
     df_pareto = df_pareto.sort_values(by='NB', ascending=False).head(3)
     df_pareto['Cumulative Percentage'] = (df_pareto['NB'].cumsum() / df_pareto['NB'].sum()) * 100
 
@@ -133,7 +131,7 @@ if submit_button and datafile is not None:
     st.plotly_chart(fig_pareto)
 
     # Pie chart pour tous les défauts (basé sur NB)
-    df_all_failures = df3.groupby('Type Of Failure').size().reset_index(name='NB')
+    df_all_failures = df3.groupby('Type Of Failure', observed=True).size().reset_index(name='NB')
     df_all_failures = df_all_failures.sort_values('NB', ascending=False)
     
     fig_all_failures = px.pie(df_all_failures, 
@@ -153,7 +151,7 @@ if submit_button and datafile is not None:
     for composant in composants_specifiques:
         df_composant = df3[df3['Type Of Failure'] == composant]
         if not df_composant.empty:
-            df_defauts_composant = df_composant.groupby('Microstop Description').size().reset_index(name='NB')
+            df_defauts_composant = df_composant.groupby('Microstop Description', observed=True).size().reset_index(name='NB')
             df_defauts_composant = df_defauts_composant.sort_values(by='NB', ascending=False)
             df_defauts_composant['Cumulative Percentage'] = (df_defauts_composant['NB'].cumsum() / df_defauts_composant['NB'].sum()) * 100
 
@@ -171,7 +169,7 @@ if submit_button and datafile is not None:
     df_komax_indicateurs = df3[df3['Machine'].str.contains('KOMAX', na=False)].copy()
 
     # Calcul des indicateurs pour chaque machine
-    df_indicateurs_komax = df_komax_indicateurs.groupby('Machine').agg({
+    df_indicateurs_komax = df_komax_indicateurs.groupby('Machine', observed=True).agg({
         'Down Time': 'sum',
         'Delay Time': 'sum',
         'T, I': 'sum',
@@ -1,10 +1,13 @@
-import pandas as pd
 import plotly.express as px
 import streamlit as st
 import subprocess
 import sys
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
+from functools import partial
+from events import frame_rollup, rollup
+from ingest import ingest_report
+from periods import current_period, make_period, weeks_in_year
 
 # Configuration de la page
 st.set_page_config(layout="wide", page_title="Rapport de Maintenance")
@@ -64,8 +67,13 @@ if st.button("🔍 Analyse des arrêts"):
 # Formulaire de saisie
 with st.sidebar.form(key='form1'):
     st.markdown("### Paramètres d'analyse")
-    week = st.selectbox("Numéro de semaine", options=list(range(1, 53)), index=None, placeholder="Sélectionnez la semaine")
+    year = st.number_input("Année", min_value=2000, max_value=2100, value=current_period().year)
+    week = st.selectbox("Numéro de semaine", options=list(range(1, 54)), index=None, placeholder="Sélectionnez la semaine")
     TO = st.number_input("Temps d'ouverture (heures)", min_value=1, value=168)
+    replace = st.checkbox("Remplacer la semaine enregistrée", value=False,
+                          help="Enregistre ce fichier et ce TO à la place de la semaine déjà importée, "
+                               "arrêts ajoutés par les exports journaliers compris. Sinon, le rapport "
+                               "est affiché sans modifier l'historique")
     datafile = st.file_uploader("Importer le fichier Excel", type=['xlsx'], accept_multiple_files=False)
     submit_button = st.form_submit_button(label='🚀 Générer le rapport')
     
@@ -74,33 +82,35 @@ with st.sidebar.form(key='form1'):
         st.session_state.TO = TO
 
 # Traitement des données
-if submit_button and datafile is not None:
+if submit_button and datafile is not None and week is None:
+    st.warning("Sélectionnez la semaine correspondant au fichier")
+elif submit_button and datafile is not None and week > weeks_in_year(year):
+    st.warning(f"La semaine {week} n'existe pas en {year}")
+elif submit_button and datafile is not None:
     try:
-        # Chargement des données
-        df = pd.read_excel(datafile, header=9, usecols='B:X')
-        
-        # Nettoyage des données
-        df1 = df.dropna(how='all', axis=1)
-        df1['Type Of Failure'] = df1['Type Of Failure'].str.strip()
-        
-        # Suppression des lignes non pertinentes
-        indexes = df1[
-            (df1['Type Of Failure'] == 'DEMARRAGE PARC') | 
-            (df1['Type Of Failure'] == 'PREVENTIVE MAINTENANCE')
-        ].index
-        df2 = df1.drop(indexes, inplace=False).copy()
-        df3 = df2.drop(index=df2.index[-1], axis=0)
-        
-        # Conversion des temps
-        df3['Down Time'] = pd.to_datetime(df3['Down Time'], format="%H:%M:%S")
-        df3['Delay Time'] = pd.to_datetime(df3['Delay Time'], format="%H:%M:%S")
-        df3['Down Time'] = round((df3['Down Time'].dt.hour + df3['Down Time'].dt.minute/60 + df3['Down Time'].dt.second/3600), 2)
-        df3['Delay Time'] = round((df3['Delay Time'].dt.hour + df3['Delay Time'].dt.minute/60 + df3['Delay Time'].dt.second/3600), 2)
-        df3.insert(loc=11, column='T, I', value=(df3['Down Time'] - df3['Delay Time']))
+        # Import via le pipeline commun : une semaine déjà enregistrée n'est remplacée
+        # que sur demande, sinon le rapport porte sur le fichier nettoyé
+        status, df, warnings = ingest_report(datafile.getvalue(), make_period(year, week), TO, replace=replace)
+        for warning in warnings:
+            st.warning(warning)
+        if status == 'vide':
+            st.error("Aucune donnée valide dans le fichier")
+            st.stop()
+        # Regroupements de la semaine lus dans le cube de la base d'événements, ou
+        # calculés sur le fichier s'il n'a pas été enregistré
+        if status == 'non enregistré':
+            st.warning(f"La semaine {week} est déjà enregistrée : ce rapport porte sur le fichier importé, "
+                       "qui n'a pas été enregistré. Cochez « Remplacer la semaine enregistrée » pour l'enregistrer.")
+            group = partial(frame_rollup, df)
+        else:
+            group = partial(rollup, periods=[make_period(year, week).label])
+        df_failures = group('Type Of Failure')
+        df_komax = group('Machine', machine='KOMAX')
+        df_komax_failures = group('Type Of Failure', machine='KOMAX')
 
         # Calcul des indicateurs globaux
-        TA = df3['Down Time'].sum()
-        NB = df3['Down Time'].count()
+        TA = df_failures['Down Time'].sum()
+        NB = df_failures['NB'].sum()
         mtbf = (TO - TA) / NB if NB > 0 else 0
         mttr = TA / NB if NB > 0 else 0
         racio = (TA / TO) * 100 if TO > 0 else 0
@@ -143,20 +153,13 @@ if submit_button and datafile is not None:
         # =============================================
         # SECTION 2: Analyses KOMAX séparées
         # =============================================
-        df_komax = df3[df3['Machine'].str.contains('KOMAX', na=False, case=False)]
-        
         if not df_komax.empty:
             st.markdown("---")
             st.markdown("## 🏭 Analyse par machine KOMAX")
             
             # 1. Comparaison des indicateurs par machine KOMAX
             st.markdown("### 🔄 Comparaison des indicateurs par machine")
-            df_komax_metrics = df_komax.groupby('Machine').agg({
-                'Down Time': ['sum', 'count'],
-                'Delay Time': 'sum',
-                'T, I': 'sum'
-            }).reset_index()
-            
+            df_komax_metrics = df_komax[['Machine', 'Down Time', 'NB', 'Delay Time', 'T, I']].copy()
             df_komax_metrics.columns = ['Machine', 'Temps arrêt', 'Nb arrêts', 'Temps retard', 'Temps intervention']
             
             fig_metrics = go.Figure()
@@ -191,7 +194,7 @@ if submit_button and datafile is not None:
             
             # 2. Temps d'arrêt par machine KOMAX (séparé)
             st.markdown("### ⏱ Temps d'arrêt par machine KOMAX")
-            df_komax_ta = df_komax.groupby('Machine')['Down Time'].sum().reset_index().sort_values('Down Time', ascending=False)
+            df_komax_ta = df_komax[['Machine', 'Down Time']]
             
             fig_ta = px.bar(
                 df_komax_ta,
@@ -208,7 +211,7 @@ if submit_button and datafile is not None:
             
             # 3. Nombre d'arrêts par machine KOMAX (séparé)
             st.markdown("### 🔢 Nombre d'arrêts par machine KOMAX")
-            df_komax_nb = df_komax.groupby('Machine').size().reset_index(name='Count').sort_values('Count', ascending=False)
+            df_komax_nb = df_komax[['Machine', 'NB']].rename(columns={'NB': 'Count'}).sort_values('Count', ascending=False)
             
             fig_nb = px.bar(
                 df_komax_nb,
@@ -225,7 +228,7 @@ if submit_button and datafile is not None:
             
             # 4. Répartition des temps d'arrêt par type de défaillance KOMAX
             st.markdown("### 🥧 Répartition des temps d'arrêt (KOMAX)")
-            df_komax_ta_type = df_komax.groupby('Type Of Failure')['Down Time'].sum().reset_index()
+            df_komax_ta_type = df_komax_failures[['Type Of Failure', 'Down Time']]
             
             fig_ta_type = px.pie(
                 df_komax_ta_type,
@@ -244,7 +247,7 @@ if submit_button and datafile is not None:
             
             # 5. Répartition du nombre d'arrêts par type de défaillance KOMAX
             st.markdown("### 🍰 Répartition du nombre d'arrêts (KOMAX)")
-            df_komax_nb_type = df_komax.groupby('Type Of Failure').size().reset_index(name='Count')
+            df_komax_nb_type = df_komax_failures[['Type Of Failure', 'NB']].rename(columns={'NB': 'Count'})
             
             fig_nb_type = px.pie(
                 df_komax_nb_type,
@@ -269,10 +272,7 @@ if submit_button and datafile is not None:
             
             # 1. Pareto combiné par machine KOMAX
             st.markdown("#### 📌 Machines KOMAX")
-            df_komax_combined = df_komax.groupby('Machine').agg(
-                NB=('Down Time', 'count'),
-                TA=('Down Time', 'sum')
-            ).reset_index().sort_values('TA', ascending=False)
+            df_komax_combined = df_komax[['Machine', 'NB', 'Down Time']].rename(columns={'Down Time': 'TA'})
             
             fig_komax_combined = make_subplots(specs=[[{"secondary_y": True}]])
             
@@ -341,10 +341,8 @@ if submit_button and datafile is not None:
             
             # 2. Pareto combiné par type de panne KOMAX
             st.markdown("#### 📌 Types de panne KOMAX")
-            df_komax_type_combined = df_komax.groupby('Type Of Failure').agg(
-                NB=('Down Time', 'count'),
-                TA=('Down Time', 'sum')
-            ).reset_index().sort_values('TA', ascending=False).head(8)
+            df_komax_type_combined = df_komax_failures[['Type Of Failure', 'NB', 'Down Time']].rename(
+                columns={'Down Time': 'TA'}).head(8)
             
             fig_komax_type_combined = make_subplots(specs=[[{"secondary_y": True}]])
             
@@ -416,7 +414,7 @@ if submit_button and datafile is not None:
         
         # 1. Temps d'arrêt par type de panne (global)
         st.markdown("### ⏱ Top 10 - Temps d'arrêt par type de panne")
-        df_ta_global = df3.groupby('Type Of Failure')['Down Time'].sum().reset_index().sort_values('Down Time', ascending=False).head(10)
+        df_ta_global = df_failures[['Type Of Failure', 'Down Time']].head(10)
         
         fig_ta_global = px.bar(
             df_ta_global,
@@ -433,7 +431,7 @@ if submit_button and datafile is not None:
         
         # 2. Nombre d'arrêts par type de panne (global)
         st.markdown("### 🔢 Top 10 - Nombre d'arrêts par type de panne")
-        df_nb_global = df3.groupby('Type Of Failure').size().reset_index(name='Count').sort_values('Count', ascending=False).head(10)
+        df_nb_global = df_failures[['Type Of Failure', 'NB']].rename(columns={'NB': 'Count'}).sort_values('Count', ascending=False).head(10)
         
         fig_nb_global = px.bar(
             df_nb_global,
@@ -450,7 +448,7 @@ if submit_button and datafile is not None:
         
         # 3. Répartition globale des temps d'arrêt
         st.markdown("### 🥧 Répartition des temps d'arrêt (Global)")
-        df_ta_pie = df3.groupby('Type Of Failure')['Down Time'].sum().reset_index()
+        df_ta_pie = df_failures[['Type Of Failure', 'Down Time']]
         
         fig_ta_pie = px.pie(
             df_ta_pie,
@@ -468,7 +466,7 @@ if submit_button and datafile is not None:
         
         # 4. Répartition globale du nombre d'arrêts
         st.markdown("### 🍰 Répartition du nombre d'arrêts (Global)")
-        df_nb_pie = df3.groupby('Type Of Failure').size().reset_index(name='Count')
+        df_nb_pie = df_failures[['Type Of Failure', 'NB']].rename(columns={'NB': 'Count'})
         
         fig_nb_pie = px.pie(
             df_nb_pie,
@@ -492,10 +490,7 @@ if submit_button and datafile is not None:
         
         # 1. Pareto combiné global par type de panne
         st.markdown("#### 🌐 Types de panne (Top 8)")
-        df_global_combined = df3.groupby('Type Of Failure').agg(
-            NB=('Down Time', 'count'),
-            TA=('Down Time', 'sum')
-        ).reset_index().sort_values('TA', ascending=False).head(8)
+        df_global_combined = df_failures[['Type Of Failure', 'NB', 'Down Time']].rename(columns={'Down Time': 'TA'}).head(8)
         
         fig_global_combined = make_subplots(specs=[[{"secondary_y": True}]])
         
@@ -565,13 +560,11 @@ if submit_button and datafile is not None:
         composants = ['MARQUAGE', 'KIT-JOINT', 'MINI-APPLICATEUR']
         
         for composant in composants:
-            df_comp = df3[df3['Type Of Failure'] == composant]
+            df_comp = group('Microstop Description', failure=composant)
             if not df_comp.empty:
                 st.markdown(f"**{composant}**")
-                df_comp_combined = df_comp.groupby('Microstop Description').agg(
-                    NB=('Down Time', 'count'),
-                    TA=('Down Time', 'sum')
-                ).reset_index().sort_values('TA', ascending=False).head(5)
+                df_comp_combined = df_comp[['Microstop Description', 'NB', 'Down Time']].rename(
+                    columns={'Down Time': 'TA'}).head(5)
                 
                 if len(df_comp_combined) > 0:
                     fig_comp = make_subplots(specs=[[{"secondary_y": True}]])
@@ -1,8 +1,14 @@
+import multiprocessing
 import streamlit as st
 import subprocess
 import sys
-import os
 from streamlit.components.v1 import html
+from store import clear_store, rollback_store, store_versions
+
+# Exécutable PyInstaller : les processus de l'import groupé relancent l'exécutable,
+# qui doit alors exécuter leur tâche au lieu de l'application
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
 
 st.set_page_config(layout="wide", page_title="Tableau de Bord Maintenance", page_icon="🛠️")
 
@@ -353,13 +359,22 @@ with st.expander("Options Administrateur", expanded=False):
     if st.button("🔄 Réinitialiser toutes les données", key="btn_reset"):
         confirm = st.checkbox("Je confirme vouloir réinitialiser toutes les données")
         if confirm:
-            if os.path.exists('weekly_data'):
-                for f in os.listdir('weekly_data'):
-                    os.remove(os.path.join('weekly_data', f))
-                os.rmdir('weekly_data')
+            clear_store()
             st.success("Données réinitialisées avec succès!")
             st.balloons()
 
+    # Versions de l'historique : chaque import, ajout ou réinitialisation en crée une
+    versions = store_versions()
+    if not versions.empty:
+        labels = {f"Version {v.generation} - {v.ecrit_le} - {v.action} ({v.semaines} semaines)"
+                  + (" [en cours]" if v.en_cours else ""): v.generation
+                  for v in versions.itertuples()}
+        selected_version = st.selectbox("Versions de l'historique", list(labels), key="select_version")
+        if st.button("↩️ Restaurer cette version", key="btn_rollback"):
+            rollback_store(labels[selected_version])
+            st.cache_data.clear()
+            st.success(f"Historique restauré à la version {labels[selected_version]}")
+
 # Footer
 st.markdown("""
 <div style="text-align: center; margin-top: 50px; color: #888; font-size: 0.9rem;">
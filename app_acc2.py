@@ -1,7 +1,7 @@
 import streamlit as st
 import subprocess
 import sys
-import os
+from store import clear_store
 
 st.set_page_config(layout="wide", page_title="Tableau de Bord Maintenance")
 
@@ -99,8 +99,5 @@ st.markdown("---")
 st.subheader("Administration")
 
 if st.button("🔄 Réinitialiser toutes les données"):
-    if os.path.exists('weekly_data'):
-        for f in os.listdir('weekly_data'):
-            os.remove(os.path.join('weekly_data', f))
-        os.rmdir('weekly_data')
+    clear_store()
     st.success("Données réinitialisées avec succès!")
\ No newline at end of file
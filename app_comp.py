@@ -2,10 +2,14 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import sys
 import subprocess
+from events import rollup
+from ingest import ingest_many, ingest_upload, list_exports
+from periods import make_period
+from store import LazyHistory, month_failures, month_summaries, month_summary, week_top_failures
 
 # Configuration de la page
 st.set_page_config(layout="wide", page_title="Analyse des Pannes selon Temps d'Arret")
@@ -51,98 +55,74 @@ st.markdown("""
 # Titre principal
 st.markdown('<p class="main-title">⏱️ Rapport Maintenance : Analyse Stratégique des Temps Arrêt</p>', unsafe_allow_html=True)
 
-# Fonction pour traiter les fichiers Excel
-def process_file(file, week_num):
+# Fonction pour importer un fichier Excel (sans effet s'il a déjà été importé pour cette semaine)
+def import_file(file, year, week_num, TO, append=False):
     try:
-        df = pd.read_excel(file, header=9, usecols='B:X')
-        if 'Type Of Failure' not in df.columns or 'Down Time' not in df.columns:
-            st.error("Le fichier Excel ne contient pas les colonnes requises.")
-            return None
-            
-        df = df.dropna(how='all', axis=1)
-        df['Type Of Failure'] = df['Type Of Failure'].str.strip().str.upper()
-        
-        mask = ~df['Type Of Failure'].isin(['DEMARRAGE PARC', 'PREVENTIVE MAINTENANCE', 'N/A', ''])
-        df = df[mask].copy()
-        
-        if not df.empty:
-            df = df.iloc[:-1]
-            
-        try:
-            if pd.api.types.is_object_dtype(df['Down Time']):
-                df['Down Time'] = pd.to_datetime(df['Down Time'], format="%H:%M:%S").dt.time
-                df['Down Time'] = df['Down Time'].apply(lambda x: x.hour + x.minute/60 + x.second/3600)
-        except:
-            st.warning("Format de temps incorrect - utilisation des valeurs brutes")
-            df['Down Time'] = pd.to_numeric(df['Down Time'], errors='coerce')
-        
-        df['Semaine'] = f"Semaine {week_num}"
-        year = datetime.now().year
-        week_start = datetime.strptime(f"{year}-W{week_num}-1", "%Y-W%W-%w")
-        df['Mois'] = (week_start + timedelta(weeks=(week_num-1)//4)).strftime('%Y-%m')
-        
-        return df.dropna(subset=['Type Of Failure', 'Down Time'])
+        status, df, warnings = ingest_upload(file.getvalue(), make_period(year, week_num), TO, append=append)
+        for warning in warnings:
+            st.warning(warning)
+        return status
     except Exception as e:
         st.error(f"Erreur lors du traitement: {str(e)}")
         return None
 
-def save_week_data(week_num, df, TO):
-    try:
-        if not os.path.exists('weekly_data'):
-            os.makedirs('weekly_data')
-        
-        if df is not None and not df.empty:
-            df['TO'] = TO
-            save_path = f'weekly_data/week_{week_num}.pkl'
-            df.to_pickle(save_path)
-            return True
-        return False
-    except Exception as e:
-        st.error(f"Erreur lors de la sauvegarde: {str(e)}")
-        return False
-
-def load_historical_data(weeks_back=12):
-    data = {}
-    try:
-        if os.path.exists('weekly_data'):
-            files = sorted([f for f in os.listdir('weekly_data') if f.startswith('week_') and f.endswith('.pkl')], 
-                          key=lambda x: int(x.split('_')[1].split('.')[0]), 
-                          reverse=True)
-            
-            for f in files[:weeks_back]:
-                try:
-                    week_num = f.split('_')[1].split('.')[0]
-                    df = pd.read_pickle(f'weekly_data/{f}')
-                    if not df.empty:
-                        TO = df['TO'].iloc[0] if 'TO' in df.columns else 8235
-                        df = df.drop(columns=['TO'], errors='ignore')
-                        data[f"Semaine {week_num}"] = {'df': df, 'TO': TO}
-                except:
-                    continue
-    except Exception as e:
-        st.error(f"Erreur lors du chargement des données: {str(e)}")
-    return data
-
 # Interface utilisateur
 with st.sidebar:
     st.header("⚙️ Configuration")
-    current_week = st.number_input("Numéro de semaine", min_value=1, max_value=52, 
+    current_year = st.number_input("Année", min_value=2000, max_value=2100,
+                                 value=datetime.now().isocalendar()[0])
+    current_week = st.number_input("Numéro de semaine", min_value=1, max_value=53, 
                                  value=datetime.now().isocalendar()[1])
     current_file = st.file_uploader("Importer le fichier Excel", type=['xlsx'])
     
     TO = st.number_input("Temps d'ouverture (heures)", min_value=1, value=8235)
+    append = st.checkbox("Ajouter à la semaine existante (export journalier)",
+                         help="Les arrêts déjà présents dans la semaine ne sont pas ajoutés une seconde fois")
     
     if st.button("Traiter la semaine") and current_file:
         with st.spinner('Traitement en cours...'):
-            df = process_file(current_file, current_week)
-            if df is not None and not df.empty:
-                if save_week_data(current_week, df, TO):
-                    st.success(f"Données de la semaine {current_week} sauvegardées!")
-                else:
-                    st.warning("Erreur lors de la sauvegarde")
-            else:
+            status = import_file(current_file, current_year, current_week, TO, append)
+            if status == 'inchangé':
+                st.info(f"Fichier déjà importé pour la semaine {current_week} : aucune modification")
+            elif status == 'sauvegardé':
+                st.success(f"Données de la semaine {current_week} sauvegardées!")
+            elif status == 'ajouté':
+                st.success(f"Arrêts ajoutés à la semaine {current_week}!")
+            elif status == 'vide':
                 st.error("Aucune donnée valide à sauvegarder")
 
+    # Import groupé : plusieurs exports (ou un dossier entier), semaine déduite de chaque fichier
+    with st.expander("📦 Import groupé (historique)"):
+        bulk_files = st.file_uploader("Importer plusieurs fichiers Excel", type=['xlsx'],
+                                      accept_multiple_files=True, key="bulk_files")
+        bulk_folder = st.text_input("Ou dossier contenant les exports", key="bulk_folder")
+
+        if st.button("Traiter le lot") and (bulk_files or bulk_folder):
+            sources = [(f.name, f.getvalue()) for f in bulk_files or []]
+            if bulk_folder:
+                if os.path.isdir(bulk_folder):
+                    sources += [(path, path) for path in list_exports(bulk_folder)]
+                else:
+                    st.error(f"Dossier introuvable : {bulk_folder}")
+
+            if sources:
+                progress_bar = st.progress(0.0, text="Traitement en cours...")
+                results = ingest_many(
+                    sources, TO,
+                    progress=lambda done, total, name: progress_bar.progress(
+                        done / total, text=f"{done}/{total} - {os.path.basename(name)}")
+                )
+                saved = [r for r in results if r.get('statut') == 'sauvegardé']
+                unchanged = [r for r in results if r.get('statut') == 'inchangé']
+                st.success(f"{len(saved)} semaine(s) sauvegardée(s), {len(unchanged)} inchangée(s) "
+                           f"sur {len(results)} fichier(s)")
+                for r in results:
+                    for warning in r.get('avertissements', []):
+                        st.warning(f"{os.path.basename(r['fichier'])} : {warning}")
+                failed = [r for r in results if 'erreur' in r]
+                if failed:
+                    st.dataframe(pd.DataFrame(failed)[['fichier', 'semaine', 'erreur']], hide_index=True)
+
     if st.button("🏠 Retour à l'accueil"):
         try:
             subprocess.Popen([sys.executable, "-m", "streamlit", "run", "app_acc.py"])
@@ -164,8 +144,9 @@ with st.sidebar:
         except Exception as e:
             st.error(f"Erreur : {str(e)}")
 
-# Chargement des données
-historical_data = load_historical_data()
+# Chargement des données : liste des semaines lue dans le catalogue, lignes de chaque
+# semaine (colonnes des indicateurs) chargées à la demande, semaine analysée complète
+historical_data = LazyHistory(columns=['Type Of Failure', 'Down Time'])
 
 if not historical_data:
     st.warning("Aucune donnée historique valide trouvée. Veuillez importer des données.")
@@ -176,30 +157,13 @@ st.header("🔍 Analyse détaillée par semaine")
 selected_week = st.selectbox("Choisir une semaine à analyser", sorted(historical_data.keys()))
 
 if selected_week in historical_data:
-    week_data = historical_data[selected_week]
-    df_week = week_data['df']
-    TO_week = week_data['TO']
+    df_week, TO_week = historical_data.week(selected_week)
+    historical_data.prefetch(selected_week)
     
     with st.expander(f"Détails - {selected_week} (TO: {TO_week:.0f} heures)", expanded=True):
         if not df_week.empty and 'Type Of Failure' in df_week.columns and 'Down Time' in df_week.columns:
             df1 = df_week.dropna(how='all', axis=1).copy()
             
-            if not pd.api.types.is_numeric_dtype(df1['Down Time']):
-                try:
-                    df1['Down Time'] = pd.to_datetime(df1['Down Time'], format="%H:%M:%S")
-                    df1['Down Time'] = df1['Down Time'].dt.hour + df1['Down Time'].dt.minute/60 + df1['Down Time'].dt.second/3600
-                except:
-                    df1['Down Time'] = pd.to_numeric(df1['Down Time'], errors='coerce')
-            
-            if 'Delay Time' in df1.columns:
-                if not pd.api.types.is_numeric_dtype(df1['Delay Time']):
-                    try:
-                        df1['Delay Time'] = pd.to_datetime(df1['Delay Time'], format="%H:%M:%S")
-                        df1['Delay Time'] = df1['Delay Time'].dt.hour + df1['Delay Time'].dt.minute/60 + df1['Delay Time'].dt.second/3600
-                    except:
-                        pass
-                df1['T, I'] = df1['Down Time'] - df1['Delay Time']
-            
             TA = df1['Down Time'].sum()
             NB = df1['Down Time'].count()
             mtbf = (TO_week - TA) / NB if NB > 0 else 0
@@ -234,12 +198,13 @@ if selected_week in historical_data:
             fig_pie.update_traces(textinfo='percent+value', texttemplate='%{label}<br>%{value:.2f}h (%{percent})')
             st.plotly_chart(fig_pie, use_container_width=True)
 
+            # Regroupements lus dans le cube de la base d'événements
             if 'Machine' in df1.columns:
-                df_komax = df1[df1['Machine'].str.contains('KOMAX', na=False)]
+                df_komax = rollup('Machine', periods=[selected_week], machine='KOMAX')
                 if not df_komax.empty:
-                    df_grouped = df_komax.groupby(['Machine', 'Type Of Failure'])['Down Time'].sum().reset_index()
-                    df_grouped = df_grouped[df_grouped['Down Time'] > 0]
-                    df_totals = df_grouped.groupby('Machine')['Down Time'].sum().reset_index().rename(columns={'Down Time': 'Total'})
+                    df_grouped = rollup(['Machine', 'Type Of Failure'], periods=[selected_week], machine='KOMAX')
+                    df_grouped = df_grouped[df_grouped['Down Time'] > 0][['Machine', 'Type Of Failure', 'Down Time']]
+                    df_totals = df_komax[['Machine', 'Down Time']].rename(columns={'Down Time': 'Total'})
                     df_final = df_grouped.merge(df_totals, on='Machine')
                     df_final = df_final.sort_values(by='Total', ascending=False)
 
@@ -251,14 +216,7 @@ if selected_week in historical_data:
                     st.plotly_chart(fig_stacked, use_container_width=True)
 
                     if 'T, I' in df1.columns:
-                        df_komax_indicateurs = df1[df1['Machine'].str.contains('KOMAX', na=False)].copy()
-
-                        df_indicateurs_komax = df_komax_indicateurs.groupby('Machine').agg({
-                            'Down Time': 'sum',
-                            'Delay Time': 'sum',
-                            'T, I': 'sum',
-                            'Type Of Failure': 'count'
-                        }).reset_index().rename(columns={'Type Of Failure': 'NB'})
+                        df_indicateurs_komax = df_komax
 
                         df_indicateurs_melted = df_indicateurs_komax.melt(id_vars='Machine', 
                                                                   value_vars=['Down Time', 'Delay Time', 'T, I', 'NB'],
@@ -275,9 +233,8 @@ if selected_week in historical_data:
                                         text=df_indicateurs_melted['Valeur'].apply(lambda x: f"{x:.2f}"))
                         fig_comparatif.update_traces(texttemplate='%{text}', textposition='outside')
                         st.plotly_chart(fig_comparatif, use_container_width=True)
-                        df_all_failures = df1.groupby('Type Of Failure')['Down Time'].sum().reset_index()
-            df_all_failures = df_all_failures.sort_values('Down Time', ascending=False)
-            
+
+            df_all_failures = rollup('Type Of Failure', periods=[selected_week])[['Type Of Failure', 'Down Time']]
             fig_all_failures = px.pie(df_all_failures, 
                                      values='Down Time', 
                                      names='Type Of Failure',
@@ -289,8 +246,7 @@ if selected_week in historical_data:
                                          texttemplate='%{label}<br>%{value:.2f}h (%{percent})',
                                          hovertemplate='%{label}<br>Temps d\'arrêt: %{value:.2f} heures<br>Pourcentage: %{percent:.1%}')
             st.plotly_chart(fig_all_failures, use_container_width=True)
-            df_pareto = df1.groupby('Type Of Failure')['Down Time'].sum().reset_index()
-            df_pareto = df_pareto.sort_values(by='Down Time', ascending=False).head(3)
+            df_pareto = rollup('Type Of Failure', periods=[selected_week])[['Type Of Failure', 'Down Time']].head(3)
             df_pareto['Cumulative Percentage'] = (df_pareto['Down Time'].cumsum() / df_pareto['Down Time'].sum()) * 100
 
             fig_pareto = px.bar(df_pareto, x='Type Of Failure', y='Down Time', text=df_pareto['Down Time'].apply(lambda x: f"{x:.2f}"),
@@ -308,10 +264,9 @@ if selected_week in historical_data:
                 composants_specifiques = ['MARQUAGE', 'KIT-JOINT', 'MINI-APPLICATEUR']
 
                 for composant in composants_specifiques:
-                    df_composant = df1[df1['Type Of Failure'] == composant]
-                    if not df_composant.empty and 'Microstop Description' in df_composant.columns:
-                        df_defauts_composant = df_composant.groupby('Microstop Description')['Down Time'].sum().reset_index()
-                        df_defauts_composant = df_defauts_composant.sort_values(by='Down Time', ascending=False)
+                    df_defauts_composant = rollup('Microstop Description', periods=[selected_week], failure=composant)
+                    if not df_defauts_composant.empty:
+                        df_defauts_composant = df_defauts_composant[['Microstop Description', 'Down Time']]
                         df_defauts_composant['Cumulative Percentage'] = (df_defauts_composant['Down Time'].cumsum() / df_defauts_composant['Down Time'].sum()) * 100
 
                         fig_pareto_defauts_composant = px.bar(df_defauts_composant, 
@@ -337,22 +292,12 @@ if selected_week in historical_data:
 st.header("📈 Comparaison des Top 3 Pannes")
 
 try:
-    comparison_data = []
-    for week_name, week_data in historical_data.items():
-        df = week_data['df']
-        if not df.empty and 'Type Of Failure' in df.columns and 'Down Time' in df.columns:
-            top_pannes = df.groupby('Type Of Failure')['Down Time'].sum().nlargest(3).reset_index()
-            if not top_pannes.empty:
-                top_pannes['Semaine'] = week_name
-                top_pannes['Rank'] = top_pannes['Down Time'].rank(ascending=False, method='dense').astype(int)
-                comparison_data.append(top_pannes)
+    comparison_df = week_top_failures(list(historical_data.keys()), n=3)
     
-    if not comparison_data:
+    if comparison_df.empty:
         st.error("Aucune donnée valide pour la comparaison")
         st.stop()
     
-    comparison_df = pd.concat(comparison_data, ignore_index=True)
-    
     plot_data = []
     for week_name in historical_data.keys():
         week_df = comparison_df[comparison_df['Semaine'] == week_name]
@@ -403,37 +348,21 @@ except Exception as e:
 # Section pour l'analyse par mois
 st.header("📅 Analyse par mois")
 
-monthly_data = {}
-for week_name, week_data in historical_data.items():
-    df = week_data['df']
-    if 'Mois' in df.columns:
-        month = df['Mois'].iloc[0]
-        if month not in monthly_data:
-            monthly_data[month] = {'df': pd.DataFrame(), 'TO': 0}
-        monthly_data[month]['df'] = pd.concat([monthly_data[month]['df'], df])
-        monthly_data[month]['TO'] += week_data['TO']
-
-if monthly_data:
-    selected_month = st.selectbox("Sélectionner un mois", sorted(monthly_data.keys(), reverse=True))
-
-    if selected_month in monthly_data:
-        month_data = monthly_data[selected_month]
-        df_month = month_data['df']
+# Cumuls mensuels tenus à jour dans le catalogue à chaque import : le mois choisi
+# se lit sans charger ni cumuler ses semaines
+monthly_data = month_summaries()
+
+if not monthly_data.empty:
+    selected_month = st.selectbox("Sélectionner un mois", monthly_data['mois'])
+    month_data = month_summary(selected_month)
+
+    if month_data is not None:
         TO_month = month_data['TO']
         
         with st.expander(f"Détails - {selected_month} (TO: {TO_month:.0f} heures)", expanded=True):
-            if not df_month.empty and 'Type Of Failure' in df_month.columns and 'Down Time' in df_month.columns:
-                df1 = df_month.dropna(how='all', axis=1).copy()
-                
-                if not pd.api.types.is_numeric_dtype(df1['Down Time']):
-                    try:
-                        df1['Down Time'] = pd.to_datetime(df1['Down Time'], format="%H:%M:%S")
-                        df1['Down Time'] = df1['Down Time'].dt.hour + df1['Down Time'].dt.minute/60 + df1['Down Time'].dt.second/3600
-                    except:
-                        df1['Down Time'] = pd.to_numeric(df1['Down Time'], errors='coerce')
-                
-                TA = df1['Down Time'].sum()
-                NB = df1['Down Time'].count()
+            if month_data['NB'] > 0:
+                TA = month_data['TA']
+                NB = month_data['NB']
                 mtbf = (TO_month - TA) / NB if NB > 0 else 0
                 mttr = TA / NB if NB > 0 else 0
                 Di = ((TO_month - TA) / TO_month) * 100
@@ -447,7 +376,7 @@ if monthly_data:
                 with col3:
                     st.metric("Disponibilité mensuelle", f"{Di:.1f}%")
 
-                df_top_month = df1.groupby('Type Of Failure')['Down Time'].sum().nlargest(5).reset_index()
+                df_top_month = month_failures(selected_month).head(5)
                 fig_month = px.bar(df_top_month, 
                                  x='Type Of Failure', 
                                  y='Down Time',
@@ -2,10 +2,10 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-import os
 from datetime import datetime
 import sys
 import subprocess
+from store import week_summaries
 
 st.set_page_config(layout="wide", page_title="Analyse des Indicateurs")
 
@@ -61,28 +61,6 @@ st.markdown("""
 # Titre principal avec icône
 st.markdown('<p class="main-title">📈 Analyse des Indicateurs Clés</p>', unsafe_allow_html=True)
 
-def load_historical_data(weeks_back=26):
-    data = {}
-    try:
-        if os.path.exists('weekly_data'):
-            files = sorted([f for f in os.listdir('weekly_data') if f.startswith('week_') and f.endswith('.pkl')], 
-                          key=lambda x: int(x.split('_')[1].split('.')[0]), 
-                          reverse=True)
-            
-            for f in files[:weeks_back]:
-                try:
-                    week_num = f.split('_')[1].split('.')[0]
-                    df = pd.read_pickle(f'weekly_data/{f}')
-                    if not df.empty:
-                        TO = df['TO'].iloc[0] if 'TO' in df.columns else 8235
-                        data[f"Semaine {week_num}"] = {'df': df, 'TO': TO}
-                except Exception as e:
-                    st.warning(f"Fichier {f} corrompu ou incompatible : {str(e)}")
-                    continue
-    except Exception as e:
-        st.error(f"Erreur lors du chargement des données historiques : {str(e)}")
-    return data
-
 with st.sidebar:
     st.header("🔀 Navigation")
     
@@ -146,9 +124,10 @@ with st.sidebar:
 
 # Chargement des données avec indicateur visuel
 with st.spinner(f'Chargement des données sur {weeks_back} semaines...'):
-    historical_data = load_historical_data(weeks_back)
+    # Résumés des semaines lus dans le catalogue, sans lire les données
+    summaries = week_summaries(weeks_back)
 
-if not historical_data:
+if summaries.empty:
     st.warning("⚠️ Aucune donnée historique valide trouvée. Veuillez importer des données dans l'application d'analyse comparative.")
     st.stop()
 
@@ -158,14 +137,8 @@ st.header("📊 Indicateurs Clés de Performance")
 try:
     # Préparation des données
     metrics = []
-    for week_name, week_data in historical_data.items():
-        df = week_data['df']
-        TO = week_data['TO']
-        
-        if not df.empty and 'Down Time' in df.columns:
-            TA = df['Down Time'].sum()
-            NB = df['Down Time'].count()
-            
+    for week_name, TO, TA, NB in summaries[['periode', 'TO', 'TA', 'NB']].itertuples(index=False):
+        if NB > 0:
             mtbf = (TO - TA) / NB if NB > 0 else 0
             mttr = TA / NB if NB > 0 else 0
             disponibilite = ((TO - TA) / TO) * 100
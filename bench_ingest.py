@@ -0,0 +1,100 @@
+# Benchmark de lecture des exports Komax : pd.read_excel contre ingest.read_export
+#
+# Usage : python bench_ingest.py [--lignes 20000] [--repetitions 3] [--json resultat.json]
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+from openpyxl import Workbook
+
+from ingest import read_export
+
+COLONNES = [
+    'Date', 'Shift', 'Line', 'Machine', 'Operator', 'Type Of Failure', 'Microstop Description',
+    'Start Time', 'End Time', 'Down Time', 'Delay Time', 'Technician', 'Comment', 'Part Number',
+    'Order', 'Station', 'Category', 'Sub Category', 'Cause', 'Action', 'Status', 'Validated', 'Reference'
+]
+MACHINES = [f"KOMAX {i:02d}" for i in range(1, 13)] + ['SERTISSEUSE 01', 'SERTISSEUSE 02', 'PRESSE 01']
+PANNES = ['MARQUAGE', 'KIT-JOINT', 'MINI-APPLICATEUR', 'CAPTEUR', 'ELECTRIQUE', 'PNEUMATIQUE',
+          'PREVENTIVE MAINTENANCE', 'DEMARRAGE PARC', 'COUTEAU', 'REDRESSEUR']
+DEFAUTS = ['Mauvais marquage', 'Joint absent', 'Sertissage hors tolérance', 'Fil coincé', 'Capteur sale']
+
+
+# Génération d'un export synthétique ayant la mise en page de l'export MES
+def generate_export(path, nb_lignes, seed=0):
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Export')
+    ws.append([None, 'Rapport des arrêts Komax'])
+    for i in range(8):
+        ws.append([None, f"Paramètre {i}", f"Valeur {i}"])
+    ws.append([None] + COLONNES)
+    debut = datetime(2025, 3, 3, 6, 0)
+    for i in range(nb_lignes):
+        start = debut + timedelta(minutes=3 * i)
+        down = timedelta(seconds=rnd.randint(20, 3 * 3600))
+        delay = timedelta(seconds=rnd.randint(0, int(down.total_seconds())))
+        ws.append([None, start.date(), rnd.choice(['A', 'B', 'C']), 'L1', rnd.choice(MACHINES),
+                   f"OP{rnd.randint(1, 40)}", rnd.choice(PANNES), rnd.choice(DEFAUTS),
+                   start.strftime('%H:%M:%S'), (start + down).strftime('%H:%M:%S'),
+                   str(down), str(delay), f"TECH{rnd.randint(1, 9)}", 'RAS', f"PN{rnd.randint(1000, 9999)}",
+                   rnd.randint(100000, 999999), rnd.randint(1, 20), 'Maintenance', 'Curatif', 'Usure',
+                   'Remplacement', 'Clos', 'Oui', i])
+    ws.append([None, 'Total'])
+    wb.save(path)
+
+
+# Temps d'exécution (meilleur des répétitions) et pic mémoire Python d'une lecture
+def measure(fonction, path, repetitions):
+    durees = []
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        fonction(path)
+        durees.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    df = fonction(path)
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'secondes': min(durees), 'pic_memoire_mo': pic / 2**20, 'lignes': len(df)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de lecture des exports Komax")
+    parser.add_argument('--lignes', type=int, default=20000)
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.xlsx')
+        generate_export(path, args.lignes)
+
+        resultats = {
+            'lignes': args.lignes,
+            'read_excel': measure(lambda p: pd.read_excel(p, header=9, usecols='B:X'), path, args.repetitions),
+            'read_export': measure(read_export, path, args.repetitions),
+        }
+
+    ref, new = resultats['read_excel'], resultats['read_export']
+    resultats['gain_temps_pct'] = (1 - new['secondes'] / ref['secondes']) * 100
+    resultats['gain_memoire_pct'] = (1 - new['pic_memoire_mo'] / ref['pic_memoire_mo']) * 100
+
+    print(f"Export synthétique : {args.lignes} lignes")
+    for nom in ('read_excel', 'read_export'):
+        r = resultats[nom]
+        print(f"  {nom:<12} {r['secondes']:8.2f} s  {r['pic_memoire_mo']:8.1f} Mo  ({r['lignes']} lignes)")
+    print(f"Gain : {resultats['gain_temps_pct']:.1f}% de temps, {resultats['gain_memoire_pct']:.1f}% de mémoire")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# Benchmark des formats de stockage de l'historique : pickle par semaine (ancien
+# format), Parquet selon la compression, Feather (Arrow IPC), SQLite et le stockage
+# actuel (store.write_week / store.load_historical_data, les mêmes appels que les
+# pages) sur des historiques Komax synthétiques de plusieurs années.
+#
+# Pour chaque format et chaque durée : temps d'écriture, chargement complet à froid
+# (premier chargement dans un nouveau processus) et à chaud (second chargement),
+# chargement des seules colonnes des comparaisons, taille sur disque et pic de
+# mémoire résidente (RSS) du processus de lecture.
+#
+# Usage : python bench_store.py [--annees 1 5 10] [--lignes-semaine 1500]
+#                               [--formats pickle parquet-snappy ...] [--json resultat.json]
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+try:
+    import resource
+except ImportError:  # Windows : pic de mémoire non mesuré
+    resource = None
+
+from bench_ingest import DEFAUTS, MACHINES, PANNES
+from periods import Period, weeks_in_year
+from store import clear_history_cache, load_historical_data, write_week
+
+# Colonnes chargées par les comparaisons (Top 3, Pareto)
+COLONNES_COMPARAISON = ['Type Of Failure', 'Down Time']
+
+TO_SEMAINE = 8235
+
+DERNIERE_ANNEE = 2025
+
+
+# Semaine synthétique ayant les colonnes et les types d'un export nettoyé (heures
+# décimales, colonnes Semaine et Mois ajoutées)
+def generate_week(period, nb_lignes, seed):
+    rnd = np.random.default_rng(seed)
+    debut = pd.Timestamp.fromisocalendar(period.year, period.week, 1) + pd.Timedelta(hours=6)
+    dates = debut + pd.to_timedelta(np.sort(rnd.integers(0, 6 * 24 * 3600, nb_lignes)), unit='s')
+    down = rnd.integers(20, 3 * 3600, nb_lignes) / 3600
+    delay = down * rnd.random(nb_lignes)
+    return pd.DataFrame({
+        'Date': dates.normalize(),
+        'Shift': rnd.choice(['A', 'B', 'C'], nb_lignes),
+        'Line': 'L1',
+        'Machine': rnd.choice(MACHINES, nb_lignes),
+        'Operator': pd.Series(rnd.integers(1, 41, nb_lignes)).map('OP{}'.format),
+        'Type Of Failure': rnd.choice(PANNES, nb_lignes),
+        'Microstop Description': rnd.choice(DEFAUTS, nb_lignes),
+        'Start Time': dates.strftime('%H:%M:%S'),
+        'Down Time': down,
+        'Delay Time': delay,
+        'Technician': pd.Series(rnd.integers(1, 10, nb_lignes)).map('TECH{}'.format),
+        'Part Number': pd.Series(rnd.integers(1000, 10000, nb_lignes)).map('PN{}'.format),
+        'Order': rnd.integers(100000, 1000000, nb_lignes),
+        'Station': rnd.integers(1, 21, nb_lignes),
+        'Status': 'Clos',
+        'T, I': down - delay,
+        'Semaine': period.label,
+        'Mois': period.month,
+    })
+
+
+# Historique synthétique : {période: DataFrame} des années se terminant en DERNIERE_ANNEE
+def generate_history(annees, nb_lignes):
+    periods = [Period(year, week) for year in range(DERNIERE_ANNEE - annees + 1, DERNIERE_ANNEE + 1)
+               for week in range(1, weeks_in_year(year) + 1)]
+    return {period: generate_week(period, nb_lignes, seed=i) for i, period in enumerate(periods)}
+
+
+# ==================== FORMATS ====================
+# Chaque format : écriture(frames, dossier) et lecture(dossier, colonnes) -> {"AAAA-Snn": DataFrame}
+
+def write_pickle(frames, folder):
+    for period, df in frames.items():
+        df.to_pickle(os.path.join(folder, f'week_{period.label}.pkl'))
+
+
+def load_pickle(folder, columns=None):
+    data = {}
+    for path in sorted(glob.glob(os.path.join(folder, 'week_*.pkl'))):
+        df = pd.read_pickle(path)
+        data[os.path.basename(path)[len('week_'):-len('.pkl')]] = df[columns] if columns else df
+    return data
+
+
+def parquet_format(compression):
+    def write(frames, folder):
+        for period, df in frames.items():
+            df.to_parquet(os.path.join(folder, f'{period.label}.parquet'), index=False, compression=compression)
+
+    def load(folder, columns=None):
+        return {os.path.basename(path)[:-len('.parquet')]: pd.read_parquet(path, columns=columns)
+                for path in sorted(glob.glob(os.path.join(folder, '*.parquet')))}
+    return write, load
+
+
+def feather_format(compression):
+    def write(frames, folder):
+        for period, df in frames.items():
+            feather.write_feather(df, os.path.join(folder, f'{period.label}.arrow'), compression=compression)
+
+    def load(folder, columns=None):
+        return {os.path.basename(path)[:-len('.arrow')]: feather.read_feather(path, columns=columns)
+                for path in sorted(glob.glob(os.path.join(folder, '*.arrow')))}
+    return write, load
+
+
+def write_sqlite(frames, folder):
+    with sqlite3.connect(os.path.join(folder, 'historique.sqlite')) as connection:
+        for df in frames.values():
+            df.to_sql('arrets', connection, if_exists='append', index=False)
+        connection.execute('CREATE INDEX semaine ON arrets ("Semaine")')
+
+
+def load_sqlite(folder, columns=None):
+    selection = ', '.join(f'"{c}"' for c in ['Semaine'] + columns) if columns else '*'
+    with sqlite3.connect(os.path.join(folder, 'historique.sqlite')) as connection:
+        df = pd.read_sql(f'SELECT {selection} FROM arrets', connection)
+    return {label: week.drop(columns=['Semaine']) if columns else week for label, week in df.groupby('Semaine')}
+
+
+# Stockage actuel : partitions Parquet, catalogue et cache Arrow mappé, par les
+# fonctions appelées par les pages. Le stockage étant relatif au dossier courant
+# (weekly_data), le processus de mesure se place dans le dossier du format. Les
+# historiques gardés en mémoire par le processus sont vidés avant chaque
+# chargement : comme pour les autres formats, le second chargement relit les fichiers
+def write_store(frames, folder):
+    os.chdir(folder)
+    for period, df in frames.items():
+        write_week(period, df.copy(), TO_SEMAINE)
+
+
+def load_store(folder, columns=None):
+    os.chdir(folder)
+    clear_history_cache()
+    return {label: week['df'] for label, week in load_historical_data(weeks_back=None, columns=columns).items()}
+
+
+FORMATS = {
+    'pickle': (write_pickle, load_pickle),
+    'parquet-snappy': parquet_format('snappy'),
+    'parquet-zstd': parquet_format('zstd'),
+    'parquet-gzip': parquet_format('gzip'),
+    'parquet-none': parquet_format('none'),
+    'feather-lz4': feather_format('lz4'),
+    'feather-zstd': feather_format('zstd'),
+    'feather-none': feather_format('uncompressed'),
+    'sqlite': (write_sqlite, load_sqlite),
+    'store': (write_store, load_store),
+}
+
+
+# ==================== MESURES ====================
+
+# Pic de mémoire résidente du processus (Mo), None si non disponible. Sous Linux,
+# VmHWM : ru_maxrss garde le pic du processus parent après exec
+def peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(folder) for name in names)
+
+
+# Écriture de l'historique dans un processus neuf
+def _measure_write(nom, frames, folder):
+    t0 = time.perf_counter()
+    FORMATS[nom][0](frames, folder)
+    return time.perf_counter() - t0
+
+
+# Chargement dans un processus neuf : premier chargement (à froid) puis second (à
+# chaud), avec le pic de mémoire résidente avant (modules importés) et après
+def _measure_load(nom, folder, columns):
+    load = FORMATS[nom][1]
+    initial = peak_rss()
+    t0 = time.perf_counter()
+    data = load(folder, columns)
+    froid = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    load(folder, columns)
+    chaud = time.perf_counter() - t0
+    return {'froid_s': froid, 'chaud_s': chaud, 'semaines': len(data),
+            'lignes': int(sum(len(df) for df in data.values())),
+            'rss_initial_mo': initial, 'pic_rss_mo': peak_rss(),
+            'hausse_rss_mo': peak_rss() - initial if initial is not None else None}
+
+
+# Exécution d'une mesure dans un processus neuf (ni cache ni dossier courant hérités)
+def in_new_process(fonction, *args):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(fonction, args)
+
+
+def measure_format(nom, frames, tmp):
+    folder = os.path.join(tmp, nom)
+    os.makedirs(folder)
+    resultat = {
+        'ecriture_s': in_new_process(_measure_write, nom, frames, folder),
+        'taille_mo': folder_size(folder) / 2**20,
+        'complet': in_new_process(_measure_load, nom, folder, None),
+        'colonnes': in_new_process(_measure_load, nom, folder, COLONNES_COMPARAISON),
+    }
+    # Le cache Arrow du stockage actuel est créé par le premier chargement
+    resultat['taille_apres_lecture_mo'] = folder_size(folder) / 2**20
+    return resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des formats de stockage de l'historique")
+    parser.add_argument('--annees', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--lignes-semaine', type=int, default=1500)
+    parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    resultats = {'lignes_semaine': args.lignes_semaine, 'colonnes_partielles': COLONNES_COMPARAISON,
+                 'historiques': {}}
+    for annees in args.annees:
+        frames = generate_history(annees, args.lignes_semaine)
+        lignes = sum(len(df) for df in frames.values())
+        print(f"Historique synthétique : {annees} an(s), {len(frames)} semaines, {lignes} lignes")
+        print(f"  {'format':<15} {'écriture':>9} {'froid':>8} {'chaud':>8} {'colonnes':>9} "
+              f"{'taille':>9} {'+RSS':>9}")
+        historique = {'semaines': len(frames), 'lignes': lignes, 'formats': {}}
+        with tempfile.TemporaryDirectory() as tmp:
+            for nom in args.formats:
+                r = measure_format(nom, frames, tmp)
+                historique['formats'][nom] = r
+                rss = r['complet']['hausse_rss_mo']
+                print(f"  {nom:<15} {r['ecriture_s']:8.2f}s {r['complet']['froid_s']:7.2f}s "
+                      f"{r['complet']['chaud_s']:7.2f}s {r['colonnes']['froid_s']:8.2f}s "
+                      f"{r['taille_mo']:7.1f}Mo " + (f"{rss:7.1f}Mo" if rss is not None else f"{'-':>9}"))
+        resultats['historiques'][f'{annees}_ans'] = historique
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
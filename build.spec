@@ -57,7 +57,16 @@ hidden_imports = [
     # UI
     'PIL',
     'matplotlib',
-    'pyarrow'
+    'pyarrow',
+
+    # Modules partagés
+    'durations',
+    'events',
+    'ingest',
+    'periods',
+    'quality',
+    'store',
+    'watcher'
 ]
 
 a = Analysis(
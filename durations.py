@@ -0,0 +1,145 @@
+# Conversion vectorisée des durées Komax ('Down Time', 'Delay Time')
+#
+# Les cellules de durée arrivent sous plusieurs formes selon l'export :
+# datetime.time, fraction de jour Excel, timedelta, texte "HH:MM:SS" (y compris
+# au-delà de 24 h, ex. "27:30:00") ou datetime ancré sur l'époque Excel (1899-12-30).
+# Chaque forme est convertie en bloc (sans passer par le texte pour les heures, dates
+# et durées) en un nombre entier de secondes.
+import numbers
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+DURATION_COLUMNS = ['Down Time', 'Delay Time']
+
+# Époque des dates Excel : une durée de 27 h s'affiche "1900-01-01 03:00:00"
+_EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+_LEAP_DAY_START = pd.Timestamp('1899-12-31')
+_LEAP_DAY_END = pd.Timestamp('1900-03-01')
+
+_DURATION_PATTERN = (
+    r'^(?:(?P<date>\d{4}-\d{2}-\d{2})[ T])?'
+    r'(?:(?P<jours>-?\d+) days?,? )?'
+    r'(?P<h>\d+):(?P<m>\d{1,2})(?::(?P<s>\d{1,2}(?:\.\d*)?))?$'
+)
+
+
+# Nature d'un type de cellule : nombre (fraction de jour Excel), heure, date,
+# durée, texte ; les autres types sont lus par leur représentation texte
+_NUMBER, _TIME, _DATE, _TIMEDELTA, _TEXT, _OTHER = range(6)
+
+
+def _kind(cell_type):
+    if issubclass(cell_type, (bool, np.bool_)):
+        return _OTHER
+    if issubclass(cell_type, numbers.Number):
+        return _NUMBER
+    if issubclass(cell_type, datetime):
+        return _DATE
+    if issubclass(cell_type, time):
+        return _TIME
+    if issubclass(cell_type, (timedelta, np.timedelta64)):
+        return _TIMEDELTA
+    if issubclass(cell_type, str):
+        return _TEXT
+    return _OTHER
+
+
+# Secondes lues dans la représentation texte des cellules (texte "HH:MM:SS" avec
+# date ou nombre de jours éventuels)
+def _parse_text(values):
+    parts = values.astype(str).str.strip().str.extract(_DURATION_PATTERN)
+    clock = (parts['h'].astype(float) * 3600 + parts['m'].astype(float) * 60
+             + parts['s'].astype(float).fillna(0))
+    days = parts['jours'].astype(float).fillna(0)
+    dates = pd.to_datetime(parts['date'], errors='coerce')
+    days += _epoch_days(dates).where(dates.dt.year <= 1900, 0).fillna(0)
+    return days * 86400 + clock
+
+
+# Jours écoulés depuis l'époque Excel des dates qui y sont ancrées. Avant le
+# 1er mars 1900, openpyxl ajoute un jour pour compenser le 29 février 1900 fictif
+# d'Excel : le jour 1 (27 h) est rendu 1900-01-01, et non 1899-12-31
+def _epoch_days(dates):
+    days = (dates.dt.normalize() - _EXCEL_EPOCH).dt.days
+    return days - ((dates >= _LEAP_DAY_START) & (dates < _LEAP_DAY_END)).astype(int)
+
+
+# Conversion d'une colonne de durées en secondes entières.
+# Retourne (secondes, illisibles) : une Series Int64 (<NA> pour les cellules vides
+# ou illisibles) et le masque booléen des cellules non vides qui n'ont pu être lues
+def parse_durations(values):
+    values = pd.Series(values, copy=False)
+    seconds = pd.Series(np.nan, index=values.index)
+
+    if pd.api.types.is_timedelta64_dtype(values):
+        seconds = values.dt.total_seconds()
+    elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        seconds = values.astype(float) * 86400
+    else:
+        # Chaque nature de cellule est convertie à part, sans passer par le texte
+        types = values.map(type)
+        kinds = types.map({cell_type: _kind(cell_type) for cell_type in types.unique()}).to_numpy()
+        kinds[values.isna().to_numpy()] = -1
+        result = np.full(len(values), np.nan)
+        cells = values.to_numpy()
+
+        mask = kinds == _NUMBER
+        if mask.any():
+            result[mask] = pd.to_numeric(cells[mask], errors='coerce') * 86400
+
+        mask = kinds == _TIME
+        if mask.any():
+            result[mask] = [t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6
+                            for t in cells[mask]]
+
+        mask = kinds == _TIMEDELTA
+        if mask.any():
+            result[mask] = pd.to_timedelta(cells[mask]).total_seconds()
+
+        # Dates proches de l'époque Excel : jours écoulés depuis 1899-12-30 et heure
+        mask = kinds == _DATE
+        if mask.any():
+            dates = pd.Series(pd.to_datetime(cells[mask]))
+            clock = (dates - dates.dt.normalize()).dt.total_seconds()
+            result[mask] = _epoch_days(dates).where(dates.dt.year <= 1900, 0) * 86400 + clock
+
+        # Texte "HH:MM:SS" lu par pandas, le reste (date, jours, "HH:MM") par le motif
+        mask = kinds == _TEXT
+        if mask.any():
+            text = pd.Series(cells[mask]).str.strip()
+            parsed = pd.to_timedelta(text.where(text.str.contains(':', regex=False)), errors='coerce')
+            result[mask] = parsed.dt.total_seconds()
+
+        rest = np.isnan(result) & ((kinds == _TEXT) | (kinds == _OTHER))
+        if rest.any():
+            result[rest] = _parse_text(pd.Series(cells[rest]))
+        seconds = pd.Series(result, index=values.index)
+
+    seconds = seconds.round()
+    invalid = seconds.isna() & values.notna() & (values != '')
+    return seconds.astype('Int64'), invalid
+
+
+# Durées converties en heures décimales (NaN pour les cellules vides ou illisibles)
+def duration_hours(values):
+    seconds, _ = parse_durations(values)
+    return seconds.astype(float) / 3600
+
+
+# Conversion en place des colonnes de durée d'un export en heures décimales
+# (columns : colonnes à convertir, DURATION_COLUMNS par défaut).
+# Retourne la liste des avertissements sur les cellules illisibles
+def convert_durations(df, columns=DURATION_COLUMNS):
+    warnings = []
+    for column in columns:
+        if column not in df.columns:
+            continue
+        seconds, invalid = parse_durations(df[column])
+        if invalid.any():
+            sample = ', '.join(repr(v) for v in df.loc[invalid, column].head(5))
+            warnings.append(f"{int(invalid.sum())} valeur(s) '{column}' illisible(s) ignorée(s) "
+                            f"(lignes {', '.join(str(i) for i in df.index[invalid][:5])} : {sample})")
+        df[column] = seconds.astype(float) / 3600
+    return warnings
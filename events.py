@@ -0,0 +1,228 @@
+# Base d'événements SQLite : agrégats indexés des arrêts de l'historique
+#
+# Les partitions Parquet (store) restent la référence. La base
+# weekly_data/evenements.sqlite en est un résumé tenu à jour à la demande : avant
+# chaque requête, les semaines dont la génération du catalogue a changé sont
+# recalculées, celles qui ont disparu sont supprimées. Les regroupements sur
+# l'historique (Pareto par composant, machines KOMAX, Top du mois) sont des
+# requêtes d'agrégat servies par les index, sans charger l'historique en pandas.
+#
+# La table cube agrège les arrêts au grain le plus fin utilisé par les graphiques
+# (semaine × machine × type de panne × description) : heures d'arrêt, de retard et
+# d'intervention et nombre d'arrêts. Elle est tenue à jour semaine par semaine ;
+# rollup() la regroupe à n'importe quel grain plus grossier (mois, trimestre,
+# année, toutes machines confondues). Elle remplace la copie arrêt par arrêt de
+# l'historique, qu'aucune requête ne lisait plus : ses index couvrent la période ou
+# le mois, le type de panne et la description.
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+from periods import Period
+from store import DATA_DIR, catalog, read_weeks
+
+DATABASE_NAME = 'evenements.sqlite'
+
+# Colonnes des arrêts agrégées dans le cube : clés puis mesures
+CUBE_KEYS = ['Machine', 'Type Of Failure', 'Microstop Description']
+CUBE_COLUMNS = CUBE_KEYS + ['Down Time', 'Delay Time', 'T, I']
+
+# Colonnes de regroupement disponibles : {nom affiché: colonne SQL}
+GROUP_COLUMNS = {'Semaine': 'periode', 'Mois': 'mois', 'Trimestre': 'trimestre', 'Année': 'annee',
+                 'Machine': 'machine', 'Type Of Failure': 'type_panne', 'Microstop Description': 'description'}
+
+# Mesures du cube : {nom affiché: expression SQL}
+MEASURES = {'Down Time': 'SUM(down_time)', 'Delay Time': 'SUM(delay_time)', 'T, I': 'SUM(ti)', 'NB': 'SUM(nb)'}
+
+_AGGREGATES = {'sum': MEASURES['Down Time'], 'count': MEASURES['NB']}
+
+# Version du schéma de la base (1 : table cube, 2 : table des arrêts bruts retirée,
+# 3 : description dans les index du cube)
+_SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cube (
+    annee INTEGER NOT NULL,
+    semaine INTEGER NOT NULL,
+    periode TEXT NOT NULL,
+    mois TEXT NOT NULL,
+    trimestre TEXT NOT NULL,
+    machine TEXT,
+    type_panne TEXT,
+    description TEXT,
+    down_time REAL,
+    delay_time REAL,
+    ti REAL,
+    nb INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS periodes (
+    periode TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cube_periode ON cube (periode, type_panne, description, machine);
+CREATE INDEX IF NOT EXISTS cube_mois ON cube (mois, type_panne, description);
+"""
+
+
+def _database_path():
+    return os.path.join(DATA_DIR, DATABASE_NAME)
+
+
+def _quarter(month):
+    return f"{month[:4]}-T{(int(month[5:]) - 1) // 3 + 1}"
+
+
+# Lignes du cube pour une semaine stockée : une ligne par machine, type de panne et
+# description (cellules vides comprises)
+def _cube_rows(period, df):
+    df = df.reindex(columns=CUBE_COLUMNS)
+    for column in CUBE_KEYS:
+        df[column] = df[column].astype(object)
+    cube = df.groupby(CUBE_KEYS, dropna=False).agg(down_time=('Down Time', 'sum'), delay_time=('Delay Time', 'sum'),
+                                               ti=('T, I', 'sum'), nb=('Down Time', 'count')).reset_index()
+    cube = cube.astype(object).where(cube.notna(), None)
+    prefix = (period.year, period.week, period.label, period.month, _quarter(period.month))
+    return [prefix + row for row in cube.itertuples(index=False, name=None)]
+
+
+# Mise à jour de la base sur le catalogue : semaines nouvelles ou réécrites
+# rechargées, semaines supprimées effacées. La comparaison est refaite une fois le
+# verrou d'écriture SQLite obtenu, un autre processus ayant pu synchroniser entre-temps
+def _sync(connection):
+    weeks = catalog()
+    current = dict(zip(weeks['periode'], weeks['generation'].astype(int)))
+    if dict(connection.execute('SELECT periode, generation FROM periodes')) == current:
+        return
+    periods = {label: Period(int(year), int(week))
+               for label, year, week in zip(weeks['periode'], weeks['annee'], weeks['semaine'])}
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        stored = dict(connection.execute('SELECT periode, generation FROM periodes'))
+        for label in set(stored) - set(current):
+            connection.execute('DELETE FROM cube WHERE periode = ?', (label,))
+            connection.execute('DELETE FROM periodes WHERE periode = ?', (label,))
+        stale = [periods[label] for label, generation in current.items() if stored.get(label) != generation]
+        for label, df in read_weeks(stale, CUBE_COLUMNS).items():
+            generation = current[label]
+            connection.execute('DELETE FROM cube WHERE periode = ?', (label,))
+            connection.executemany('INSERT INTO cube VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                   _cube_rows(periods[label], df))
+            connection.execute('INSERT OR REPLACE INTO periodes VALUES (?, ?)', (label, int(generation)))
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+
+
+# Mise à niveau d'une base créée par une version précédente : sans cube, toutes les
+# semaines sont recalculées ; la table des arrêts bruts, plus interrogée, est
+# supprimée ; les index du cube sans la description sont recréés
+def _upgrade(connection):
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    if version >= _SCHEMA_VERSION:
+        return
+    if version < 1:
+        connection.execute('DELETE FROM periodes')
+    connection.execute('DROP TABLE IF EXISTS arrets')
+    if version < 3:
+        connection.execute('DROP INDEX IF EXISTS cube_periode')
+        connection.execute('DROP INDEX IF EXISTS cube_mois')
+        connection.executescript(_SCHEMA)
+    connection.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+
+
+# Connexion à la base synchronisée avec le catalogue
+@contextmanager
+def events_database():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    connection = sqlite3.connect(_database_path(), timeout=60, isolation_level=None)
+    try:
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(_SCHEMA)
+        _upgrade(connection)
+        _sync(connection)
+        yield connection
+    finally:
+        connection.close()
+
+
+# Conditions WHERE communes aux requêtes
+def _filters(periods, months, machine, failure=None):
+    clauses, params = ['type_panne IS NOT NULL'], []
+    if periods is not None:
+        clauses.append(f"periode IN ({', '.join('?' * len(periods))})")
+        params.extend(periods)
+    if months is not None:
+        clauses.append(f"mois IN ({', '.join('?' * len(months))})")
+        params.extend(months)
+    if machine is not None:
+        clauses.append('instr(upper(machine), upper(?)) > 0')
+        params.append(machine)
+    if failure is not None:
+        clauses.append('type_panne = ?')
+        params.append(failure)
+    return ' AND '.join(clauses), params
+
+
+# Regroupement des arrêts sur les colonnes by (noms de GROUP_COLUMNS), trié par
+# valeur décroissante. agg : 'sum' (heures d'arrêt) ou 'count' (nombre d'arrêts),
+# rendu dans la colonne 'Down Time' comme df.groupby(by)['Down Time'].agg(agg).
+# periods (libellés "AAAA-Snn"), months ("AAAA-MM") et machine (texte contenu dans
+# le nom de la machine, ex. 'KOMAX') limitent les arrêts pris en compte
+def breakdown(by, periods=None, months=None, machine=None, agg='sum'):
+    if isinstance(by, str):
+        by = [by]
+    keys = ', '.join(GROUP_COLUMNS[column] for column in by)
+    where, params = _filters(periods, months, machine)
+    query = (f"SELECT {keys}, {_AGGREGATES[agg]} AS valeur FROM cube WHERE {where} "
+             f"GROUP BY {keys} ORDER BY valeur DESC")
+    with events_database() as connection:
+        rows = connection.execute(query, params).fetchall()
+    return pd.DataFrame(rows, columns=by + ['Down Time'])
+
+
+# Regroupement du cube sur les colonnes by (noms de GROUP_COLUMNS, liste vide pour le
+# total ; cellules vides écartées comme dans un groupby), trié par heures d'arrêt
+# décroissantes : colonnes by puis Down Time, Delay Time, T, I (heures) et NB
+# (nombre d'arrêts). periods, months et machine comme pour
+# breakdown ; failure limite à un type de panne
+def rollup(by, periods=None, months=None, machine=None, failure=None):
+    if isinstance(by, str):
+        by = [by]
+    keys = [GROUP_COLUMNS[column] for column in by]
+    where, params = _filters(periods, months, machine, failure)
+    where = ' AND '.join([where] + [f'{key} IS NOT NULL' for key in keys])
+    measures = ', '.join(MEASURES.values())
+    query = f"SELECT {', '.join(keys + [measures])} FROM cube WHERE {where}"
+    if keys:
+        query += f" GROUP BY {', '.join(keys)} ORDER BY {MEASURES['Down Time']} DESC"
+    with events_database() as connection:
+        rows = connection.execute(query, params).fetchall()
+    df = pd.DataFrame(rows, columns=by + list(MEASURES))
+    if not keys and df['NB'].isna().all():
+        return df.iloc[0:0]
+    return df
+
+
+# Même regroupement que rollup sur les arrêts d'un DataFrame, pour un export affiché
+# sans être enregistré : colonnes by puis Down Time, Delay Time, T, I et NB. machine
+# et failure comme pour rollup
+def frame_rollup(df, by, machine=None, failure=None):
+    if isinstance(by, str):
+        by = [by]
+    df = df.reindex(columns=CUBE_COLUMNS).dropna(subset=['Type Of Failure'] + by)
+    if machine is not None:
+        df = df[df['Machine'].astype(str).str.upper().str.contains(machine.upper(), regex=False)]
+    if failure is not None:
+        df = df[df['Type Of Failure'] == failure]
+    measures = {'Down Time': ('Down Time', 'sum'), 'Delay Time': ('Delay Time', 'sum'),
+                'T, I': ('T, I', 'sum'), 'NB': ('Down Time', 'count')}
+    if not by:
+        if df.empty:
+            return pd.DataFrame(columns=list(measures))
+        return pd.DataFrame([{name: df[column].agg(agg) for name, (column, agg) in measures.items()}])
+    df = df.astype({column: object for column in by})
+    grouped = df.groupby(by).agg(**measures).reset_index()
+    return grouped.sort_values('Down Time', ascending=False, ignore_index=True)
@@ -0,0 +1,587 @@
+# Moteur de lecture des exports Komax (MES)
+#
+# Lecture en flux des classeurs Excel : openpyxl en mode read_only ne construit
+# pas le modèle objet complet du classeur, les lignes sont parcourues une à une
+# et versées directement dans des colonnes typées.
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+from durations import DURATION_COLUMNS, convert_durations
+from periods import current_period, make_period
+from quality import REFERENTIAL_PATH, check_quality, format_report, known_failures, label_aliases
+from store import (CATEGORY_COLUMNS, append_week, atomic_write, store_lock, week_TO, week_version,
+                   write_week, write_weeks)
+
+# Détection du tableau : l'en-tête est cherché dans les premières lignes de la feuille
+REQUIRED_COLUMNS = ('Type Of Failure', 'Down Time')
+HEADER_SCAN_ROWS = 50
+
+# Lignes lues dans un bloc préalloué avant d'être typées : seules ces lignes sont
+# gardées en objets Python, les colonnes numériques sont stockées en tableaux NumPy
+CHUNK_ROWS = 4096
+
+# Types de panne exclus de l'analyse
+EXCLUDED_FAILURES = ['DEMARRAGE PARC', 'PREVENTIVE MAINTENANCE', 'N/A', '']
+
+# Cache des exports déjà importés (clé de l'export -> résultat nettoyé)
+CACHE_DIR = 'ingest_cache'
+CACHE_SIZE = 32
+
+# Version du nettoyage des exports, comprise dans la clé du cache : à incrémenter
+# quand le nettoyage change pour que les exports déjà importés soient recalculés
+PIPELINE_VERSION = 1
+
+# Numéro de semaine dans un nom de fichier : "S12", "Semaine 12", "week_12", "W12"...
+_WEEK_PATTERN = re.compile(r'(?<![a-z])(?:semaine|sem|week|wk|w|s)[\s_\-]*(\d{1,2})(?!\d)', re.IGNORECASE)
+# Année dans un nom de fichier : "2025"
+_YEAR_PATTERN = re.compile(r'(?<!\d)(20\d{2})(?!\d)')
+
+
+# Conversion d'une plage 'B:X' en indices de colonnes Excel (1-based)
+def _column_span(usecols):
+    first, last = usecols.split(':')
+    return column_index_from_string(first), column_index_from_string(last)
+
+
+# Noms de colonnes identiques à ceux produits par pd.read_excel
+def _column_names(header_values):
+    names = []
+    seen = {}
+    for i, value in enumerate(header_values):
+        name = f"Unnamed: {i}" if value is None or value == '' else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+# Valeur de cellule normalisée comme le fait le lecteur openpyxl de pandas.
+# strings : textes déjà lus, pour qu'un libellé répété (machine, type de panne...)
+# soit gardé une seule fois au lieu d'une copie par cellule
+def _cell_value(value, strings):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return strings.setdefault(value, value) if value != '' else None
+    return value
+
+
+# Conversion d'une liste de valeurs en colonne typée (int64, float64 ou object)
+def _typed_column(values):
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == 'empty':
+        return np.full(len(values), np.nan)
+    if kind in ('integer', 'floating', 'mixed-integer-float'):
+        if kind == 'integer' and None not in values:
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    column = np.empty(len(values), dtype=object)
+    column[:] = [np.nan if v is None else v for v in values]
+    return column
+
+
+# Assemblage des blocs typés d'une colonne : numérique si tous les blocs le sont,
+# sinon en objets, comme si la colonne avait été typée d'un seul tenant
+def _concat_chunks(chunks):
+    if not chunks:
+        return _typed_column([])
+    if all(chunk.dtype != object for chunk in chunks):
+        return np.concatenate(chunks)
+    return np.concatenate([_as_objects(chunk) for chunk in chunks])
+
+
+# Bloc numérique converti en objets : les flottants entiers redeviennent des
+# entiers, _cell_value ne laissant jamais de flottant entier dans une cellule
+def _as_objects(chunk):
+    if chunk.dtype == object:
+        return chunk
+    if chunk.dtype != np.float64:
+        return chunk.astype(object)
+    column = np.empty(len(chunk), dtype=object)
+    column[:] = [int(v) if v.is_integer() else v for v in chunk.tolist()]
+    return column
+
+
+# Typage des filled premières lignes du bloc, colonne par colonne, puis libération
+# des cellules du bloc
+def _flush_chunk(block, filled, chunks):
+    for j, column in enumerate(chunks):
+        column.append(_typed_column(block[:filled, j].tolist()))
+    block[:filled] = None
+
+
+# Ligne d'en-tête : contient toutes les colonnes obligatoires
+def _is_header(row):
+    labels = {str(v).strip() for v in row if v is not None}
+    return all(column in labels for column in REQUIRED_COLUMNS)
+
+
+# Ligne de pied de tableau (totaux) : première cellule renseignée commençant par "Total"
+def _is_footer(row):
+    for value in row:
+        if value is not None and value != '':
+            return isinstance(value, str) and value.strip().lower().startswith('total')
+    return False
+
+
+# Localisation du tableau dans les premières lignes de la feuille.
+# Retourne (en-tête, première colonne, dernière colonne exclue) en indices 0-based
+def _locate_table(rows):
+    for i, row in enumerate(rows):
+        if i >= HEADER_SCAN_ROWS:
+            break
+        if _is_header(row):
+            filled = [j for j, v in enumerate(row) if v is not None and v != '']
+            return row[filled[0]:filled[-1] + 1], filled[0], filled[-1] + 1
+    raise ValueError(f"En-tête du tableau introuvable dans les {HEADER_SCAN_ROWS} premières lignes "
+                     f"(colonnes attendues : {', '.join(REQUIRED_COLUMNS)})")
+
+
+# Lecture d'un export Excel en flux, en une seule passe sur la feuille.
+# Par défaut l'en-tête et l'étendue des colonnes sont détectées, et la lecture
+# s'arrête à la ligne de totaux. Avec header/usecols explicites, le résultat est
+# identique à pd.read_excel(source, header=header, usecols=usecols).
+# Les lignes sont rangées dans un bloc préalloué de CHUNK_ROWS lignes, typé colonne
+# par colonne dès qu'il est plein, et les textes répétés sont partagés : la mémoire
+# ne dépend que de la taille du bloc, des colonnes typées et des textes distincts
+def read_export(source, header=None, usecols=None):
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        if header is None:
+            rows = ws.iter_rows(values_only=True)
+            header_values, first, last = _locate_table(rows)
+        else:
+            min_col, max_col = _column_span(usecols)
+            rows = ws.iter_rows(min_row=header + 1, min_col=min_col, max_col=max_col, values_only=True)
+            header_values = next(rows, None)
+            if header_values is None:
+                return pd.DataFrame()
+            first, last = 0, len(header_values)
+
+        names = _column_names(header_values)
+        width = len(names)
+        block = np.empty((CHUNK_ROWS, width), dtype=object)
+        chunks = [[] for _ in names]
+        strings = {}
+        filled = 0
+        blank = 0
+        for row in rows:
+            row = row[first:last]
+            if len(row) < width:
+                row += (None,) * (width - len(row))
+            # Lignes entièrement vides ignorées en détection automatique ; avec un
+            # en-tête explicite, seules celles de fin de feuille le sont, comme pd.read_excel
+            if all(v is None or v == '' for v in row):
+                blank += header is not None
+                continue
+            if header is None and _is_footer(row):
+                break
+            for values in [(None,) * width] * blank + [row]:
+                block[filled] = [_cell_value(value, strings) for value in values]
+                filled += 1
+                if filled == CHUNK_ROWS:
+                    _flush_chunk(block, filled, chunks)
+                    filled = 0
+            blank = 0
+        if filled:
+            _flush_chunk(block, filled, chunks)
+    finally:
+        wb.close()
+
+    return pd.DataFrame({name: _concat_chunks(column) for name, column in zip(names, chunks)})
+
+
+# ==================== PIPELINE D'IMPORT ====================
+# lecture (read_export) -> normalize -> filter_events -> derive -> validate -> add_period
+# Toutes les pages passent par ce pipeline : le résultat stocké est le même
+# quelle que soit la page qui a déclenché l'import.
+
+# Libellés normalisés (espaces retirés, majuscules, alias du référentiel)
+# pour les colonnes de regroupement ; les cellules vides restent vides
+def normalize_labels(df):
+    aliases = label_aliases()
+    for column in CATEGORY_COLUMNS:
+        if column not in df.columns:
+            continue
+        filled = df[column].notna()
+        labels = df.loc[filled, column].astype(str).str.strip().str.upper()
+        df[column] = labels.replace(aliases.get(column, {})).reindex(df.index)
+    return df
+
+
+# Normalisation : colonnes vides retirées, libellés normalisés,
+# durées converties une seule fois en heures décimales
+def normalize(df):
+    df = normalize_labels(df.dropna(how='all', axis=1).copy())
+    warnings = convert_durations(df)
+    return df, warnings
+
+
+# Filtrage : arrêts hors analyse et lignes sans type de panne ou sans durée
+def filter_events(df):
+    df = df[~df['Type Of Failure'].isin(EXCLUDED_FAILURES)]
+    return df.dropna(subset=['Type Of Failure', 'Down Time']).reset_index(drop=True)
+
+
+# Colonnes dérivées : temps d'intervention 'T, I' = Down Time - Delay Time
+def derive(df):
+    if 'Delay Time' in df.columns:
+        df['T, I'] = df['Down Time'] - df['Delay Time']
+    return df
+
+
+# Validation de la structure du résultat avant stockage
+def validate(df):
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes après nettoyage : {', '.join(missing)}")
+    for column in DURATION_COLUMNS:
+        if column in df.columns and not pd.api.types.is_float_dtype(df[column]):
+            raise ValueError(f"La colonne '{column}' n'est pas en heures décimales")
+    return df
+
+
+# Contrôle qualité : les lignes qui violent une règle bloquante sont écartées
+# et le rapport est ajouté aux avertissements
+def quarantine(df, warnings):
+    df, quarantined, report = check_quality(df, known_failures())
+    return df, quarantined, warnings + format_report(report)
+
+
+# Lecture et nettoyage d'un export, indépendamment de la semaine
+# Retourne le DataFrame nettoyé, les lignes mises en quarantaine et la liste des
+# avertissements rencontrés
+def clean_export(source):
+    df, warnings = normalize(read_export(source))
+    df, quarantined, warnings = quarantine(derive(filter_events(df)), warnings)
+    return validate(df), quarantined, warnings
+
+
+# Ajout des colonnes de période (Semaine, Mois) à un export nettoyé
+def add_period(df, period):
+    df = df.copy()
+    df['Semaine'] = period.label
+    df['Mois'] = period.month
+    return df
+
+
+# Pipeline complet d'un export pour une semaine
+def process_export(source, period):
+    df, quarantined, warnings = clean_export(source)
+    return add_period(df, period), add_period(quarantined, period), warnings
+
+
+# Période d'une année et d'une semaine lues dans un export, None si la semaine
+# n'existe pas dans l'année (ex. "S53" une année de 52 semaines)
+def _period_or_none(year, week):
+    try:
+        return make_period(year, week)
+    except ValueError:
+        return None
+
+
+# Déduction de la période d'un export. Le nom du fichier donne la semaine et
+# éventuellement l'année ("Export_2025_S12.xlsx") ; à défaut, la colonne Date du
+# classeur (df) donne la semaine ISO la plus fréquente et son année. Une semaine du
+# nom qui n'existe pas dans son année est ignorée.
+# Sans df, None si le nom ne suffit pas ; avec df sans dates, l'année en cours
+# (None si la semaine n'existe pas cette année)
+def infer_period(name, df=None):
+    stem = os.path.splitext(os.path.basename(str(name)))[0]
+    match = _WEEK_PATTERN.search(stem)
+    week = int(match.group(1)) if match and 1 <= int(match.group(1)) <= 53 else None
+    year = _YEAR_PATTERN.search(stem)
+    if week is not None and year:
+        period = _period_or_none(year.group(1), week)
+        if period is not None:
+            return period
+        week = None
+
+    dates = pd.Series(dtype='datetime64[ns]')
+    if df is not None and 'Date' in df.columns:
+        dates = pd.to_datetime(df['Date'], errors='coerce').dropna()
+    if not dates.empty:
+        iso = dates.dt.isocalendar()
+        if week is not None and (iso['week'] == week).any():
+            iso = iso[iso['week'] == week]
+        elif week is not None:
+            period = _period_or_none(iso['year'].mode().iloc[0], week)
+            if period is not None:
+                return period
+        year, week = iso[['year', 'week']].value_counts().index[0]
+        return make_period(year, week)
+    if week is not None and df is not None:
+        return _period_or_none(current_period().year, week)
+    return None
+
+
+# Liste des exports .xlsx d'un dossier (fichiers de verrouillage Excel "~$" exclus)
+def list_exports(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith('.xlsx') and not f.startswith('~$')
+    )
+
+
+# Empreinte SHA-256 du contenu d'un export
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Empreinte d'un export donné par son contenu (bytes) ou son chemin, lu par blocs
+# sans être chargé en entier
+def _source_hash(source):
+    if isinstance(source, bytes):
+        return content_hash(source)
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Empreinte du référentiel des pannes (types connus, alias), vide s'il n'existe pas
+def _referential_hash():
+    try:
+        with open(REFERENTIAL_PATH, 'rb') as f:
+            return content_hash(f.read())
+    except OSError:
+        return ''
+
+
+# Clé d'un export dans le cache et l'index des semaines : le résultat du nettoyage
+# dépend du contenu (digest), du référentiel des pannes et de PIPELINE_VERSION
+def _export_key(digest):
+    return content_hash(f'{digest}:{_referential_hash()}:{PIPELINE_VERSION}'.encode())
+
+
+def _load_index():
+    try:
+        with open(os.path.join(CACHE_DIR, 'index.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'exports': {}, 'semaines': {}}
+
+
+def _save_index(index):
+    with atomic_write(os.path.join(CACHE_DIR, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=1)
+
+
+# Résultat nettoyé déjà en cache pour une empreinte :
+# (df, lignes en quarantaine, avertissements) ou None
+def _cached_export(index, digest):
+    entry = index['exports'].get(digest)
+    if entry is None or 'quarantaine' not in entry:
+        return None
+    try:
+        df = pd.read_pickle(os.path.join(CACHE_DIR, f'{digest}.pkl'))
+        quarantined = pd.read_pickle(os.path.join(CACHE_DIR, f'{digest}.quarantaine.pkl'))
+    except Exception:
+        del index['exports'][digest]
+        return None
+    entry['utilise'] = time.time()
+    return df, quarantined, entry['avertissements']
+
+
+# Mise en cache d'un résultat nettoyé, en ne gardant que les CACHE_SIZE plus récents
+def _remember_export(index, digest, df, quarantined, warnings):
+    with atomic_write(os.path.join(CACHE_DIR, f'{digest}.pkl')) as f:
+        df.to_pickle(f)
+    with atomic_write(os.path.join(CACHE_DIR, f'{digest}.quarantaine.pkl')) as f:
+        quarantined.to_pickle(f)
+    index['exports'][digest] = {'lignes': len(df), 'quarantaine': len(quarantined),
+                                'avertissements': warnings, 'utilise': time.time()}
+
+    exports = sorted(index['exports'], key=lambda d: index['exports'][d]['utilise'])
+    for old in exports[:-CACHE_SIZE]:
+        del index['exports'][old]
+        for name in (f'{old}.pkl', f'{old}.quarantaine.pkl'):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+# Vrai si la semaine stockée provient déjà de cet export avec ce TO
+def _is_unchanged(index, digest, period, TO):
+    week = index['semaines'].get(period.label)
+    return week is not None and week == {'empreinte': digest, 'TO': TO, 'version': week_version(period)}
+
+
+def _record_week(index, digest, period, TO):
+    index['semaines'][period.label] = {'empreinte': digest, 'TO': TO, 'version': week_version(period)}
+
+
+# Import d'un export unique avec cache par empreinte de contenu et du référentiel.
+# Un export déjà importé pour la même semaine et le même TO n'est ni relu ni réécrit,
+# sauf si le référentiel des pannes ou le nettoyage (PIPELINE_VERSION) ont changé.
+# En mode ajout (exports journaliers), les lignes sont ajoutées à la semaine existante
+# au lieu de la remplacer ; les lignes déjà présentes sont ignorées.
+# Les lignes écartées par le contrôle qualité sont rangées dans la quarantaine de la semaine.
+# Retourne (statut, df, avertissements) avec statut 'inchangé', 'sauvegardé', 'ajouté'
+# ou 'vide' (en mode ajout, df ne contient que les lignes ajoutées).
+# La lecture de l'export se fait hors verrou ; l'index et l'historique sont relus et
+# modifiés sous store_lock pour ne pas écraser l'import d'une autre session
+def ingest_upload(data, period, TO, append=False):
+    digest = _export_key(content_hash(data))
+    index = _load_index()
+    if not append and _is_unchanged(index, digest, period, TO):
+        return 'inchangé', None, []
+
+    cached = _cached_export(index, digest)
+    if cached is None:
+        df, quarantined, warnings = clean_export(io.BytesIO(data))
+    else:
+        df, quarantined, warnings = cached
+
+    with store_lock():
+        index = _load_index()
+        if not append and _is_unchanged(index, digest, period, TO):
+            return 'inchangé', None, []
+        if cached is None or digest not in index['exports']:
+            _remember_export(index, digest, df, quarantined, warnings)
+        else:
+            index['exports'][digest]['utilise'] = time.time()
+
+        df = add_period(df, period)
+        quarantined = add_period(quarantined, period)
+        if append:
+            df = append_week(period, df, TO, quarantined)
+            status = 'ajouté' if not df.empty else 'inchangé'
+        else:
+            status = 'sauvegardé' if write_week(period, df, TO, quarantined) else 'vide'
+            if status == 'sauvegardé':
+                _record_week(index, digest, period, TO)
+        _save_index(index)
+    return status, df, warnings
+
+
+# Import depuis une page de rapport. Une semaine absente de l'historique est
+# enregistrée ; une semaine déjà stockée n'est remplacée que si replace, car ses
+# arrêts ajoutés par les exports journaliers et son TO seraient perdus. Sinon
+# l'export est seulement nettoyé pour le rapport, sans rien écrire.
+# Retourne (statut, df, avertissements) comme ingest_upload, avec le statut
+# 'non enregistré' et le DataFrame nettoyé de l'export si la semaine stockée est gardée
+def ingest_report(data, period, TO, replace=False):
+    if replace or week_version(period) is None:
+        return ingest_upload(data, period, TO)
+    digest = _export_key(content_hash(data))
+    index = _load_index()
+    if _is_unchanged(index, digest, period, week_TO(period)):
+        return 'inchangé', None, []
+    cached = _cached_export(index, digest)
+    df, _, warnings = cached if cached is not None else clean_export(io.BytesIO(data))
+    return 'non enregistré', add_period(df, period), warnings
+
+
+# Tâche exécutée dans un processus du pool : lecture et nettoyage d'un export, donné
+# par son chemin (lu par le processus) ou son contenu (bytes)
+# Retourne (résultat, df, lignes en quarantaine)
+def _ingest_worker(name, source, period):
+    try:
+        df, quarantined, warnings = clean_export(io.BytesIO(source) if isinstance(source, bytes) else source)
+        if period is None:
+            period = infer_period(name, df)
+            if period is None:
+                return {'fichier': name, 'semaine': None, 'erreur': "Numéro de semaine introuvable"}, None, None
+        result = {'fichier': name, 'semaine': period, 'lignes': len(df),
+                  'quarantaine': len(quarantined), 'avertissements': warnings}
+        return result, df, quarantined
+    except Exception as e:
+        return {'fichier': name, 'semaine': period, 'erreur': str(e)}, None, None
+
+
+# Démarrage des processus de l'import groupé. Un processus démarré par spawn
+# réexécute le script principal, qui sous Streamlit est la page en cours : le module
+# principal est remplacé par un module vide le temps de les démarrer (les tâches
+# n'ont besoin que de ce module)
+@contextmanager
+def _bare_main():
+    main = sys.modules.get('__main__')
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+# Import groupé : traitement parallèle de plusieurs exports puis écriture en un lot
+# sources : liste de (nom, chemin ou contenu bytes) ; progress(fait, total, nom) optionnel
+# Les exports déjà importés pour leur semaine sont signalés 'inchangé' sans être relus.
+# Un export donné par son chemin n'est lu que par son processus : le lot n'est jamais
+# chargé en mémoire en entier. Les processus sont démarrés par spawn (pas de fork
+# d'un serveur Streamlit et de ses threads, même comportement que sous Windows)
+def ingest_many(sources, TO, max_workers=None, progress=None):
+    index = _load_index()
+    results = []
+    jobs = []
+    for name, source in sources:
+        digest = _export_key(_source_hash(source))
+        period = infer_period(name)
+        if period is not None and _is_unchanged(index, digest, period, TO):
+            results.append({'fichier': name, 'semaine': period.label, 'statut': 'inchangé'})
+        else:
+            jobs.append((digest, name, source, period))
+
+    frames = {}
+    quarantines = {}
+    digests = {}
+    saved = {}
+    cleaned = []
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), mp_context=get_context('spawn')) as pool:
+        with _bare_main():
+            futures = {pool.submit(_ingest_worker, name, source, period): digest
+                       for digest, name, source, period in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            result, df, quarantined = future.result()
+            period = result.get('semaine')
+            if period is not None:
+                result['semaine'] = period.label
+            if df is not None and period in frames:
+                result['erreur'] = f"Semaine {period.label} déjà présente dans le lot"
+            elif df is not None and not df.empty:
+                cleaned.append((futures[future], df, quarantined, result['avertissements']))
+                frames[period] = add_period(df, period)
+                quarantines[period] = add_period(quarantined, period)
+                digests[period] = futures[future]
+                saved[period] = result
+                result['statut'] = 'sauvegardé'
+            elif 'erreur' not in result:
+                result['erreur'] = "Aucune donnée valide"
+            results.append(result)
+            if progress:
+                progress(done, len(futures), result['fichier'])
+
+    # Semaines dont la période n'était connue qu'après lecture (contenu du classeur,
+    # nom sans année) : un export déjà importé n'est pas réécrit
+    with store_lock():
+        index = _load_index()
+        for digest, df, quarantined, warnings in cleaned:
+            _remember_export(index, digest, df, quarantined, warnings)
+        for period in list(frames):
+            if _is_unchanged(index, digests[period], period, TO):
+                del frames[period]
+                saved[period]['statut'] = 'inchangé'
+        for period in write_weeks(frames, TO, quarantines):
+            _record_week(index, digests[period], period, TO)
+        _save_index(index)
+    return sorted(results, key=lambda r: (r.get('semaine') or '', r['fichier']))
@@ -2,8 +2,11 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-from datetime import datetime, timedelta
-import os
+from datetime import datetime
+from events import breakdown
+from ingest import ingest_upload
+from periods import make_period
+from store import clear_store, week_summaries, week_top_failures
 
 # Configuration de la page
 st.set_page_config(layout="wide", page_title="Analyse Comparative des Pannes")
@@ -29,88 +32,23 @@ st.markdown("""
 # Titre principal
 st.markdown('<p class="main-title">Analyse Comparative des Top 3 Pannes</p>', unsafe_allow_html=True)
 
-# Fonction améliorée pour traiter les fichiers Excel
-def process_file(file, week_num):
+# Fonction pour importer un fichier Excel (sans effet s'il a déjà été importé pour cette semaine)
+def import_file(file, year, week_num, TO):
     try:
-        # Lecture avec gestion des erreurs de format
-        df = pd.read_excel(file, header=9, usecols='B:X')
-        
-        # Vérification des colonnes nécessaires
-        if 'Type Of Failure' not in df.columns or 'Down Time' not in df.columns:
-            st.error("Le fichier Excel ne contient pas les colonnes requises.")
-            return None
-            
-        # Nettoyage des données
-        df = df.dropna(how='all', axis=1)
-        df['Type Of Failure'] = df['Type Of Failure'].str.strip()
-        
-        # Filtrage
-        mask = ~df['Type Of Failure'].isin(['DEMARRAGE PARC', 'PREVENTIVE MAINTENANCE'])
-        df = df[mask].copy()
-        
-        if not df.empty:
-            df = df.iloc[:-1]  # Supprimer la dernière ligne seulement si le DataFrame n'est pas vide
-            
-        # Conversion des temps
-        try:
-            df['Down Time'] = pd.to_datetime(df['Down Time'], format="%H:%M:%S").dt.time
-            df['Down Time'] = df['Down Time'].apply(lambda x: x.hour + x.minute/60 + x.second/3600)
-        except:
-            st.warning("Format de temps incorrect - utilisation des valeurs brutes")
-            df['Down Time'] = pd.to_numeric(df['Down Time'], errors='coerce')
-        
-        # Ajout des métadonnées temporelles
-        df['Semaine'] = f"Semaine {week_num}"
-        
-        # Date et mois
-        year = datetime.now().year
-        week_start = datetime.strptime(f"{year}-W{week_num}-1", "%Y-W%W-%w")
-        df['Mois'] = (week_start + timedelta(weeks=(week_num-1)//4)).strftime('%Y-%m')  # Groupe par mois de 4 semaines
-        
-        return df.dropna(subset=['Type Of Failure', 'Down Time'])
+        status, df, warnings = ingest_upload(file.getvalue(), make_period(year, week_num), TO)
+        for warning in warnings:
+            st.warning(warning)
+        return status
     except Exception as e:
         st.error(f"Erreur critique lors du traitement: {str(e)}")
         return None
 
-# Fonction pour sauvegarder avec vérification
-def save_week_data(week_num, df):
-    try:
-        if not os.path.exists('weekly_data'):
-            os.makedirs('weekly_data')
-        
-        if df is not None and not df.empty:
-            save_path = f'weekly_data/week_{week_num}.pkl'
-            df.to_pickle(save_path)
-            return True
-        return False
-    except:
-        return False
-
-# Fonction pour charger les données avec vérification
-def load_historical_data(weeks_back=12):
-    data = {}
-    try:
-        if os.path.exists('weekly_data'):
-            files = sorted([f for f in os.listdir('weekly_data') if f.startswith('week_') and f.endswith('.pkl')], 
-                          key=lambda x: int(x.split('_')[1].split('.')[0]), 
-                          reverse=True)
-            
-            for f in files[:weeks_back]:
-                try:
-                    week_num = f.split('_')[1].split('.')[0]
-                    df = pd.read_pickle(f'weekly_data/{f}')
-                    if not df.empty:
-                        data[f"Semaine {week_num}"] = df
-                except:
-                    continue
-    except:
-        pass
-    return data
-
 # Interface utilisateur
 with st.sidebar:
     st.header("Configuration")
-    current_week = st.number_input("Numéro de semaine", min_value=1, max_value=52, 
+    current_year = st.number_input("Année", min_value=2000, max_value=2100,
+                                 value=datetime.now().isocalendar()[0])
+    current_week = st.number_input("Numéro de semaine", min_value=1, max_value=53, 
                                  value=datetime.now().isocalendar()[1])
     current_file = st.file_uploader("Importer le fichier Excel", type=['xlsx'])
     
@@ -120,21 +58,18 @@ with st.sidebar:
     
     if st.button("Traiter la semaine") and current_file:
         with st.spinner('Traitement en cours...'):
-            df = process_file(current_file, current_week)
-            if df is not None and not df.empty:
-                # Ajout du TO aux données
-                df['TO'] = TO
-                if save_week_data(current_week, df):
-                    st.success(f"Données de la semaine {current_week} sauvegardées!")
-                else:
-                    st.warning("Erreur lors de la sauvegarde")
-            else:
+            status = import_file(current_file, current_year, current_week, TO)
+            if status == 'inchangé':
+                st.info(f"Fichier déjà importé pour la semaine {current_week} : aucune modification")
+            elif status == 'sauvegardé':
+                st.success(f"Données de la semaine {current_week} sauvegardées!")
+            elif status == 'vide':
                 st.error("Aucune donnée valide à sauvegarder")
 
-# Chargement des données
-historical_data = load_historical_data()
+# Chargement des résumés des 12 dernières semaines (catalogue, sans lire les données)
+summaries = week_summaries(12)
 
-if not historical_data:
+if summaries.empty:
     st.warning("Aucune donnée historique valide trouvée. Veuillez importer des données.")
     st.stop()
 
@@ -142,21 +77,13 @@ if not historical_data:
 st.header("Comparaison des Top 3 Pannes")
 
 try:
-    # Préparation des données avec vérification
-    comparison_data = []
-    for week_name, df in historical_data.items():
-        if not df.empty and 'Type Of Failure' in df.columns and 'Down Time' in df.columns:
-            top_pannes = df.groupby('Type Of Failure')['Down Time'].sum().nlargest(3).reset_index()
-            if not top_pannes.empty:
-                top_pannes['Semaine'] = week_name
-                comparison_data.append(top_pannes)
+    # Top 3 de chaque semaine, lu dans les résumés du catalogue
+    comparison_df = week_top_failures(list(summaries['periode']), n=3)
     
-    if not comparison_data:
+    if comparison_df.empty:
         st.error("Aucune donnée valide pour la comparaison")
         st.stop()
     
-    comparison_df = pd.concat(comparison_data, ignore_index=True)
-    
     # Création du graphique
     fig = go.Figure()
     
@@ -164,7 +91,7 @@ try:
     
     for rank in range(1, 4):
         rank_data = []
-        for week_name in historical_data.keys():
+        for week_name in summaries['periode']:
             week_df = comparison_df[comparison_df['Semaine'] == week_name]
             if len(week_df) >= rank:
                 rank_data.append({
@@ -189,7 +116,7 @@ try:
 
     fig.update_layout(
         barmode='group',
-        title=f"Comparaison des Top 3 Pannes sur {len(historical_data)} Semaines",
+        title=f"Comparaison des Top 3 Pannes sur {len(summaries)} Semaines",
         xaxis_title="Semaine",
         yaxis_title="Temps d'arrêt (heures)",
         hovermode="x unified",
@@ -205,16 +132,15 @@ except Exception as e:
 st.header("Détails par Mois")
 
 # Sélection de mois à afficher
-months = sorted(set([df['Mois'].iloc[0] for df in historical_data.values() if 'Mois' in df.columns]), reverse=True)
+months = sorted(set(summaries['mois']), reverse=True)
 selected_month = st.selectbox("Sélectionner un mois", months)
 
 for month in months:
     if selected_month == month:
-        monthly_data = [df for week_name, df in historical_data.items() if 'Mois' in df.columns and df['Mois'].iloc[0] == month]
-        month_df = pd.concat(monthly_data, ignore_index=True)
+        month_weeks = list(summaries.loc[summaries['mois'] == month, 'periode'])
+        top_pannes = breakdown('Type Of Failure', periods=month_weeks).head(3)
         
-        if not month_df.empty and 'Type Of Failure' in month_df.columns and 'Down Time' in month_df.columns:
-            top_pannes = month_df.groupby('Type Of Failure')['Down Time'].sum().nlargest(3).reset_index()
+        if not top_pannes.empty:
             top_pannes['Pourcentage'] = (top_pannes['Down Time'] / top_pannes['Down Time'].sum()) * 100
             
             col1, col2 = st.columns([1, 2])
@@ -247,12 +173,9 @@ st.header("Indicateurs Clés")
 
 try:
     metrics = []
-    for week_name, df in historical_data.items():
-        if not df.empty and 'Down Time' in df.columns and 'TO' in df.columns:
-            TO = df['TO'].iloc[0]  # Temps d'ouverture
-            TA = df['Down Time'].sum()  # Temps d'arrêt
-            NB = df['Down Time'].count()  # Nombre d'occurrences
-            
+    for week_name, TO, TA, NB in summaries[['periode', 'TO', 'TA', 'NB']].itertuples(index=False):
+        # TO : temps d'ouverture, TA : temps d'arrêt, NB : nombre d'occurrences
+        if NB > 0:
             # Calcul des indicateurs
             mtbf = (TO - TA) / NB if NB > 0 else 0
             mttr = TA / NB if NB > 0 else 0
@@ -396,11 +319,8 @@ except Exception as e:
 
 # Bouton de réinitialisation
 if st.sidebar.button("🔄 Réinitialiser COMPLÈTEMENT l'application"):
-    # Supprimer les fichiers temporaires
-    if os.path.exists('weekly_data'):
-        for f in os.listdir('weekly_data'):
-            os.remove(os.path.join('weekly_data', f))
-        os.rmdir('weekly_data')
+    # Supprimer les données stockées
+    clear_store()
     
     # Réinitialiser le cache de Streamlit
     st.cache_data.clear()
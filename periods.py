@@ -0,0 +1,94 @@
+# Périodes hebdomadaires ISO (année + semaine) et calendrier des semaines
+#
+# Une semaine est identifiée par son année ISO et son numéro ISO (1 à 52, ou 53
+# certaines années) : la semaine 10 de deux années différentes ne se confondent pas.
+# Le mois d'une semaine est celui de son jeudi (le mois qui contient la majorité
+# de ses jours), comme l'année ISO est celle de son jeudi.
+import re
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import pandas as pd
+
+_LABEL_PATTERN = re.compile(r'^(\d{4})-S(\d{1,2})$')
+
+
+class Period(NamedTuple):
+    year: int
+    week: int
+
+    # Libellé affiché et trié chronologiquement : "2025-S09"
+    @property
+    def label(self):
+        return f"{self.year}-S{self.week:02d}"
+
+    # Lundi de la semaine
+    @property
+    def start(self):
+        return date.fromisocalendar(self.year, self.week, 1)
+
+    # Mois de la semaine ("AAAA-MM"), celui de son jeudi
+    @property
+    def month(self):
+        return (self.start + timedelta(days=3)).strftime('%Y-%m')
+
+
+# Nombre de semaines ISO d'une année (52 ou 53)
+def weeks_in_year(year):
+    return date(year, 12, 28).isocalendar()[1]
+
+
+# Période validée : ValueError si la semaine n'existe pas dans l'année
+def make_period(year, week):
+    year, week = int(year), int(week)
+    if not 1 <= week <= weeks_in_year(year):
+        raise ValueError(f"La semaine {week} n'existe pas en {year} ({weeks_in_year(year)} semaines)")
+    return Period(year, week)
+
+
+# Période ISO contenant une date
+def period_of(day):
+    iso = day.isocalendar()
+    return Period(iso[0], iso[1])
+
+
+# Période en cours
+def current_period():
+    return period_of(date.today())
+
+
+# Période correspondant à un libellé "AAAA-Snn", None si le libellé n'en est pas un
+def parse_label(label):
+    match = _LABEL_PATTERN.match(str(label))
+    if not match:
+        return None
+    return make_period(match.group(1), match.group(2))
+
+
+# Période suivante / précédente
+def shift(period, weeks):
+    return period_of(period.start + timedelta(weeks=weeks))
+
+
+# Calendrier des semaines ISO de first à last inclus (périodes) :
+# une ligne par semaine avec année, semaine, libellé, lundi, dimanche et mois
+def calendar_table(first, last):
+    mondays = pd.date_range(first.start, last.start, freq='7D')
+    iso = mondays.isocalendar()
+    return pd.DataFrame({
+        'annee': iso['year'].astype(int).to_numpy(),
+        'semaine': iso['week'].astype(int).to_numpy(),
+        'periode': [f"{y}-S{w:02d}" for y, w in zip(iso['year'], iso['week'])],
+        'debut': mondays.date,
+        'fin': (mondays + pd.Timedelta(days=6)).date,
+        'mois': (mondays + pd.Timedelta(days=3)).strftime('%Y-%m'),
+    })
+
+
+# Périodes dont le jeudi tombe dans un mois "AAAA-MM"
+def periods_in_month(month):
+    first = pd.Timestamp(f"{month}-01")
+    last = first + pd.offsets.MonthEnd(0)
+    table = calendar_table(period_of(first - pd.Timedelta(days=6)), period_of(last))
+    table = table[table['mois'] == month]
+    return [Period(y, w) for y, w in zip(table['annee'], table['semaine'])]
@@ -0,0 +1,114 @@
+# Contrôle qualité des arrêts importés
+#
+# Chaque règle est un masque booléen calculé en une passe sur tout le DataFrame.
+# Les lignes qui faussent les indicateurs (durées négatives, attente supérieure à
+# l'arrêt) sont mises en quarantaine ; les autres anomalies sont seulement signalées.
+import json
+
+import numpy as np
+import pandas as pd
+
+# Référentiel facultatif : types de panne connus et libellés à corriger
+# {"types": ["MARQUAGE", ...], "alias": {"Type Of Failure": {"MARQAGE": "MARQUAGE"}, "Machine": {...}}}
+REFERENTIAL_PATH = 'referentiel_pannes.json'
+
+# Colonnes montrées dans les exemples du rapport
+SAMPLE_COLUMNS = ['Date', 'Machine', 'Type Of Failure', 'Down Time', 'Delay Time']
+SAMPLE_SIZE = 5
+
+
+# Colonne de durée, vide (NaN) si l'export ne l'a pas : normalize retire les colonnes
+# entièrement vides, comme un 'Delay Time' jamais renseigné
+def _column(df, name):
+    return df[name] if name in df.columns else pd.Series(np.nan, index=df.index, dtype=float)
+
+
+def _negative_duration(df, known):
+    return (_column(df, 'Down Time').astype(float) < 0) | (_column(df, 'Delay Time').astype(float) < 0)
+
+
+def _delay_over_down(df, known):
+    return _column(df, 'Delay Time').astype(float) > _column(df, 'Down Time').astype(float)
+
+
+def _blank_machine(df, known):
+    if 'Machine' not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df['Machine'].isna() | (df['Machine'].astype(str).str.strip() == '')
+
+
+def _unknown_failure(df, known):
+    if not known:
+        return pd.Series(False, index=df.index)
+    return ~df['Type Of Failure'].isin(known)
+
+
+# Règles : (code, libellé, masque(df, types connus), mise en quarantaine)
+QUALITY_RULES = [
+    ('duree_negative', "avec une durée négative", _negative_duration, True),
+    ('attente_superieure', "avec un Delay Time supérieur au Down Time", _delay_over_down, True),
+    ('machine_vide', "sans machine", _blank_machine, False),
+    ('type_inconnu', "avec un type de panne absent du référentiel", _unknown_failure, False),
+]
+
+
+# Contenu du référentiel, vide s'il n'existe pas
+def load_referential(path=REFERENTIAL_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Types de panne du référentiel, None s'il n'existe pas
+def known_failures(path=REFERENTIAL_PATH):
+    return set(load_referential(path).get('types', [])) or None
+
+
+# Libellés à corriger par colonne : {colonne: {alias: libellé}}
+def label_aliases(path=REFERENTIAL_PATH):
+    return load_referential(path).get('alias', {})
+
+
+# Application des règles. Retourne (lignes conservées, lignes en quarantaine, rapport)
+# Le rapport contient une entrée par règle déclenchée : code, libellé, nombre de
+# lignes, mise en quarantaine et exemples de lignes fautives
+def check_quality(df, known=None):
+    report = []
+    quarantine = pd.Series(False, index=df.index)
+    for code, label, rule, blocking in QUALITY_RULES:
+        mask = rule(df, known).fillna(False).astype(bool)
+        count = int(mask.sum())
+        if not count:
+            continue
+        sample = df.loc[mask, [c for c in SAMPLE_COLUMNS if c in df.columns]].head(SAMPLE_SIZE)
+        report.append({'regle': code, 'libelle': label, 'lignes': count,
+                       'quarantaine': blocking, 'exemples': sample})
+        if blocking:
+            quarantine |= mask
+    return (df[~quarantine].reset_index(drop=True),
+            df[quarantine].reset_index(drop=True),
+            report)
+
+
+def _format_value(value):
+    if pd.isna(value):
+        return '(vide)'
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%d/%m/%Y')
+    return str(value)
+
+
+# Rapport qualité sous forme de messages lisibles
+def format_report(report):
+    messages = []
+    for entry in report:
+        action = "mise(s) en quarantaine" if entry['quarantaine'] else "conservée(s)"
+        sample = '; '.join(
+            ' | '.join(_format_value(v) for v in row) for row in entry['exemples'].itertuples(index=False)
+        )
+        messages.append(f"{entry['lignes']} ligne(s) {entry['libelle']} {action} (ex. : {sample})")
+    return messages
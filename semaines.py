@@ -3,7 +3,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 from datetime import datetime
-import os
+from ingest import ingest_upload
+from periods import make_period
+from store import clear_store, failure_summaries, week_summaries, week_top_failures
 
 # Configuration de la page
 st.set_page_config(layout="wide", page_title="Analyse Comparative des Pannes")
@@ -26,81 +28,33 @@ st.markdown("""
 # Titre principal
 st.markdown('<p class="main-title">Analyse Comparative des Top 3 Pannes</p>', unsafe_allow_html=True)
 
-# Fonction améliorée pour traiter les fichiers Excel
-def process_file(file):
+# Fonction pour importer un fichier Excel (sans effet s'il a déjà été importé pour cette semaine)
+def import_file(file, year, week_num, TO):
     try:
-        df = pd.read_excel(file, header=9, usecols='B:X')
-        if 'Type Of Failure' not in df.columns or 'Down Time' not in df.columns:
-            st.error("Le fichier Excel ne contient pas les colonnes requises.")
-            return None
-            
-        df = df.dropna(how='all', axis=1)
-        df['Type Of Failure'] = df['Type Of Failure'].str.strip()
-        
-        mask = ~df['Type Of Failure'].isin(['DEMARRAGE PARC', 'PREVENTIVE MAINTENANCE'])
-        df = df[mask].copy()
-        
-        if not df.empty:
-            df = df.iloc[:-1]
-            
-        try:
-            df['Down Time'] = pd.to_datetime(df['Down Time'], format="%H:%M:%S").dt.time
-            df['Down Time'] = df['Down Time'].apply(lambda x: x.hour + x.minute/60 + x.second/3600)
-        except:
-            st.warning("Format de temps incorrect - utilisation des valeurs brutes")
-            df['Down Time'] = pd.to_numeric(df['Down Time'], errors='coerce')
-        
-        return df.dropna(subset=['Type Of Failure', 'Down Time'])
+        status, df, warnings = ingest_upload(file.getvalue(), make_period(year, week_num), TO)
+        for warning in warnings:
+            st.warning(warning)
+        return status
     except Exception as e:
         st.error(f"Erreur critique lors du traitement: {str(e)}")
         return None
 
-def save_week_data(week_num, df, TO):
-    try:
-        if not os.path.exists('weekly_data'):
-            os.makedirs('weekly_data')
-        
-        if df is not None and not df.empty:
-            # Ajouter le TO aux données sauvegardées
-            df['TO'] = TO
-            save_path = f'weekly_data/week_{week_num}.pkl'
-            df.to_pickle(save_path)
-            return True
-        return False
-    except:
-        return False
-
-def load_historical_data(weeks_back=3):
-    data = {}
-    try:
-        if os.path.exists('weekly_data'):
-            files = sorted([f for f in os.listdir('weekly_data') if f.startswith('week_') and f.endswith('.pkl')], 
-                          key=lambda x: int(x.split('_')[1].split('.')[0]), 
-                          reverse=True)
-            
-            for f in files[:weeks_back]:
-                try:
-                    week_num = f.split('_')[1].split('.')[0]
-                    df = pd.read_pickle(f'weekly_data/{f}')
-                    if not df.empty:
-                        # Récupérer le TO sauvegardé
-                        TO = df['TO'].iloc[0] if 'TO' in df.columns else 168
-                        df = df.drop(columns=['TO'], errors='ignore')
-                        data[f"Semaine {week_num}"] = {'df': df, 'TO': TO}
-                except:
-                    continue
-    except:
-        pass
-    return data
-
 # Interface utilisateur
 with st.sidebar:
     st.header("Configuration")
     
+    current_year = st.number_input(
+        "Année",
+        min_value=2000,
+        max_value=2100,
+        value=datetime.now().isocalendar()[0],
+        key="annee"
+    )
+    
     current_week = st.number_input(
         "Numéro de semaine", 
         min_value=1, 
-        max_value=52, 
+        max_value=53, 
         value=datetime.now().isocalendar()[1],
         key="num_semaine"
     )
@@ -124,19 +78,18 @@ with st.sidebar:
     
     if st.button("Traiter la semaine") and current_file:
         with st.spinner('Traitement en cours...'):
-            df = process_file(current_file)
-            if df is not None and not df.empty:
-                if save_week_data(current_week, df, TO):
-                    st.success(f"Données de la semaine {current_week} sauvegardées!")
-                else:
-                    st.warning("Erreur lors de la sauvegarde")
-            else:
+            status = import_file(current_file, current_year, current_week, TO)
+            if status == 'inchangé':
+                st.info(f"Fichier déjà importé pour la semaine {current_week} : aucune modification")
+            elif status == 'sauvegardé':
+                st.success(f"Données de la semaine {current_week} sauvegardées!")
+            elif status == 'vide':
                 st.error("Aucune donnée valide à sauvegarder")
 
-# Chargement des données
-historical_data = load_historical_data()
+# Chargement des résumés des 3 dernières semaines (catalogue, sans lire les données)
+summaries = week_summaries(3)
 
-if not historical_data:
+if summaries.empty:
     st.warning("Aucune donnée historique valide trouvée. Veuillez importer des données.")
     st.stop()
 
@@ -144,27 +97,18 @@ if not historical_data:
 st.header("Comparaison des Top 3 Pannes")
 
 try:
-    comparison_data = []
-    for week_name, week_data in historical_data.items():
-        df = week_data['df']
-        if not df.empty and 'Type Of Failure' in df.columns and 'Down Time' in df.columns:
-            top_pannes = df.groupby('Type Of Failure')['Down Time'].sum().nlargest(3).reset_index()
-            if not top_pannes.empty:
-                top_pannes['Semaine'] = week_name
-                comparison_data.append(top_pannes)
+    comparison_df = week_top_failures(list(summaries['periode']), n=3)
     
-    if not comparison_data:
+    if comparison_df.empty:
         st.error("Aucune donnée valide pour la comparaison")
         st.stop()
     
-    comparison_df = pd.concat(comparison_data, ignore_index=True)
-    
     fig = go.Figure()
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c']
     
     for rank in range(1, 4):
         rank_data = []
-        for week_name in historical_data.keys():
+        for week_name in summaries['periode']:
             week_df = comparison_df[comparison_df['Semaine'] == week_name]
             if len(week_df) >= rank:
                 rank_data.append({
@@ -189,7 +133,7 @@ try:
 
     fig.update_layout(
         barmode='group',
-        title=f"Comparaison des Top 3 Pannes sur {len(historical_data)} Semaines",
+        title=f"Comparaison des Top 3 Pannes sur {len(summaries)} Semaines",
         xaxis_title="Semaine",
         yaxis_title="Temps d'arrêt (heures)",
         hovermode="x unified",
@@ -204,12 +148,13 @@ except Exception as e:
 # Affichage des tableaux détaillés
 st.header("Détails par Semaine")
 
-for week_name, week_data in historical_data.items():
-    df = week_data['df']
-    TO = week_data['TO']
+failures = failure_summaries(list(summaries['periode']))
+
+for week_name, TO in summaries[['periode', 'TO']].itertuples(index=False):
+    week_failures = failures[failures['Semaine'] == week_name]
     with st.expander(f"Détails - {week_name} (TO: {TO} heures)"):
-        if not df.empty and 'Type Of Failure' in df.columns and 'Down Time' in df.columns:
-            top_pannes = df.groupby('Type Of Failure')['Down Time'].sum().nlargest(3).reset_index()
+        if not week_failures.empty:
+            top_pannes = week_failures.nlargest(3, 'Down Time')[['Type Of Failure', 'Down Time']]
             top_pannes['Pourcentage'] = (top_pannes['Down Time'] / top_pannes['Down Time'].sum()) * 100
             
             col1, col2 = st.columns([1, 2])
@@ -244,14 +189,8 @@ st.header("Indicateurs Clés")
 
 try:
     metrics = []
-    for week_name, week_data in historical_data.items():
-        df = week_data['df']
-        TO = week_data['TO']
-        
-        if not df.empty and 'Down Time' in df.columns:
-            TA = df['Down Time'].sum()
-            NB = df['Down Time'].count()
-            
+    for week_name, TO, TA, NB in summaries[['periode', 'TO', 'TA', 'NB']].itertuples(index=False):
+        if NB > 0:
             mtbf = (TO - TA) / NB if NB > 0 else 0
             mttr = TA / NB if NB > 0 else 0
             disponibilite = ((TO - TA) / TO) * 100
@@ -409,10 +348,7 @@ except Exception as e:
     st.error(f"Erreur lors de la création du graphique de disponibilité: {str(e)}")
 # Bouton de réinitialisation
 if st.sidebar.button("🔄 Réinitialiser COMPLÈTEMENT l'application"):
-    if os.path.exists('weekly_data'):
-        for f in os.listdir('weekly_data'):
-            os.remove(os.path.join('weekly_data', f))
-        os.rmdir('weekly_data')
+    clear_store()
     
     st.cache_data.clear()
     
@@ -0,0 +1,1444 @@
+# Stockage de l'historique hebdomadaire des arrêts
+#
+# Chaque semaine est identifiée par sa période ISO (periods.Period : année + semaine)
+# et stockée dans une partition Parquet weekly_data/annee=AAAA/semaine=N/ :
+# data-G.parquet contient les arrêts importés, part-G.parquet les lignes ajoutées par
+# des exports journaliers (G : génération de l'écriture), et totaux-G.json les totaux
+# de la semaine (TA, NB, Delay) ainsi que les clés des lignes déjà présentes, tenus à
+# jour sans relire ni réécrire les données existantes. Le format est en colonnes : une
+# lecture ne charge que les colonnes demandées. Les lignes écartées par le contrôle
+# qualité sont rangées dans quarantaine/annee=AAAA/semaine=N/data-G.parquet, écrit
+# avec la semaine et désigné par son entrée du catalogue.
+#
+# Les colonnes de regroupement (type de panne, machine, description) sont stockées
+# en catégories dont le dictionnaire weekly_data/categories.json est commun à toutes
+# les semaines : les codes sont identiques d'une semaine à l'autre.
+#
+# Le catalogue décrit chaque partition (période, mois, TO, nombre de lignes,
+# empreinte du contenu, version du schéma, date d'écriture) : lister l'historique,
+# ses TO et ses mois ne demande qu'une lecture de ce fichier. Chaque écriture publie
+# une nouvelle version du catalogue, weekly_data/manifests/manifest-G.json, désignée
+# par weekly_data/CURRENT ; les versions précédentes et leurs fichiers sont gardés.
+# Revenir à une version de l'historique (rollback_store), d'une semaine
+# (rollback_week) ou tout réinitialiser (clear_store) ne fait que publier ou désigner
+# un catalogue, sans supprimer de fichier : la quarantaine suit sa semaine. collect_garbage supprime en tâche de fond
+# les versions au-delà des KEEP_GENERATIONS plus récentes et les fichiers qu'elles
+# étaient seules à référencer.
+#
+# Plusieurs serveurs Streamlit et le service d'import peuvent écrire en même temps :
+# chaque modification se fait sous un verrou inter-processus (store_lock) et chaque
+# fichier est écrit de façon atomique (atomic_write). Les fichiers de données ne sont
+# jamais réécrits : une écriture crée de nouveaux fichiers puis publie leur liste dans
+# le catalogue. Un lecteur lit les fichiers listés par le catalogue qu'il a chargé et
+# voit donc une semaine complète, avant ou après l'écriture, sans prendre de verrou.
+#
+# Les pages lisent les semaines à travers un cache Arrow partagé : chaque semaine y
+# est copiée une fois au format Arrow IPC (weekly_data/cache/AAAA-Snn-G.arrow, G :
+# génération de la semaine), puis mappée en mémoire par chaque processus. Les pages
+# ouvertes dans des serveurs Streamlit différents partagent ainsi les mêmes pages
+# mémoire du système, sans décoder ni copier les données. Une semaine réécrite
+# reçoit un nouveau fichier.
+#
+# Les semaines rendues aux pages (load_week, LazyHistory, load_historical_data) sont
+# gardées en mémoire une fois converties en pandas, partagées par toutes les sessions
+# et toutes les réexécutions du processus, et indexées par la génération de chaque
+# semaine : une écriture de la semaine (import, ajout, retour en arrière) lui donne
+# une nouvelle génération et rend sa copie caduque. Les moins récemment utilisées
+# sont évincées au-delà de HISTORY_CACHE_MB (variable d'environnement INOVER_CACHE_MO).
+#
+# Chaque entrée du catalogue porte aussi le résumé de sa semaine, calculé à
+# l'écriture : TA, NB, Delay, 'T, I', macro et micro-arrêts, et heures et nombre
+# d'arrêts par type de panne. Les indicateurs et les Top 3 par semaine
+# (week_summaries, week_top_failures) se lisent dans le catalogue sans ouvrir les
+# données, quelle que soit la taille de l'historique. Le catalogue tient aussi le
+# cumul de chaque mois (semaines du mois calendaire de leur jeudi, TO et totaux du
+# résumé) : une écriture ou un retour en arrière ne recalcule que le mois de sa
+# semaine, et les indicateurs d'un mois (month_summary) se lisent sans rien cumuler.
+#
+# Les semaines des mois et des années terminés sont regroupées par compact() dans
+# monthly_data/annee=AAAA/mois=MM/ et yearly_data/annee=AAAA/ : un fichier par mois
+# ou par année, une semaine par groupe de lignes, colonnes triées et encodées par
+# dictionnaire. Une lecture de plusieurs mois ou années n'ouvre que ces fichiers.
+#
+# Les anciennes sauvegardes weekly_data/week_N.pkl sont converties automatiquement
+# au premier accès (migrate_legacy).
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from durations import DURATION_COLUMNS, convert_durations
+from periods import Period, current_period, periods_in_month
+
+DATA_DIR = 'weekly_data'
+
+# Lignes écartées par le contrôle qualité, mêmes partitions que les données
+QUARANTINE_DIR = 'quarantaine'
+
+# Cache Arrow partagé entre les processus des pages
+SHARED_CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+
+# Versions du catalogue et désignation de la version en cours
+MANIFESTS_DIR = os.path.join(DATA_DIR, 'manifests')
+
+# Versions du catalogue conservées pour revenir en arrière
+KEEP_GENERATIONS = 20
+
+# Mémoire maximale (Mo) des semaines gardées en mémoire pour les pages
+HISTORY_CACHE_MB = float(os.environ.get('INOVER_CACHE_MO', 512))
+
+# Semaines compactées par mois et par année
+MONTHLY_DIR = 'monthly_data'
+YEARLY_DIR = 'yearly_data'
+
+# Ordre des lignes dans les fichiers compactés
+COMPACTION_SORT = ['Machine', 'Type Of Failure', 'Date']
+
+# Temps d'ouverture par défaut des anciennes sauvegardes sans TO
+DEFAULT_TO = 8235
+
+# Version du format des partitions (1 : week_N.pkl, 2 : Parquet avec TO par ligne,
+# 3 : Parquet avec TO dans le catalogue)
+SCHEMA_VERSION = 3
+
+# Colonnes de la clé d'une ligne, fixes pour que deux exports d'une même semaine
+# donnent les mêmes clés quelles que soient leurs autres colonnes (une colonne
+# entièrement vide est retirée par le nettoyage). KEY_VERSION change avec le calcul
+KEY_COLUMNS = ['Date', 'Machine', 'Type Of Failure', 'Microstop Description', 'Start Time', 'Down Time']
+KEY_VERSION = 2
+
+# Seuil des macro-arrêts (heures) : un arrêt plus court est un micro-arrêt
+MACRO_THRESHOLD = 10 / 60
+
+# Colonnes lues pour calculer le résumé d'une semaine
+SUMMARY_COLUMNS = ['Type Of Failure', 'Down Time', 'Delay Time', 'T, I']
+
+# Colonnes stockées en catégories
+CATEGORY_COLUMNS = ['Type Of Failure', 'Machine', 'Microstop Description']
+
+# Types de colonnes object que Parquet sait écrire tels quels
+_ARROW_KINDS = {'string', 'empty', 'integer', 'floating', 'mixed-integer-float', 'boolean',
+                'datetime', 'datetime64', 'date', 'time', 'timedelta', 'decimal', 'bytes'}
+
+# Fichiers de données d'une partition : data[-G].parquet ou part-G.parquet
+_FILE_PATTERN = re.compile(r'^(data|part)(?:-(\d+))?\.parquet$')
+
+# Nouvelles tentatives d'une lecture dont les fichiers ont été remplacés entre-temps
+READ_RETRIES = 3
+
+# Fichier de verrou, dans weekly_data pour suivre le dossier de l'historique
+_LOCK_NAME = '.verrou'
+_thread_lock = threading.RLock()
+_lock_state = {'depth': 0, 'file': None}
+
+# Semaines mappées par ce processus : {"AAAA-Snn": (fichier du cache, table Arrow)}
+_mapped = {}
+
+# Nettoyage en tâche de fond des anciennes versions (un seul à la fois par processus)
+_collector = {'thread': None}
+
+# Semaines chargées, de la moins à la plus récemment utilisée :
+# {clé: ((DataFrame, entrée du catalogue), taille en octets)}
+_history_cache = OrderedDict()
+_history_lock = threading.Lock()
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:  # LK_LOCK abandonne après 10 s d'attente
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Verrou exclusif des écritures de l'historique, partagé entre processus.
+# Réentrant : une fonction qui le détient peut en appeler d'autres qui le prennent
+@contextmanager
+def store_lock():
+    with _thread_lock:
+        if _lock_state['depth'] == 0:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            f = open(os.path.join(DATA_DIR, _LOCK_NAME), 'a+b')
+            _lock_file(f)
+            _lock_state['file'] = f
+        _lock_state['depth'] += 1
+        try:
+            yield
+        finally:
+            _lock_state['depth'] -= 1
+            if _lock_state['depth'] == 0:
+                _unlock_file(_lock_state['file'])
+                _lock_state['file'].close()
+                _lock_state['file'] = None
+
+
+def _sync_dir(folder):
+    if os.name == 'nt':
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Écriture atomique d'un fichier : fichier temporaire unique dans le même dossier,
+# vidé sur disque puis renommé. Un lecteur voit l'ancien contenu ou le nouveau,
+# jamais un fichier à moitié écrit, même après un arrêt brutal
+@contextmanager
+def atomic_write(path, mode='wb'):
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with open(fd, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _sync_dir(folder)
+
+
+# Répertoire de la partition d'une période
+def _partition(period, root=DATA_DIR):
+    return os.path.join(root, f'annee={period.year}', f'semaine={period.week}')
+
+
+# Fichiers de données présents dans une partition, sans catalogue : le data le plus
+# récent puis les part écrits après lui. data.parquet et part-K.parquet sont ceux
+# des versions précédentes (génération 0 pour data.parquet)
+def _scan_files(period):
+    found = []
+    for path in glob.glob(os.path.join(_partition(period), '*.parquet')):
+        match = _FILE_PATTERN.match(os.path.basename(path))
+        if match:
+            found.append((match.group(1), int(match.group(2) or 0), os.path.basename(path)))
+    base = max((g for kind, g, _ in found if kind == 'data'), default=None)
+    if base is None:
+        return []
+    return ([name for kind, g, name in found if kind == 'data' and g == base]
+            + [name for kind, g, name in sorted(found, key=lambda f: f[1]) if kind == 'part' and g > base])
+
+
+# Fichiers d'une semaine listés par son entrée du catalogue (hors fichier compacté)
+def _entry_files(period, entry):
+    return entry['fichiers'] if 'fichiers' in entry else _scan_files(period)
+
+
+# Fichier des totaux d'une semaine (totaux.json pour les versions précédentes)
+def _totals_path(period, entry=None):
+    return os.path.join(_partition(period), (entry or {}).get('totaux', 'totaux.json'))
+
+
+# Fichier de quarantaine désigné par l'entrée d'une semaine, None si elle n'en a pas
+# (data.parquet, non versionné, pour les versions précédentes)
+def _quarantine_path(period, entry):
+    name = entry.get('quarantaine', 'data.parquet')
+    return None if name is None else os.path.join(_partition(period, QUARANTINE_DIR), name)
+
+
+# Quarantaine la plus récente d'une semaine, sans catalogue (None si aucune)
+def _scan_quarantine(period):
+    names = [os.path.basename(p) for p in glob.glob(os.path.join(_partition(period, QUARANTINE_DIR), '*.parquet'))
+             if _FILE_PATTERN.match(os.path.basename(p))]
+    return max(names, key=lambda n: int(_FILE_PATTERN.match(n).group(2) or 0), default=None)
+
+
+def _categories_path():
+    return os.path.join(DATA_DIR, 'categories.json')
+
+
+def _current_path():
+    return os.path.join(DATA_DIR, 'CURRENT')
+
+
+def _generation_path(generation):
+    return os.path.join(MANIFESTS_DIR, f'manifest-{generation}.json')
+
+
+# Numéros des versions du catalogue conservées
+def _generations():
+    return sorted(int(os.path.basename(p)[len('manifest-'):-len('.json')])
+                  for p in glob.glob(os.path.join(MANIFESTS_DIR, 'manifest-*.json')))
+
+
+def _write_json(path, content):
+    with atomic_write(path, 'w') as f:
+        json.dump(content, f, ensure_ascii=False)
+
+
+# Colonnes object de types mélangés converties en texte pour l'écriture Parquet
+def _arrow_ready(df):
+    for column in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[column], skipna=True) not in _ARROW_KINDS:
+            filled = df[column].notna()
+            df[column] = df.loc[filled, column].astype(str).reindex(df.index)
+    return df
+
+
+def _write_parquet(df, path):
+    with atomic_write(path) as f:
+        _arrow_ready(df.copy()).to_parquet(f, index=False)
+
+
+# Lecture d'un fichier Parquet, limitée aux colonnes demandées qui existent
+def _read_parquet(path, columns=None):
+    if columns is not None:
+        names = pq.read_schema(path).names
+        columns = [c for c in columns if c in names]
+    return pd.read_parquet(path, columns=columns)
+
+
+# Dictionnaire commun des libellés : {colonne: [libellés dans l'ordre des codes]}
+def load_categories():
+    try:
+        with open(_categories_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Encodage en catégories des colonnes de regroupement. Les nouveaux libellés sont
+# ajoutés à la fin du dictionnaire commun pour ne jamais changer les codes existants
+def encode_categories(df):
+    with store_lock():
+        categories = load_categories()
+        changed = False
+        for column in CATEGORY_COLUMNS:
+            if column not in df.columns:
+                continue
+            known = categories.setdefault(column, [])
+            labels = df[column].astype('category')
+            if not all(isinstance(c, str) for c in labels.cat.categories):
+                labels = labels.cat.rename_categories(str)
+            new = sorted(set(labels.cat.categories) - set(known))
+            if new:
+                known.extend(new)
+                changed = True
+            df[column] = labels.cat.set_categories(known)
+        if changed:
+            _write_json(_categories_path(), categories)
+    return df
+
+
+# Alignement des catégories d'une semaine lue sur le dictionnaire commun actuel,
+# pour que les semaines concaténées restent en catégories
+def _align_categories(df, categories):
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and column in categories:
+            df[column] = df[column].astype('category').cat.set_categories(categories[column])
+    return df
+
+
+# Clé de chaque ligne : empreinte 64 bits des KEY_COLUMNS ramenées à un même type
+# (texte), la date au jour et la durée à la seconde. Une colonne absente compte vide
+def row_keys(df):
+    key = pd.DataFrame(index=df.index)
+    for column in KEY_COLUMNS:
+        values = df[column] if column in df.columns else pd.Series(np.nan, index=df.index)
+        if column == 'Date':
+            values = pd.to_datetime(values, errors='coerce').dt.strftime('%Y-%m-%d')
+        elif column == 'Down Time':
+            values = (pd.to_numeric(values, errors='coerce') * 3600).round()
+        key[column] = values.astype(str)
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+
+# Totaux d'un ensemble de lignes (heures d'arrêt, nombre d'arrêts, heures d'attente)
+def _totals(df):
+    return {
+        'TA': float(df['Down Time'].sum()),
+        'NB': int(df['Down Time'].count()),
+        'Delay': float(df['Delay Time'].sum()) if 'Delay Time' in df.columns else 0.0,
+    }
+
+
+# Résumé d'une semaine pour le catalogue : totaux des durées (heures), nombre
+# d'arrêts et {type de panne: [heures, nombre d'arrêts]}
+def _summary(df):
+    down = df['Down Time']
+    failures = (df.groupby('Type Of Failure', observed=True)['Down Time'].agg(['sum', 'count'])
+                if 'Type Of Failure' in df.columns else pd.DataFrame(columns=['sum', 'count']))
+    return {
+        'TA': float(down.sum()),
+        'NB': int(down.count()),
+        'Delay': float(df['Delay Time'].sum()) if 'Delay Time' in df.columns else 0.0,
+        'TI': float(df['T, I'].sum()) if 'T, I' in df.columns else 0.0,
+        'macro': float(down[down >= MACRO_THRESHOLD].sum()),
+        'micro': float(down[down < MACRO_THRESHOLD].sum()),
+        'pannes': {str(failure): [float(total), int(count)]
+                   for failure, total, count in failures.itertuples(name=None)},
+    }
+
+
+# Résumé d'une semaine complétée par des lignes ajoutées
+def _merge_summaries(summary, added):
+    merged = {key: summary[key] + added[key] for key in ('TA', 'NB', 'Delay', 'TI', 'macro', 'micro')}
+    merged['pannes'] = dict(summary['pannes'])
+    for failure, (total, count) in added['pannes'].items():
+        previous = merged['pannes'].get(failure, [0.0, 0])
+        merged['pannes'][failure] = [previous[0] + total, previous[1] + count]
+    return merged
+
+
+# Mise à jour du cumul du mois d'une semaine écrite (sous store_lock), depuis les
+# résumés de ses semaines stockées : semaines, TO et totaux du résumé. Le cumul est
+# retiré si le mois n'a plus de semaine ou si l'une d'elles n'a pas encore de résumé
+def _update_month(manifest, month):
+    months = manifest.setdefault('mois', {})
+    weeks = [manifest['semaines'][period.label] for period in periods_in_month(month)
+             if period.label in manifest['semaines']]
+    if not weeks or any('resume' not in entry for entry in weeks):
+        months.pop(month, None)
+        return
+    total = weeks[0]['resume']
+    for entry in weeks[1:]:
+        total = _merge_summaries(total, entry['resume'])
+    months[month] = dict(total, semaines=[Period(e['annee'], e['semaine']).label for e in weeks],
+                         TO=sum(entry['TO'] for entry in weeks))
+
+
+def _write_totals(period, totals, name):
+    _write_json(os.path.join(_partition(period), name), totals)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Catalogue en cours, désigné par CURRENT
+def _read_manifest():
+    try:
+        with open(_current_path(), encoding='utf-8') as f:
+            generation = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    return _read_json(_generation_path(generation))
+
+
+# Numéro de la prochaine écriture, supérieur à toutes les versions existantes
+# (y compris celles abandonnées par un retour en arrière)
+def _next_generation(manifest):
+    return max([manifest['generation']] + _generations()) + 1
+
+
+# Publication d'une version du catalogue (sous store_lock) : écriture de
+# manifests/manifest-G.json puis bascule de CURRENT. Les lecteurs voient la nouvelle
+# version à partir de ce moment. action décrit l'écriture dans l'historique des versions
+def _publish(manifest, generation, action):
+    manifest['generation'] = generation
+    manifest['action'] = action
+    manifest['ecrit_le'] = datetime.now().isoformat(timespec='seconds')
+    _write_json(_generation_path(generation), manifest)
+    _set_current(generation)
+
+
+def _set_current(generation):
+    with atomic_write(_current_path(), 'w') as f:
+        f.write(str(generation))
+    if len(_generations()) > KEEP_GENERATIONS:
+        _schedule_collection()
+
+
+# Catalogue des partitions, reconstruit depuis les fichiers s'il n'existe pas
+def _manifest():
+    return _read_manifest() or _rebuild_manifest()
+
+
+# Reconstruction du catalogue en cours : dernière version conservée si CURRENT est
+# absent, ancien weekly_data/manifest.json, sinon partitions Parquet existantes (TO
+# relu dans les données des versions précédentes), puis conversion des anciennes
+# sauvegardes .pkl
+def _rebuild_manifest():
+    with store_lock():
+        manifest = _read_manifest()
+        if manifest:
+            return manifest
+        generations = _generations()
+        if generations:
+            _set_current(generations[-1])
+            return _read_manifest()
+        previous = _read_json(os.path.join(DATA_DIR, 'manifest.json'))
+        if previous:
+            _publish(previous, previous['generation'], "conversion du catalogue")
+            os.remove(os.path.join(DATA_DIR, 'manifest.json'))
+            return previous
+
+        manifest = {'generation': 0, 'semaines': {}}
+        compacted = _scan_compacted()
+        for label, (entry, generation) in compacted.items():
+            manifest['semaines'][label] = entry
+            manifest['generation'] = max(manifest['generation'], generation)
+        for partition in glob.glob(os.path.join(DATA_DIR, 'annee=*', 'semaine=*')):
+            year = os.path.basename(os.path.dirname(partition))[len('annee='):]
+            week = os.path.basename(partition)[len('semaine='):]
+            if not (year.isdigit() and week.isdigit()):
+                continue
+            period = Period(int(year), int(week))
+            files = _scan_files(period)
+            written = max((int(_FILE_PATTERN.match(n).group(2) or 0) for n in files), default=None)
+            if written is None or (period.label in compacted and written <= compacted[period.label][1]):
+                continue
+            paths = [os.path.join(partition, name) for name in files]
+            stored_TO = _read_parquet(paths[0], ['TO'])
+            manifest['generation'] = max(manifest['generation'], written) + 1
+            manifest['semaines'][period.label] = _manifest_entry(
+                period, stored_TO['TO'].iloc[0] if 'TO' in stored_TO.columns and len(stored_TO) else DEFAULT_TO,
+                sum(pq.read_metadata(p).num_rows for p in paths),
+                _load_totals(period, {'fichiers': files})['cles'], manifest['generation'], files,
+                schema=2 if 'TO' in pq.read_schema(paths[0]).names else SCHEMA_VERSION,
+                written=datetime.fromtimestamp(os.path.getmtime(paths[-1])),
+                quarantine=_scan_quarantine(period),
+            )
+        legacy = glob.glob(os.path.join(DATA_DIR, 'week_*.pkl')) or glob.glob(os.path.join(QUARANTINE_DIR, 'week_*.pkl'))
+        if manifest['semaines'] or legacy:
+            _publish(manifest, manifest['generation'], "reconstruction du catalogue")
+        if legacy:
+            migrate_legacy()
+            manifest = _read_manifest()
+        return manifest
+
+
+def _manifest_entry(period, TO, rows, keys, generation, files, schema=SCHEMA_VERSION, written=None,
+                    compacted=None, totals=None, summary=None, quarantine=None):
+    entry = {
+        'annee': period.year,
+        'semaine': period.week,
+        'mois': period.month,
+        'TO': TO.item() if isinstance(TO, np.generic) else TO,
+        'lignes': int(rows),
+        'empreinte': hashlib.sha256(np.asarray(keys, dtype=np.uint64).tobytes()).hexdigest(),
+        'schema': schema,
+        'ecrit_le': (written or datetime.now()).isoformat(timespec='seconds'),
+        'generation': generation,
+        'fichiers': files,
+        'quarantaine': quarantine,
+    }
+    if compacted:
+        entry['compacte'] = compacted
+    if totals:
+        entry['totaux'] = totals
+    if summary:
+        entry['resume'] = summary
+    return entry
+
+
+# Publication d'une partition écrite dans le catalogue (sous store_lock) : les
+# lecteurs voient ses nouveaux fichiers à partir de ce moment
+def _record_partition(manifest, generation, period, TO, rows, keys, files, action, summary, compacted=None,
+                      quarantine=None):
+    _set_partition(manifest, generation, period, TO, rows, keys, files, summary, compacted, quarantine)
+    _publish(manifest, generation, f"{action} {period.label}")
+
+
+# Entrée d'une partition écrite et cumul de son mois dans manifest, sans publication
+def _set_partition(manifest, generation, period, TO, rows, keys, files, summary, compacted=None,
+                   quarantine=None):
+    manifest['semaines'][period.label] = _manifest_entry(period, TO, rows, keys, generation, files,
+                                                         compacted=compacted, totals=f'totaux-{generation}.json',
+                                                         summary=summary, quarantine=quarantine)
+    _update_month(manifest, period.month)
+
+
+# Catalogue des semaines stockées (de la plus récente à la plus ancienne) : une ligne
+# par période avec annee, semaine, periode, mois, TO, lignes, empreinte, schema, ecrit_le,
+# generation. manifest permet de lister un catalogue déjà chargé
+def catalog(start=None, end=None, manifest=None):
+    manifest = manifest or _manifest()
+    entries = [dict(entry, periode=label) for label, entry in manifest['semaines'].items()
+               if (start is None or Period(entry['annee'], entry['semaine']) >= start)
+               and (end is None or Period(entry['annee'], entry['semaine']) <= end)]
+    columns = ['periode', 'annee', 'semaine', 'mois', 'TO', 'lignes', 'empreinte', 'schema', 'ecrit_le',
+               'generation']
+    return pd.DataFrame(entries, columns=columns).sort_values('periode', ascending=False, ignore_index=True)
+
+
+# Sauvegarde d'une semaine ; le TO est enregistré dans le catalogue.
+# Remplace la semaine entière, y compris les lignes ajoutées par append_week, et sa
+# quarantaine par les lignes quarantined si fournies
+def write_week(period, df, TO, quarantined=None):
+    if df is None or df.empty:
+        return False
+    with store_lock():
+        manifest = _manifest()
+        generation = _next_generation(manifest)
+        _stage_week(manifest, generation, period, df, TO, quarantined)
+        _publish(manifest, generation, f"import {period.label}")
+    return True
+
+
+# Écriture des fichiers d'une semaine pour la génération generation et de son entrée
+# dans manifest (sous store_lock), la publication restant à faire
+def _stage_week(manifest, generation, period, df, TO, quarantined=None):
+    df = df.drop(columns=['TO'], errors='ignore')
+    encode_categories(df)
+    files = [f'data-{generation}.parquet']
+    _write_parquet(df, os.path.join(_partition(period), files[0]))
+    keys = row_keys(df)
+    _write_totals(period, {**_totals(df), 'cles': keys.tolist(), 'version_cles': KEY_VERSION},
+                  f'totaux-{generation}.json')
+    _set_partition(manifest, generation, period, TO, len(df), keys, files, _summary(df),
+                   quarantine=_write_quarantine_file(period, generation, quarantined))
+
+
+# Totaux tenus à jour d'une semaine, reconstruits depuis les données s'ils manquent
+# ou si leurs clés ont été calculées par une version précédente de row_keys
+def _load_totals(period, entry=None):
+    entry = entry or _manifest()['semaines'][period.label]
+    totals = _read_json(_totals_path(period, entry))
+    if totals is not None and totals.get('version_cles') == KEY_VERSION:
+        return totals
+    df = _read_files(period, entry)
+    totals = {**_totals(df), 'cles': row_keys(df).tolist(), 'version_cles': KEY_VERSION}
+    _write_totals(period, totals, os.path.basename(_totals_path(period, entry)))
+    return totals
+
+
+# Ajout des lignes d'un export journalier à une semaine existante.
+# Les lignes déjà présentes (même clé) sont ignorées ; seules les nouvelles sont
+# écrites dans un fichier partiel et ajoutées aux totaux, les lignes quarantined à
+# sa quarantaine. Une semaine absente est créée.
+# Retourne le DataFrame des lignes effectivement ajoutées
+def append_week(period, df, TO, quarantined=None):
+    if df is None or df.empty:
+        return df
+    with store_lock():
+        manifest = _manifest()
+        entry = manifest['semaines'].get(period.label)
+        if entry is None:
+            write_week(period, df, TO, quarantined)
+            return df
+
+        totals = _load_totals(period, entry)
+        keys = row_keys(df)
+        new = ~np.isin(keys, np.array(totals['cles'], dtype=np.uint64)) & ~pd.Series(keys).duplicated().to_numpy()
+        df = df[new].reset_index(drop=True)
+        if df.empty:
+            return df
+
+        df = df.drop(columns=['TO'], errors='ignore')
+        summary = entry.get('resume') or _summary(_read_files(period, entry, SUMMARY_COLUMNS))
+        generation = _next_generation(manifest)
+        encode_categories(df)
+        files = _entry_files(period, entry) + [f'part-{generation}.parquet']
+        _write_parquet(df, os.path.join(_partition(period), files[-1]))
+        added = _totals(df)
+        keys = totals['cles'] + keys[new].tolist()
+        _write_totals(period, {
+            'TA': totals['TA'] + added['TA'],
+            'NB': totals['NB'] + added['NB'],
+            'Delay': totals['Delay'] + added['Delay'],
+            'cles': keys,
+            'version_cles': KEY_VERSION,
+        }, f'totaux-{generation}.json')
+        quarantine = entry.get('quarantaine', 'data.parquet')
+        if quarantined is not None and not quarantined.empty:
+            quarantine = _write_quarantine_file(period, generation, _added_quarantine(period, entry, quarantined))
+        _record_partition(manifest, generation, period, TO, len(keys), keys, files, "ajout",
+                          _merge_summaries(summary, _summary(df)), entry.get('compacte'), quarantine)
+    return df
+
+
+# Écriture de la quarantaine d'une semaine pour la génération generation (sous
+# store_lock). Retourne le nom du fichier, None si la quarantaine est vide
+def _write_quarantine_file(period, generation, df):
+    if df is None or df.empty:
+        return None
+    name = f'data-{generation}.parquet'
+    _write_parquet(df, os.path.join(_partition(period, QUARANTINE_DIR), name))
+    return name
+
+
+def _read_quarantine(period, entry):
+    path = _quarantine_path(period, entry)
+    if path is None or not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+# Quarantaine d'une semaine complétée par les lignes df, sans doublon
+def _added_quarantine(period, entry, df):
+    return pd.concat([_read_quarantine(period, entry), df], ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+# Remplacement des lignes mises en quarantaine d'une semaine stockée (ou ajout à
+# celles déjà présentes en mode ajout), publié comme une nouvelle version du
+# catalogue. Une quarantaine vide retire celle de la semaine.
+# Retourne False si la semaine n'est pas stockée
+def write_quarantine(period, df, append=False):
+    with store_lock():
+        manifest = _manifest()
+        entry = manifest['semaines'].get(period.label)
+        if entry is None:
+            return False
+        if append:
+            df = _added_quarantine(period, entry, df)
+        generation = _next_generation(manifest)
+        manifest['semaines'][period.label] = dict(entry, quarantaine=_write_quarantine_file(period, generation, df))
+        _publish(manifest, generation, f"quarantaine {period.label}")
+    return True
+
+
+# Lignes en quarantaine d'une semaine stockée (DataFrame vide si aucune)
+def read_quarantine(period):
+    entry = _manifest()['semaines'].get(period.label)
+    return pd.DataFrame() if entry is None else _read_quarantine(period, entry)
+
+
+# Totaux d'une semaine stockée : {'TA': heures, 'NB': arrêts, 'Delay': heures}
+def week_totals(period):
+    totals = _load_totals(period)
+    return {k: totals[k] for k in ('TA', 'NB', 'Delay')}
+
+
+# Sauvegarde en un lot de plusieurs semaines {période: DataFrame}, publiées ensemble
+# en une seule version du catalogue : un import de toute une année ne repousse pas
+# les versions précédentes hors des KEEP_GENERATIONS conservées. quarantines
+# ({période: DataFrame}) donne les lignes en quarantaine de chaque semaine.
+# Retourne les périodes écrites
+def write_weeks(frames, TO, quarantines=None):
+    periods = [period for period, df in sorted(frames.items()) if df is not None and not df.empty]
+    if not periods:
+        return []
+    with store_lock():
+        manifest = _manifest()
+        generation = _next_generation(manifest)
+        for period in periods:
+            _stage_week(manifest, generation, period, frames[period], TO, (quarantines or {}).get(period))
+        action = (f"import {periods[0].label}" if len(periods) == 1
+                  else f"import de {len(periods)} semaines ({periods[0].label} à {periods[-1].label})")
+        _publish(manifest, generation, action)
+    return periods
+
+
+# Version d'une semaine stockée (numéro de sa dernière écriture), None si absente
+def week_version(period):
+    entry = _manifest()['semaines'].get(period.label)
+    return entry['generation'] if entry else None
+
+
+# TO enregistré d'une semaine stockée, None si la semaine n'est pas stockée
+def week_TO(period):
+    entry = _manifest()['semaines'].get(period.label)
+    return entry['TO'] if entry else None
+
+
+# Groupe de lignes d'une semaine dans un fichier compacté, limité à ses colonnes
+def _read_compacted(compacted, columns=None, source=None):
+    source = source or pq.ParquetFile(compacted['fichier'])
+    names = compacted['colonnes'] if columns is None else [c for c in columns if c in compacted['colonnes']]
+    return source.read_row_group(compacted['groupe'], columns=names).to_pandas()
+
+
+# Lecture des fichiers d'une semaine (fichier compacté puis fichiers de la partition).
+# Le dictionnaire des catégories est relu après les données : il contient tous leurs
+# libellés, même ajoutés pendant la lecture. sources : fichiers compactés déjà ouverts
+def _read_files(period, entry, columns=None, sources=None):
+    frames = [_read_parquet(os.path.join(_partition(period), name), columns)
+              for name in _entry_files(period, entry)]
+    if 'compacte' in entry:
+        source = (sources or {}).get(entry['compacte']['fichier'])
+        frames.insert(0, _read_compacted(entry['compacte'], columns, source))
+    categories = load_categories()
+    frames = [_align_categories(frame, categories) for frame in frames]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if 'Semaine' in df.columns:
+        df['Semaine'] = period.label
+    if 'Mois' in df.columns:
+        df['Mois'] = period.month
+    return df
+
+
+# Lecture d'une semaine à partir de son entrée du catalogue. Si une écriture
+# concurrente a remplacé ses fichiers entre-temps, la lecture reprend sur le
+# catalogue à jour. Retourne (DataFrame, entrée lue)
+def _read_entry(period, entry, columns=None):
+    for attempt in range(READ_RETRIES):
+        try:
+            return _read_files(period, entry, columns), entry
+        except FileNotFoundError:
+            if attempt == READ_RETRIES - 1:
+                raise
+            entry = _manifest()['semaines'][period.label]
+
+
+# Lecture d'une semaine stockée, lignes ajoutées comprises.
+# columns limite la lecture aux colonnes demandées (toutes par défaut).
+# Les colonnes Semaine et Mois sont celles de la période de la partition
+def read_week(period, columns=None):
+    return _read_entry(period, _manifest()['semaines'][period.label], columns)[0]
+
+
+def _shared_cache_path(period, entry):
+    return os.path.join(SHARED_CACHE_DIR, f"{period.label}-{entry['generation']}.arrow")
+
+
+# Copie d'une semaine dans le cache partagé, puis suppression de ses copies
+# précédentes (laissées en place si un autre processus les mappe encore, Windows).
+# Retourne l'entrée du catalogue effectivement lue
+def _write_shared_cache(period, entry):
+    df, entry = _read_entry(period, entry)
+    table = pa.Table.from_pandas(_arrow_ready(df.drop(columns=['TO'], errors='ignore')), preserve_index=False)
+    path = _shared_cache_path(period, entry)
+    try:
+        with atomic_write(path) as f, pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+    except OSError:
+        if not os.path.exists(path):
+            raise
+    for old in glob.glob(os.path.join(SHARED_CACHE_DIR, f'{period.label}-*.arrow')):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return entry
+
+
+# Table Arrow d'une semaine, mappée en mémoire depuis le cache partagé (créé au
+# premier accès). Retourne (table, entrée du catalogue)
+def _mapped_week(period, entry):
+    path = _shared_cache_path(period, entry)
+    mapped = _mapped.get(period.label)
+    if mapped is not None and mapped[0] == path:
+        return mapped[1], entry
+    if not os.path.exists(path):
+        entry = _write_shared_cache(period, entry)
+        path = _shared_cache_path(period, entry)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    _mapped[period.label] = (path, table)
+    return table, entry
+
+
+# Lignes d'une table Arrow dont la colonne vérifie predicate (aucune si elle manque)
+def _filter_rows(table, column, predicate):
+    if column not in table.column_names:
+        return table.slice(0, 0)
+    return table.filter(pc.fill_null(predicate(table[column]), False))
+
+
+# DataFrame d'une semaine lu dans le cache partagé. Les filtres sont appliqués sur la
+# table mappée avant la conversion en pandas : machine (texte contenu dans le nom de
+# la machine, ex. 'KOMAX') et failures (types de panne retenus), puis la lecture est
+# limitée aux colonnes demandées. Les colonnes numériques sans valeur manquante
+# restent des vues sur la mémoire mappée (lecture seule).
+# Retourne (DataFrame, entrée du catalogue)
+def _week_frame(period, entry, columns=None, machine=None, failures=None):
+    table, entry = _mapped_week(period, entry)
+    if machine is not None:
+        table = _filter_rows(table, 'Machine', lambda c: pc.match_substring(c.cast(pa.string()), machine))
+    if failures is not None:
+        values = pa.array(list(failures), pa.string())
+        table = _filter_rows(table, 'Type Of Failure', lambda c: pc.is_in(c, value_set=values))
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    df = _align_categories(table.to_pandas(split_blocks=True), load_categories())
+    return df, entry
+
+
+# Lecture d'une ancienne sauvegarde week_N.pkl (et de ses ajouts), mise à niveau :
+# durées en heures décimales, 'T, I' calculé. Les anciennes pages ne convertissaient
+# que 'Down Time' : seules les colonnes encore non numériques (datetime.time, texte)
+# sont converties, les colonnes numériques étant déjà en heures
+def _read_legacy(path):
+    parts = glob.glob(path[:-len('.pkl')] + '.part*.pkl')
+    frames = [pd.read_pickle(p) for p in [path] + parts]
+    for df in frames:
+        convert_durations(df, [c for c in DURATION_COLUMNS
+                               if c in df.columns and not pd.api.types.is_numeric_dtype(df[c])])
+    df = pd.concat(frames, ignore_index=True) if parts else frames[0]
+    if 'Delay Time' in df.columns and 'T, I' not in df.columns:
+        df['T, I'] = df['Down Time'] - df['Delay Time']
+    return df, parts
+
+
+# Période d'une ancienne sauvegarde sans année : année ISO la plus fréquente de la
+# colonne Date, sinon l'année en cours
+def _legacy_period(week, df):
+    year = current_period().year
+    if df is not None and 'Date' in df.columns:
+        dates = pd.to_datetime(df['Date'], errors='coerce').dropna()
+        if not dates.empty:
+            year = int(dates.dt.isocalendar().year.mode().iloc[0])
+    return Period(year, week)
+
+
+# Conversion unique des anciennes sauvegardes weekly_data/week_N.pkl (et
+# quarantaine/week_N.pkl) en partitions Parquet. Les fichiers convertis sont supprimés ;
+# une quarantaine dont la semaine n'est pas stockée est laissée en place.
+# Retourne les périodes converties
+def migrate_legacy():
+    with store_lock():
+        return _migrate_legacy()
+
+
+def _migrate_legacy():
+    migrated = []
+    for path in glob.glob(os.path.join(DATA_DIR, 'week_*.pkl')):
+        week = os.path.basename(path)[len('week_'):-len('.pkl')]
+        if not week.isdigit():
+            continue
+        df, parts = _read_legacy(path)
+        period = _legacy_period(int(week), df)
+        quarantine = os.path.join(QUARANTINE_DIR, os.path.basename(path))
+        if week_version(period) is None and not df.empty:
+            TO = df['TO'].iloc[0] if 'TO' in df.columns else DEFAULT_TO
+            write_week(period, df, TO, pd.read_pickle(quarantine) if os.path.exists(quarantine) else None)
+            migrated.append(period)
+            parts.append(quarantine)
+        for old in [path, path[:-len('.pkl')] + '.json'] + parts:
+            if os.path.exists(old):
+                os.remove(old)
+
+    for path in glob.glob(os.path.join(QUARANTINE_DIR, 'week_*.pkl')):
+        week = os.path.basename(path)[len('week_'):-len('.pkl')]
+        if week.isdigit():
+            df = pd.read_pickle(path)
+            if write_quarantine(_legacy_period(int(week), df), df, append=True):
+                os.remove(path)
+    return sorted(migrated)
+
+
+# Dossier compacté d'une semaine : son année si elle est terminée, sinon son mois
+# s'il est terminé, None si la semaine reste hebdomadaire. month_ends : dernière
+# période de chaque mois déjà calculée
+def _compaction_folder(period, now, month_ends):
+    if period.year < now.year:
+        return os.path.join(YEARLY_DIR, f'annee={period.year}')
+    month = period.month
+    if month not in month_ends:
+        month_ends[month] = max(periods_in_month(month))
+    if month_ends[month] < now:
+        return os.path.join(MONTHLY_DIR, f'annee={month[:4]}', f'mois={month[5:]}')
+    return None
+
+
+# Écriture d'un fichier compacté : une semaine par groupe de lignes, triée sur
+# COMPACTION_SORT. La description des semaines (groupe, colonnes, TO, lignes,
+# génération) est gardée dans les métadonnées du fichier pour reconstruire le
+# catalogue. Retourne {"AAAA-Snn": référence de la semaine dans le fichier}
+def _write_compacted(path, periods, manifest):
+    tables, weeks = [], {}
+    for period in periods:
+        entry = manifest['semaines'][period.label]
+        df, entry = _read_entry(period, entry)
+        df = df.drop(columns=['TO'], errors='ignore')
+        df = df.sort_values([c for c in COMPACTION_SORT if c in df.columns], kind='stable', ignore_index=True)
+        weeks[period.label] = {'annee': period.year, 'semaine': period.week, 'groupe': len(tables),
+                               'colonnes': list(df.columns), 'TO': entry['TO'], 'lignes': len(df),
+                               'generation': entry['generation']}
+        tables.append(pa.Table.from_pandas(_arrow_ready(df), preserve_index=False))
+    tables = _unify_tables(tables)
+    table = pa.concat_tables(tables, promote_options='permissive')
+    schema = table.schema.remove_metadata().with_metadata({'inover': json.dumps({'semaines': weeks})})
+    with atomic_write(path) as f, pq.ParquetWriter(f, schema, use_dictionary=True) as writer:
+        offset = 0
+        for week in tables:
+            writer.write_table(table.slice(offset, week.num_rows).replace_schema_metadata(schema.metadata),
+                               row_group_size=week.num_rows)
+            offset += week.num_rows
+    return {label: {'fichier': path, 'groupe': week['groupe'], 'colonnes': week['colonnes']}
+            for label, week in weeks.items()}
+
+
+# Types d'une même colonne alignés d'une semaine à l'autre avant la concaténation :
+# les types compatibles (entiers et décimaux, colonne vide) sont promus par
+# concat_tables, une colonne de types incompatibles (ex. 'Order' en nombres une
+# semaine et en texte la suivante) est convertie en texte dans toutes les semaines
+def _unify_tables(tables):
+    fields = {}
+    for table in tables:
+        for field in table.schema:
+            fields.setdefault(field.name, []).append(field)
+    conflicts = set()
+    for name, group in fields.items():
+        try:
+            pa.unify_schemas([pa.schema([field]) for field in group], promote_options='permissive')
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            conflicts.add(name)
+    if not conflicts:
+        return tables
+    return [table.cast(pa.schema([pa.field(f.name, pa.string()) if f.name in conflicts else f
+                                  for f in table.schema], metadata=table.schema.metadata))
+            for table in tables]
+
+
+def _compacted_weeks(path):
+    return json.loads(pq.read_schema(path).metadata[b'inover'])['semaines']
+
+
+# Semaines des fichiers compactés les plus récents, pour reconstruire le catalogue :
+# {"AAAA-Snn": (entrée du catalogue, génération du fichier)}. Pour une semaine
+# présente dans un mois et dans une année, le fichier le plus récent l'emporte
+def _scan_compacted():
+    found = {}
+    folders = (glob.glob(os.path.join(MONTHLY_DIR, 'annee=*', 'mois=*'))
+               + glob.glob(os.path.join(YEARLY_DIR, 'annee=*')))
+    for folder in folders:
+        files = {int(os.path.basename(p)[len('data-'):-len('.parquet')]): p
+                 for p in glob.glob(os.path.join(folder, 'data-*.parquet'))}
+        if not files:
+            continue
+        generation = max(files)
+        path = files[generation]
+        for label, week in _compacted_weeks(path).items():
+            if label in found and found[label][1] >= generation:
+                continue
+            period = Period(week['annee'], week['semaine'])
+            compacted = {'fichier': path, 'groupe': week['groupe'], 'colonnes': week['colonnes']}
+            keys = _load_totals(period, {'fichiers': [], 'compacte': compacted})['cles']
+            found[label] = (_manifest_entry(period, week['TO'], week['lignes'], keys, week['generation'], [],
+                                            written=datetime.fromtimestamp(os.path.getmtime(path)),
+                                            compacted=compacted, quarantine=_scan_quarantine(period)),
+                           generation)
+    return found
+
+
+# Compactage des semaines des mois et des années terminés avant la période now
+# (la période en cours par défaut) en un fichier par mois ou par année. Un mois ou
+# une année n'est réécrit que si l'une de ses semaines a été écrite, complétée ou
+# ajoutée depuis son dernier compactage. Une version du catalogue est publiée après
+# chaque fichier ; les fichiers remplacés restent référencés par les versions
+# précédentes jusqu'à leur nettoyage. Un mois ou une année qui ne peut être compacté
+# reste hebdomadaire sans bloquer les suivants ; l'erreur est ajoutée à la liste
+# errors si fournie. Retourne la liste des fichiers écrits
+def compact(now=None, errors=None):
+    now = now or current_period()
+    written = []
+    with store_lock():
+        manifest = _manifest()
+        groups, month_ends = {}, {}
+        for entry in manifest['semaines'].values():
+            period = Period(entry['annee'], entry['semaine'])
+            folder = _compaction_folder(period, now, month_ends)
+            if folder is not None:
+                groups.setdefault(folder, []).append(period)
+
+        for folder, periods in sorted(groups.items()):
+            entries = [manifest['semaines'][p.label] for p in periods]
+            if all(e.get('fichiers') == [] and 'compacte' in e
+                   and os.path.dirname(e['compacte']['fichier']) == folder for e in entries):
+                continue
+            generation = _next_generation(manifest)
+            path = os.path.join(folder, f'data-{generation}.parquet')
+            try:
+                weeks = _write_compacted(path, sorted(periods), manifest)
+            except Exception as e:
+                if errors is not None:
+                    errors.append((folder, str(e)))
+                continue
+            for label, compacted in weeks.items():
+                manifest['semaines'][label] = dict(manifest['semaines'][label], fichiers=[], compacte=compacted)
+            _publish(manifest, generation, f"compactage {folder}")
+            written.append(path)
+    return written
+
+
+# Lecture de plusieurs semaines stockées : {"AAAA-Snn": DataFrame}. Chaque fichier
+# compacté n'est ouvert qu'une fois pour toutes ses semaines
+def read_weeks(periods, columns=None):
+    manifest = _manifest()
+    sources, frames = {}, {}
+    for period in periods:
+        entry = manifest['semaines'][period.label]
+        try:
+            if 'compacte' in entry and entry['compacte']['fichier'] not in sources:
+                sources[entry['compacte']['fichier']] = pq.ParquetFile(entry['compacte']['fichier'])
+            frames[period.label] = _read_files(period, entry, columns, sources)
+        except FileNotFoundError:
+            frames[period.label] = read_week(period, columns)
+    return frames
+
+
+# Catalogue dont toutes les semaines ont leur résumé et tous les mois leur cumul : les
+# semaines écrites par une version précédente (ou retrouvées par la reconstruction du
+# catalogue) sont résumées depuis leurs données une fois, les mois sans cumul sont
+# cumulés, puis le catalogue complété est publié
+def _summarized_manifest():
+    manifest = _manifest()
+    if _is_summarized(manifest):
+        return manifest
+    with store_lock():
+        manifest = _manifest()
+        if _is_summarized(manifest):
+            return manifest
+        missing = [Period(e['annee'], e['semaine']) for e in manifest['semaines'].values() if 'resume' not in e]
+        for label, df in read_weeks(missing, SUMMARY_COLUMNS).items():
+            manifest['semaines'][label]['resume'] = _summary(df)
+        for month in {entry['mois'] for entry in manifest['semaines'].values()} - set(manifest.get('mois', {})):
+            _update_month(manifest, month)
+        _publish(manifest, _next_generation(manifest), "calcul des résumés")
+        return manifest
+
+
+def _is_summarized(manifest):
+    return (all('resume' in entry for entry in manifest['semaines'].values())
+            and {entry['mois'] for entry in manifest['semaines'].values()} <= set(manifest.get('mois', {})))
+
+
+# Résumé des dernières semaines, de la plus récente à la plus ancienne : une ligne par
+# semaine avec periode, annee, semaine, mois, TO, TA, NB, Delay, TI, macro et micro
+# (heures, NB : nombre d'arrêts). start / end (périodes) limitent l'intervalle
+def week_summaries(weeks_back=None, start=None, end=None):
+    manifest = _summarized_manifest()
+    weeks = catalog(start, end, manifest).head(weeks_back)
+    totals = pd.DataFrame([{key: value for key, value in manifest['semaines'][label]['resume'].items()
+                            if key != 'pannes'} for label in weeks['periode']],
+                          columns=['TA', 'NB', 'Delay', 'TI', 'macro', 'micro'])
+    return pd.concat([weeks[['periode', 'annee', 'semaine', 'mois', 'TO']], totals], axis=1)
+
+
+# Heures et nombre d'arrêts par type de panne et par semaine : colonnes Semaine,
+# Type Of Failure, Down Time (heures) et NB. periods : libellés "AAAA-Snn"
+# (toutes les semaines si None)
+def failure_summaries(periods=None):
+    manifest = _summarized_manifest()
+    labels = manifest['semaines'] if periods is None else periods
+    rows = [(label, failure, total, count) for label in labels
+            for failure, (total, count) in manifest['semaines'][label]['resume']['pannes'].items()]
+    return pd.DataFrame(rows, columns=['Semaine', 'Type Of Failure', 'Down Time', 'NB'])
+
+
+# Top n des types de panne de chaque semaine, lu dans les résumés : colonnes Semaine,
+# Type Of Failure, Down Time (heures, ou nombre d'arrêts si agg='count') et Rank (1 à n)
+def week_top_failures(periods, n=3, agg='sum'):
+    df = failure_summaries(periods)
+    if agg == 'count':
+        df['Down Time'] = df['NB']
+    df = df.sort_values(['Semaine', 'Down Time'], ascending=[True, False], ignore_index=True)
+    df['Rank'] = df.groupby('Semaine').cumcount() + 1
+    return df[df['Rank'] <= n].drop(columns=['NB']).reset_index(drop=True)
+
+
+# Cumuls mensuels, du mois le plus récent au plus ancien : une ligne par mois avec
+# mois ("AAAA-MM"), semaines (nombre), TO, TA, NB, Delay, TI, macro et micro (heures,
+# NB : nombre d'arrêts)
+def month_summaries():
+    months = _summarized_manifest().get('mois', {})
+    rows = [dict({key: value for key, value in total.items() if key != 'pannes'},
+                 mois=month, semaines=len(total['semaines']))
+            for month, total in sorted(months.items(), reverse=True)]
+    return pd.DataFrame(rows, columns=['mois', 'semaines', 'TO', 'TA', 'NB', 'Delay', 'TI', 'macro', 'micro'])
+
+
+# Cumul d'un mois ("AAAA-MM") : semaines (libellés), TO, TA, NB, Delay, TI, macro,
+# micro et pannes ({type de panne: [heures, nombre d'arrêts]}), None si le mois n'a
+# aucune semaine stockée
+def month_summary(month):
+    return _summarized_manifest().get('mois', {}).get(month)
+
+
+# Heures et nombre d'arrêts par type de panne d'un mois : colonnes Type Of Failure,
+# Down Time (heures) et NB, par temps d'arrêt décroissant
+def month_failures(month):
+    total = month_summary(month) or {'pannes': {}}
+    rows = [(failure, hours, count) for failure, (hours, count) in total['pannes'].items()]
+    df = pd.DataFrame(rows, columns=['Type Of Failure', 'Down Time', 'NB'])
+    return df.sort_values('Down Time', ascending=False, ignore_index=True)
+
+
+# Périodes stockées, de la plus récente à la plus ancienne, limitées
+# à l'intervalle [start, end] si fourni
+def stored_periods(start=None, end=None):
+    return [Period(int(y), int(w)) for y, w in catalog(start, end)[['annee', 'semaine']].itertuples(index=False)]
+
+
+# Une semaine stockée : (DataFrame, TO du catalogue)
+def load_week(period, columns=None):
+    df, entry = _cached_week(period, _manifest()['semaines'][period.label], columns)
+    return df, entry['TO']
+
+
+def _cached_history(key):
+    with _history_lock:
+        cached = _history_cache.get(key)
+        if cached is None:
+            return None
+        _history_cache.move_to_end(key)
+        return cached[0]
+
+
+# Mise en mémoire d'une semaine chargée : ses copies d'une génération précédente sont
+# retirées, puis les moins récemment utilisées jusqu'à respecter HISTORY_CACHE_MB.
+# Une semaine plus grande que la limite n'est pas gardée
+def _remember_history(key, week):
+    size = int(week[0].memory_usage(deep=True).sum())
+    budget = HISTORY_CACHE_MB * 2**20
+    with _history_lock:
+        for old in [k for k in _history_cache if k[0] == key[0] and k[1] != key[1]]:
+            del _history_cache[old]
+        if size > budget:
+            return
+        _history_cache[key] = (week, size)
+        while sum(s for _, s in _history_cache.values()) > budget:
+            _history_cache.popitem(last=False)
+
+
+# Vidage des semaines gardées en mémoire (mesures de temps de chargement)
+def clear_history_cache():
+    with _history_lock:
+        _history_cache.clear()
+
+
+# Semaine lue dans le cache partagé (voir _week_frame), reprise de la mémoire si elle a
+# déjà été chargée pour sa génération avec les mêmes colonnes et filtres. Les pages
+# reçoivent une copie superficielle : elles peuvent ajouter ou remplacer des colonnes
+# sans modifier la semaine partagée. Retourne (DataFrame, entrée du catalogue)
+def _cached_week(period, entry, columns=None, machine=None, failures=None):
+    options = (tuple(columns) if columns is not None else None, machine,
+               tuple(sorted(failures)) if failures is not None else None)
+    week = _cached_history((period.label, entry['generation']) + options)
+    if week is None:
+        week = _week_frame(period, entry, columns, machine, failures)
+        _remember_history((period.label, week[1]['generation']) + options, week)
+    return week[0].copy(deep=False), week[1]
+
+
+# Historique des dernières semaines : {"AAAA-Snn": {'df': DataFrame, 'TO': TO, 'Mois': "AAAA-MM"}}
+# start / end (périodes) limitent l'intervalle, columns les colonnes chargées,
+# machine (texte contenu dans le nom de la machine) et failures (types de panne) les
+# arrêts chargés ; une semaine sans arrêt retenu a un DataFrame vide.
+# Les semaines illisibles sont ignorées et signalées dans la liste errors si fournie.
+# Les semaines déjà chargées pour leur génération sont reprises de la mémoire
+def load_historical_data(weeks_back=12, errors=None, columns=None, start=None, end=None,
+                         machine=None, failures=None):
+    manifest = _manifest()
+    data = {}
+    for label in catalog(start, end, manifest)['periode'].head(weeks_back):
+        entry = manifest['semaines'][label]
+        period = Period(entry['annee'], entry['semaine'])
+        try:
+            df, entry = _cached_week(period, entry, columns, machine, failures)
+        except Exception as e:
+            if errors is not None:
+                errors.append((_partition(period), str(e)))
+            continue
+        data[period.label] = {'df': df, 'TO': entry['TO'], 'Mois': entry['mois']}
+    return data
+
+
+# Historique chargé à la demande, avec la même interface que load_historical_data
+# ({"AAAA-Snn": {'df', 'TO', 'Mois'}}) : la liste des semaines et leur résumé
+# (summary : periode, mois, TO, lignes) viennent du catalogue, les lignes d'une
+# semaine ne sont lues qu'au premier accès à cette semaine, puis reprises de la
+# mémoire du processus aux réexécutions suivantes. week() rend une semaine complète et
+# prefetch() prépare en tâche de fond les semaines voisines
+class LazyHistory(Mapping):
+    def __init__(self, weeks_back=12, columns=None, start=None, end=None):
+        self._manifest = _manifest()
+        self.summary = catalog(start, end, self._manifest).head(weeks_back)[['periode', 'mois', 'TO', 'lignes']]
+        self._columns = columns
+        self._loaded = {}
+
+    def _entry(self, label):
+        entry = self._manifest['semaines'][label]
+        return Period(entry['annee'], entry['semaine']), entry
+
+    def __getitem__(self, label):
+        if label not in self:
+            raise KeyError(label)
+        if label not in self._loaded:
+            period, entry = self._entry(label)
+            df, entry = _cached_week(period, entry, self._columns)
+            self._loaded[label] = {'df': df, 'TO': entry['TO'], 'Mois': entry['mois']}
+        return self._loaded[label]
+
+    def __contains__(self, label):
+        return label in set(self.summary['periode'])
+
+    def __iter__(self):
+        return iter(self.summary['periode'])
+
+    def __len__(self):
+        return len(self.summary)
+
+    # Une semaine avec toutes ses colonnes : (DataFrame, TO du catalogue)
+    def week(self, label):
+        period, entry = self._entry(label)
+        df, entry = _cached_week(period, entry)
+        return df, entry['TO']
+
+    # Préparation en tâche de fond des around semaines avant et après label : leur
+    # copie du cache partagé est créée si besoin et mappée, le passage à une semaine
+    # voisine n'a plus qu'à la convertir
+    def prefetch(self, label, around=1):
+        labels = sorted(self.summary['periode'])
+        if label not in labels:
+            return
+        index = labels.index(label)
+        neighbours = labels[max(index - around, 0):index] + labels[index + 1:index + 1 + around]
+        entries = [self._entry(neighbour) for neighbour in neighbours]
+        threading.Thread(target=_prefetch_weeks, args=(entries,), name='prechargement-semaines',
+                         daemon=True).start()
+
+
+def _prefetch_weeks(entries):
+    for period, entry in entries:
+        try:
+            _mapped_week(period, entry)
+        except Exception:
+            pass
+
+
+# Réinitialisation de l'historique : publication d'un catalogue vide. L'historique
+# précédent et sa quarantaine restent disponibles par rollback_store jusqu'au
+# nettoyage de cette version
+def clear_store():
+    with store_lock():
+        generation = _next_generation(_manifest())
+        _publish({'generation': generation, 'semaines': {}, 'mois': {}}, generation, "réinitialisation")
+        _schedule_collection()
+
+
+# Versions conservées du catalogue, de la plus récente à la plus ancienne : une ligne
+# par version avec generation, ecrit_le, action, semaines (nombre) et en_cours
+def store_versions():
+    current = _manifest()['generation']
+    rows = []
+    for generation in reversed(_generations()):
+        manifest = _read_json(_generation_path(generation))
+        if manifest is not None:
+            rows.append({'generation': generation, 'ecrit_le': manifest.get('ecrit_le'),
+                         'action': manifest.get('action'), 'semaines': len(manifest['semaines']),
+                         'en_cours': generation == current})
+    return pd.DataFrame(rows, columns=['generation', 'ecrit_le', 'action', 'semaines', 'en_cours'])
+
+
+# Retour de tout l'historique à une version conservée du catalogue : seule la
+# désignation CURRENT change. Les écritures suivantes repartent de cette version
+def rollback_store(generation):
+    with store_lock():
+        if _read_json(_generation_path(generation)) is None:
+            raise ValueError(f"Version {generation} de l'historique introuvable")
+        _set_current(generation)
+
+
+# Versions conservées d'une semaine, de la plus récente à la plus ancienne : une ligne
+# par écriture avec generation, ecrit_le, lignes, TO et en_cours
+def week_versions(period):
+    current = _manifest()['semaines'].get(period.label, {}).get('generation')
+    rows, seen = [], set()
+    for generation in reversed(_generations()):
+        entry = (_read_json(_generation_path(generation)) or {'semaines': {}})['semaines'].get(period.label)
+        if entry is not None and entry['generation'] not in seen:
+            seen.add(entry['generation'])
+            rows.append({'generation': entry['generation'], 'ecrit_le': entry['ecrit_le'],
+                         'lignes': entry['lignes'], 'TO': entry['TO'],
+                         'en_cours': entry['generation'] == current})
+    return pd.DataFrame(rows, columns=['generation', 'ecrit_le', 'lignes', 'TO', 'en_cours'])
+
+
+# Retour d'une semaine à l'une de ses versions conservées (generation : numéro de
+# l'écriture de la semaine, voir week_versions). Les autres semaines sont inchangées
+def rollback_week(period, generation):
+    with store_lock():
+        for number in reversed(_generations()):
+            entry = (_read_json(_generation_path(number)) or {'semaines': {}})['semaines'].get(period.label)
+            if entry is not None and entry['generation'] == generation:
+                break
+        else:
+            raise ValueError(f"Version {generation} de la semaine {period.label} introuvable")
+        manifest = _manifest()
+        manifest['semaines'][period.label] = entry
+        _update_month(manifest, period.month)
+        _publish(manifest, _next_generation(manifest), f"retour {period.label} à la version {generation}")
+
+
+# Fichiers référencés par une entrée du catalogue (chemins normalisés)
+def _entry_paths(period, entry):
+    paths = [os.path.join(_partition(period), name) for name in _entry_files(period, entry)]
+    paths.append(_totals_path(period, entry))
+    if _quarantine_path(period, entry) is not None:
+        paths.append(_quarantine_path(period, entry))
+    if 'compacte' in entry:
+        paths.append(entry['compacte']['fichier'])
+    return {os.path.normpath(p) for p in paths}
+
+
+# Nettoyage : suppression des versions du catalogue au-delà des keep plus récentes
+# (la version en cours est toujours gardée), puis des fichiers de données, totaux,
+# quarantaines, fichiers compactés et copies du cache qu'aucune version gardée ne
+# référence. Un fichier encore ouvert (Windows) est laissé en place pour le nettoyage
+# suivant. Retourne le nombre de fichiers supprimés
+def collect_garbage(keep=KEEP_GENERATIONS):
+    removed = 0
+    with store_lock():
+        current = _manifest()
+        generations = _generations()
+        kept = set(generations[-keep:]) | {current['generation']}
+        for generation in generations:
+            if generation not in kept:
+                os.remove(_generation_path(generation))
+
+        referenced, cached = set(), set()
+        for generation in kept:
+            manifest = _read_json(_generation_path(generation)) or {'semaines': {}}
+            for entry in manifest['semaines'].values():
+                referenced |= _entry_paths(Period(entry['annee'], entry['semaine']), entry)
+        for entry in current['semaines'].values():
+            cached.add(os.path.normpath(_shared_cache_path(Period(entry['annee'], entry['semaine']), entry)))
+
+        candidates = [p for p in glob.glob(os.path.join(DATA_DIR, 'annee=*', 'semaine=*', '*'))
+                      if p.endswith('.parquet') or os.path.basename(p).startswith('totaux')]
+        candidates += glob.glob(os.path.join(QUARANTINE_DIR, 'annee=*', 'semaine=*', '*.parquet'))
+        candidates += glob.glob(os.path.join(MONTHLY_DIR, 'annee=*', 'mois=*', 'data-*.parquet'))
+        candidates += glob.glob(os.path.join(YEARLY_DIR, 'annee=*', 'data-*.parquet'))
+        candidates = [p for p in candidates if os.path.normpath(p) not in referenced]
+        candidates += [p for p in glob.glob(os.path.join(SHARED_CACHE_DIR, '*.arrow'))
+                       if os.path.normpath(p) not in cached]
+        for path in candidates:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+# Nettoyage lancé dans un thread de fond, sans bloquer la page qui a écrit
+def _schedule_collection():
+    thread = _collector['thread']
+    if thread is not None and thread.is_alive():
+        return
+    _collector['thread'] = threading.Thread(target=collect_garbage, name='nettoyage-historique', daemon=True)
+    _collector['thread'].start()
@@ -0,0 +1,94 @@
+# Outils communs des tests : historique isolé dans un dossier temporaire, semaines
+# et exports MES synthétiques
+import io
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import store  # noqa: E402
+
+EXPORT_COLUMNS = ['Date', 'Machine', 'Type Of Failure', 'Microstop Description', 'Start Time',
+                  'Down Time', 'Delay Time']
+
+MACHINES = ['KOMAX 01', 'KOMAX 02', 'SCHLEUNIGER 01']
+FAILURES = ['CAPTEUR', 'COUTEAUX', 'PINCE', 'ELECTRIQUE']
+DEFECTS = ['Capteur sale', 'Lame usée', 'Pince bloquée', 'Câble coincé']
+
+
+# Historique vide dans un dossier temporaire : le stockage, la quarantaine et le cache
+# des imports sont relatifs au dossier courant
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store.clear_history_cache()
+    store._mapped.clear()
+    yield tmp_path
+    thread = store._collector['thread']
+    if thread is not None:
+        thread.join()
+    store.clear_history_cache()
+    store._mapped.clear()
+
+
+# Semaine nettoyée de n arrêts identiques du lundi 3 mars 2025 (semaine 2025-S10),
+# numérotés à partir de start par leur heure de début
+def week_frame(n, start=0):
+    return pd.DataFrame({
+        'Date': pd.Timestamp('2025-03-03'),
+        'Machine': 'KOMAX 01',
+        'Type Of Failure': 'CAPTEUR',
+        'Microstop Description': 'Capteur sale',
+        'Start Time': [f'{6 + i // 60:02d}:{i % 60:02d}:00' for i in range(start, start + n)],
+        'Down Time': 0.5,
+        'Delay Time': 0.1,
+    })
+
+
+# Semaine nettoyée de n arrêts tirés au hasard (graine seed) sur les jours de period
+def random_week(period, n, seed):
+    rnd = np.random.default_rng(seed)
+    start = pd.Timestamp.fromisocalendar(period.year, period.week, 1) + pd.Timedelta(hours=6)
+    dates = start + pd.to_timedelta(np.sort(rnd.integers(0, 6 * 24 * 3600, n)), unit='s')
+    down = rnd.integers(20, 3 * 3600, n) / 3600
+    delay = down * rnd.random(n)
+    return pd.DataFrame({
+        'Date': dates.normalize(),
+        'Machine': rnd.choice(MACHINES, n),
+        'Type Of Failure': rnd.choice(FAILURES, n),
+        'Microstop Description': rnd.choice(DEFECTS, n),
+        'Start Time': dates.strftime('%H:%M:%S'),
+        'Down Time': down,
+        'Delay Time': delay,
+        'T, I': down - delay,
+        'Order': rnd.integers(100000, 1000000, n),
+        'Semaine': period.label,
+        'Mois': period.month,
+    })
+
+
+# Ligne d'arrêt d'un export : n-ième arrêt du lundi 3 mars 2025 (semaine 2025-S10)
+def export_row(n, down='00:30:00', delay='00:10:00', machine='KOMAX 01', failure='CAPTEUR'):
+    return [date(2025, 3, 3), machine, failure, 'Capteur sale',
+            f'{6 + n // 60:02d}:{n % 60:02d}:00', down, delay]
+
+
+# Contenu d'un export au format MES : titre, en-tête, lignes puis ligne de totaux
+def export_bytes(rows, columns=EXPORT_COLUMNS):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Rapport des arrêts Komax'])
+    ws.append([])
+    ws.append(columns)
+    for row in rows:
+        ws.append(row)
+    ws.append(['Total'])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,48 @@
+import io
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from durations import convert_durations, duration_hours, parse_durations
+
+
+def test_text_durations_over_24_hours():
+    hours = duration_hours(pd.Series(['27:30:00', '1 day, 3:00:00', '12:30', ' 08:00:00 ']))
+    assert hours.tolist() == [27.5, 27.0, 12.5, 8.0]
+
+
+def test_each_cell_type_is_converted():
+    values = pd.Series([time(1, 2, 3), 0.5, timedelta(hours=30), pd.Timedelta(minutes=5),
+                        datetime(2025, 3, 3, 10, 0), None, ''], dtype=object)
+    seconds, invalid = parse_durations(values)
+    assert seconds.tolist()[:5] == [3723, 43200, 108000, 300, 36000]
+    assert seconds.iloc[5:].isna().all()
+    assert not invalid.any()
+
+
+def test_unreadable_cells_are_reported():
+    seconds, invalid = parse_durations(pd.Series(['abc', '5', True, '00:10:00'], dtype=object))
+    assert invalid.tolist() == [True, True, True, False]
+    assert seconds.iloc[3] == 600
+
+
+# Cellules de durée au format hh:mm:ss relues par openpyxl : au-delà de 24 h, elles
+# reviennent en dates ancrées sur l'époque Excel, décalées d'un jour avant le 1er mars 1900
+def test_excel_cells_over_24_hours_roundtrip():
+    wb = Workbook()
+    ws = wb.active
+    for row, days in enumerate([1.125, 0.75, 59.5, 61.25], start=1):
+        ws.cell(row, 1, days).number_format = 'hh:mm:ss'
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    cells = [row[0] for row in load_workbook(buffer).active.iter_rows(values_only=True)]
+    assert duration_hours(pd.Series(cells, dtype=object)).tolist() == [27.0, 18.0, 1428.0, 1470.0]
+
+
+def test_convert_durations_only_given_columns():
+    df = pd.DataFrame({'Down Time': [0.5], 'Delay Time': [time(0, 15)]})
+    convert_durations(df, ['Delay Time'])
+    assert df['Down Time'].iloc[0] == 0.5
+    assert np.isclose(df['Delay Time'].iloc[0], 0.25)
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import store
+from conftest import random_week
+from events import _SCHEMA, DATABASE_NAME, breakdown, events_database, frame_rollup, rollup
+from periods import Period
+
+WEEK = Period(2025, 10)
+
+
+# Un export affiché sans être enregistré donne les mêmes regroupements que le cube
+def test_frame_rollup_matches_cube(store_dir):
+    df = random_week(WEEK, 200, 1)
+    store.write_week(WEEK, df, 8235)
+    for by, filters in [('Type Of Failure', {}), ('Machine', {'machine': 'komax'}),
+                        (['Machine', 'Type Of Failure'], {'machine': 'KOMAX'}),
+                        ('Microstop Description', {'failure': 'CAPTEUR'}), ([], {})]:
+        expected = rollup(by, periods=[WEEK.label], **filters)
+        pd.testing.assert_frame_equal(frame_rollup(df, by, **filters), expected, check_dtype=False)
+
+
+# Regroupements servis par la base : mêmes valeurs qu'un groupby sur les semaines
+def test_breakdown_matches_pandas(store_dir):
+    weeks = {Period(2025, week): random_week(Period(2025, week), 100, week) for week in (10, 11, 14)}
+    for period, df in weeks.items():
+        store.write_week(period, df, 8235)
+    history = pd.concat(weeks.values(), ignore_index=True)
+
+    top = breakdown('Type Of Failure', periods=['2025-S10', '2025-S11'])
+    expected = (history[history['Semaine'] != '2025-S14'].groupby('Type Of Failure')['Down Time'].sum()
+                .sort_values(ascending=False))
+    assert top['Type Of Failure'].tolist() == expected.index.tolist()
+    assert np.allclose(top['Down Time'], expected.to_numpy())
+
+    counts = breakdown(['Mois', 'Machine'], machine='komax', agg='count')
+    komax = history[history['Machine'].str.contains('KOMAX')]
+    assert counts['Down Time'].sum() == len(komax)
+    assert set(counts['Mois']) == {'2025-03', '2025-04'}
+
+
+# Requêtes par semaine, type de panne et description servies par l'index du cube,
+# y compris dans une base créée avant l'ajout de la description aux index
+def test_description_queries_use_the_cube_index(store_dir):
+    store.write_week(WEEK, random_week(WEEK, 50, 1), 8235)
+    os.makedirs(store.DATA_DIR, exist_ok=True)
+    with sqlite3.connect(os.path.join(store.DATA_DIR, DATABASE_NAME)) as connection:
+        connection.executescript(_SCHEMA.replace('type_panne, description, machine', 'type_panne, machine')
+                                 .replace('type_panne, description)', 'type_panne)'))
+        connection.execute('PRAGMA user_version = 2')
+
+    with events_database() as connection:
+        columns = [row[2] for row in connection.execute("PRAGMA index_info('cube_periode')")]
+        assert columns == ['periode', 'type_panne', 'description', 'machine']
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN SELECT description, SUM(nb) FROM cube "
+            "WHERE periode = ? AND type_panne = ? GROUP BY description", (WEEK.label, 'CAPTEUR')).fetchall()
+        assert 'USING COVERING INDEX cube_periode' in plan[0][3] or 'USING INDEX cube_periode' in plan[0][3]
+    assert rollup('Microstop Description', periods=[WEEK.label], failure='CAPTEUR')['NB'].sum() > 0
+
+
+# Cube par semaine × machine × panne × description : mêmes mesures qu'un groupby,
+# tenu à jour après un ajout et un retour en arrière
+def test_rollup_matches_pandas_and_follows_writes(store_dir):
+    df = random_week(WEEK, 150, 2)
+    store.write_week(WEEK, df, 8235)
+    first = store.week_version(WEEK)
+    cube = rollup(['Machine', 'Microstop Description'], periods=[WEEK.label], failure='PINCE')
+    expected = (df[df['Type Of Failure'] == 'PINCE'].groupby(['Machine', 'Microstop Description'])
+                .agg(down=('Down Time', 'sum'), delay=('Delay Time', 'sum'), ti=('T, I', 'sum'),
+                     nb=('Down Time', 'count')).sort_values('down', ascending=False))
+    assert list(zip(cube['Machine'], cube['Microstop Description'])) == expected.index.tolist()
+    assert np.allclose(cube[['Down Time', 'Delay Time', 'T, I', 'NB']], expected.to_numpy())
+
+    store.append_week(WEEK, random_week(WEEK, 30, 3), 8235)
+    assert rollup([], periods=[WEEK.label])['NB'].iloc[0] == 180
+    store.rollback_week(WEEK, first)
+    assert rollup([], periods=[WEEK.label])['NB'].iloc[0] == 150
+    assert rollup([], periods=['2025-S11']).empty
@@ -0,0 +1,166 @@
+import io
+import json
+import sys
+import types
+
+import pandas as pd
+
+import ingest
+import store
+from conftest import EXPORT_COLUMNS, export_bytes, export_row
+from ingest import clean_export, infer_period, ingest_many, ingest_report, ingest_upload, read_export
+from periods import Period
+
+WEEK = Period(2025, 10)
+
+
+# En-tête explicite : même résultat que read_excel, lignes vides intérieures comprises
+def test_read_export_matches_read_excel():
+    data = export_bytes([export_row(n) for n in range(10)] + [[None] * 7] + [export_row(10, down=None)])
+    ours = read_export(io.BytesIO(data), header=2, usecols='A:G')
+    reference = pd.read_excel(io.BytesIO(data), header=2, usecols='A:G')
+    pd.testing.assert_frame_equal(ours, reference)
+
+
+# En-tête détecté sous le titre, lecture arrêtée à la ligne des totaux
+def test_read_export_stops_at_totals():
+    df = read_export(io.BytesIO(export_bytes([export_row(n) for n in range(5)])))
+    assert list(df.columns) == EXPORT_COLUMNS
+    assert len(df) == 5
+
+
+def test_same_upload_is_unchanged(store_dir):
+    data = export_bytes([export_row(n) for n in range(4)])
+    assert ingest_upload(data, WEEK, 8235)[0] == 'sauvegardé'
+    version = store.week_version(WEEK)
+    assert ingest_upload(data, WEEK, 8235)[0] == 'inchangé'
+    assert store.week_version(WEEK) == version
+
+
+# Référentiel des pannes ou nettoyage modifiés : le même export est nettoyé à nouveau
+# au lieu d'être repris du cache
+def test_referential_or_pipeline_change_reprocesses_export(store_dir, monkeypatch):
+    data = export_bytes([export_row(n) for n in range(3)] + [export_row(3, failure='CAPTUER')])
+    assert ingest_upload(data, WEEK, 8235)[0] == 'sauvegardé'
+
+    with open(ingest.REFERENTIAL_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'alias': {'Type Of Failure': {'CAPTUER': 'CAPTEUR'}}}, f)
+    status, df, _ = ingest_upload(data, WEEK, 8235)
+    assert status == 'sauvegardé' and set(df['Type Of Failure']) == {'CAPTEUR'}
+
+    assert ingest_upload(data, WEEK, 8235)[0] == 'inchangé'
+    monkeypatch.setattr(ingest, 'PIPELINE_VERSION', ingest.PIPELINE_VERSION + 1)
+    assert ingest_upload(data, WEEK, 8235)[0] == 'sauvegardé'
+
+
+def test_infer_period_from_name():
+    assert infer_period('Export_2025_S12.xlsx') == Period(2025, 12)
+    assert infer_period('depot/Semaine 07 - 2026.xlsx') == Period(2026, 7)
+    assert infer_period('Semaine 10.xlsx') is None
+
+
+# Semaine impossible dans le nom (S53 une année de 52 semaines, S00) : ignorée, la
+# période vient alors des dates du classeur
+def test_infer_period_ignores_impossible_weeks():
+    df, _, _ = clean_export(io.BytesIO(export_bytes([export_row(n) for n in range(3)])))
+    for name in ('Export_2025_S53.xlsx', 'Export_2025_S00.xlsx'):
+        assert infer_period(name) is None
+        assert infer_period(name, df) == WEEK
+    assert infer_period('Semaine 10.xlsx', df) == WEEK
+
+
+# Semaine déduite du contenu (nom sans année) : un second import du même lot ne
+# réécrit rien
+def test_repeated_bulk_import_is_unchanged(store_dir):
+    sources = [('Semaine 10.xlsx', export_bytes([export_row(n) for n in range(6)]))]
+    first = ingest_many(sources, 8235, max_workers=1)
+    assert [(r['semaine'], r['statut']) for r in first] == [('2025-S10', 'sauvegardé')]
+    version = store.week_version(WEEK)
+    second = ingest_many(sources, 8235, max_workers=1)
+    assert [(r['semaine'], r['statut']) for r in second] == [('2025-S10', 'inchangé')]
+    assert store.week_version(WEEK) == version
+
+
+def test_bulk_import_survives_impossible_week_names(store_dir):
+    sources = [('Export_2025_S53.xlsx', export_bytes([export_row(n) for n in range(3)])),
+               ('Export_2025_S11.xlsx', export_bytes([export_row(n) for n in range(4)]))]
+    results = ingest_many(sources, 8235, max_workers=1)
+    assert [(r['fichier'], r['semaine'], r['statut']) for r in results] == [
+        ('Export_2025_S53.xlsx', '2025-S10', 'sauvegardé'),
+        ('Export_2025_S11.xlsx', '2025-S11', 'sauvegardé')]
+    assert store.stored_periods() == [Period(2025, 11), WEEK]
+
+
+# Pages de rapport : une semaine déjà enregistrée (lignes ajoutées et TO compris)
+# n'est remplacée que sur demande
+def test_report_keeps_stored_week_unless_replaced(store_dir):
+    first = export_bytes([export_row(n) for n in range(4)])
+    daily = export_bytes([export_row(n) for n in range(4, 6)])
+    one_day = export_bytes([export_row(n) for n in range(2)])
+    assert ingest_report(first, WEEK, 8235)[0] == 'sauvegardé'
+    assert ingest_upload(daily, WEEK, 8235, append=True)[0] == 'ajouté'
+    version = store.week_version(WEEK)
+
+    assert ingest_report(first, WEEK, 168)[0] == 'non enregistré'
+    status, df, _ = ingest_report(one_day, WEEK, 168)
+    assert status == 'non enregistré' and len(df) == 2 and set(df['Semaine']) == {WEEK.label}
+    assert store.week_version(WEEK) == version and store.week_TO(WEEK) == 8235
+    assert store.week_totals(WEEK)['NB'] == 6
+
+    assert ingest_report(one_day, WEEK, 168, replace=True)[0] == 'sauvegardé'
+    assert store.week_totals(WEEK)['NB'] == 2 and store.week_TO(WEEK) == 168
+    assert ingest_report(one_day, WEEK, 8235)[0] == 'inchangé'
+
+
+# Import groupé d'exports donnés par leur chemin : chaque processus (spawn) lit son
+# fichier ; un second passage les reconnaît à leur empreinte sans les relire
+def test_bulk_import_reads_paths_in_workers(store_dir):
+    paths = []
+    for week, rows in ((10, 3), (11, 5)):
+        path = store_dir / f'Export_2025_S{week}.xlsx'
+        path.write_bytes(export_bytes([export_row(n) for n in range(rows)]))
+        paths.append(str(path))
+    results = ingest_many([(path, path) for path in paths], 8235, max_workers=2)
+    assert [(r['semaine'], r['statut'], r['lignes']) for r in results] == [
+        ('2025-S10', 'sauvegardé', 3), ('2025-S11', 'sauvegardé', 5)]
+    results = ingest_many([(path, path) for path in paths], 8235, max_workers=2)
+    assert [r['statut'] for r in results] == ['inchangé', 'inchangé']
+
+
+# Sous Streamlit, le module principal est la page : les processus de l'import groupé
+# ne doivent pas la réexécuter
+def test_bulk_import_does_not_rerun_main_script(store_dir, monkeypatch):
+    page = store_dir / 'page.py'
+    page.write_text("raise SystemExit('page réexécutée')\n", encoding='utf-8')
+    main = types.ModuleType('__main__')
+    main.__file__ = str(page)
+    monkeypatch.setitem(sys.modules, '__main__', main)
+    sources = [('Export_2025_S10.xlsx', export_bytes([export_row(n) for n in range(3)]))]
+    assert [r['statut'] for r in ingest_many(sources, 8235, max_workers=1)] == ['sauvegardé']
+    assert sys.modules['__main__'] is main
+
+
+def test_blank_delay_time_column_is_accepted(store_dir):
+    data = export_bytes([export_row(n, delay=None) for n in range(4)])
+    df, quarantined, _ = clean_export(io.BytesIO(data))
+    assert len(df) == 4 and quarantined.empty
+    assert 'Delay Time' not in df.columns
+    assert ingest_upload(data, WEEK, 8235)[0] == 'sauvegardé'
+
+
+# Import groupé : chaque fichier rapporte ses avertissements, affichés par la page
+def test_bulk_import_reports_warnings(store_dir):
+    sources = [('Export_2025_S10.xlsx', export_bytes([export_row(n) for n in range(3)]
+                                                      + [export_row(3, machine=None)]))]
+    [result] = ingest_many(sources, 8235, max_workers=1)
+    assert result['statut'] == 'sauvegardé'
+    assert any('sans machine' in warning for warning in result['avertissements'])
+
+
+def test_daily_exports_append_without_duplicates(store_dir):
+    first = export_bytes([export_row(n) for n in range(0, 100)])
+    second = export_bytes([export_row(n) for n in range(50, 150)])
+    assert ingest_upload(first, WEEK, 8235, append=True)[0] == 'ajouté'
+    status, added, _ = ingest_upload(second, WEEK, 8235, append=True)
+    assert status == 'ajouté' and len(added) == 50
+    assert store.week_totals(WEEK)['NB'] == 150
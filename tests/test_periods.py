@@ -0,0 +1,28 @@
+from datetime import date
+
+import pytest
+
+from periods import Period, make_period, parse_label, period_of, periods_in_month, shift, weeks_in_year
+
+
+def test_make_period_checks_the_week_exists():
+    assert weeks_in_year(2025) == 52 and weeks_in_year(2026) == 53
+    assert make_period(2026, 53) == Period(2026, 53)
+    with pytest.raises(ValueError):
+        make_period(2025, 53)
+    with pytest.raises(ValueError):
+        make_period(2025, 0)
+
+
+# Semaine à cheval sur deux années : année ISO et mois de son jeudi
+def test_period_year_and_month_follow_thursday():
+    period = period_of(date(2024, 12, 30))
+    assert period == Period(2025, 1)
+    assert period.label == '2025-S01' and period.month == '2025-01'
+    assert shift(period, -1) == Period(2024, 52)
+    assert parse_label('2025-S01') == period and parse_label('S01') is None
+
+
+def test_periods_in_month():
+    assert periods_in_month('2025-03') == [Period(2025, week) for week in range(10, 14)]
+    assert periods_in_month('2026-12')[-1] == Period(2026, 53)
@@ -0,0 +1,247 @@
+import os
+import threading
+from datetime import date, time
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+import store
+from conftest import random_week, week_frame
+from periods import Period
+
+
+def _write_in_process(folder, week):
+    os.chdir(folder)
+    period = Period(2025, week)
+    store.write_week(period, random_week(period, 50, week), 8235)
+
+
+# Écritures concurrentes de plusieurs processus : aucune semaine n'est perdue
+def test_concurrent_writers_keep_every_week(store_dir):
+    context = get_context('fork')
+    workers = [context.Process(target=_write_in_process, args=(str(store_dir), week))
+               for week in range(1, 9)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert sorted(store.stored_periods()) == [Period(2025, week) for week in range(1, 9)]
+    assert len(store.store_versions()) == 8
+
+
+# Compactage de mois dont une colonne change de type d'une semaine à l'autre : la
+# colonne passe en texte dans le fichier du mois, les arrêts restent identiques
+def test_compaction_unifies_mixed_column_types(store_dir):
+    weeks = {Period(2025, week): random_week(Period(2025, week), 30, week) for week in (2, 3, 6, 7)}
+    weeks[Period(2025, 3)]['Order'] = weeks[Period(2025, 3)]['Order'].astype(str)
+    for period, df in weeks.items():
+        store.write_week(period, df, 8235)
+
+    written = store.compact(Period(2025, 20))
+    assert [os.path.dirname(path) for path in written] == [
+        os.path.join(store.MONTHLY_DIR, 'annee=2025', 'mois=01'),
+        os.path.join(store.MONTHLY_DIR, 'annee=2025', 'mois=02')]
+    for period, df in weeks.items():
+        stored = store.read_week(period).sort_values('Start Time', ignore_index=True)
+        expected = df.sort_values('Start Time', ignore_index=True)
+        assert stored['Order'].astype(str).tolist() == expected['Order'].astype(str).tolist()
+        assert np.isclose(stored['Down Time'].sum(), expected['Down Time'].sum())
+    assert store.compact(Period(2025, 20)) == []
+
+
+# Un mois qui ne peut être compacté reste hebdomadaire sans bloquer les suivants
+def test_compaction_error_skips_only_its_month(store_dir, monkeypatch):
+    for week in (2, 6):
+        store.write_week(Period(2025, week), random_week(Period(2025, week), 10, week), 8235)
+    write_compacted = store._write_compacted
+
+    def failing(path, periods, manifest):
+        if 'mois=01' in path:
+            raise OSError("disque plein")
+        return write_compacted(path, periods, manifest)
+
+    monkeypatch.setattr(store, '_write_compacted', failing)
+    errors = []
+    written = store.compact(Period(2025, 20), errors=errors)
+    assert len(written) == 1 and 'mois=02' in written[0]
+    assert errors == [(os.path.join(store.MONTHLY_DIR, 'annee=2025', 'mois=01'), "disque plein")]
+    assert len(store.read_week(Period(2025, 2))) == 10
+
+
+# Les pages recréent leur LazyHistory à chaque réexécution : une semaine déjà
+# convertie pour sa génération est reprise de la mémoire, jusqu'à sa réécriture
+def test_pages_reuse_weeks_loaded_for_their_generation(store_dir, monkeypatch):
+    period = Period(2025, 10)
+    store.write_week(period, random_week(period, 40, 1), 8235)
+    week_frame = store._week_frame
+    calls = []
+
+    def counted(period, *args):
+        calls.append(period)
+        return week_frame(period, *args)
+
+    monkeypatch.setattr(store, '_week_frame', counted)
+
+    for _ in range(3):
+        df, TO = store.LazyHistory().week(period.label)
+        df['Ajout'] = 1
+    assert len(store.load_week(period)[0]) == 40 and 'Ajout' not in store.load_week(period)[0]
+    assert calls == [period]
+    store.LazyHistory(columns=['Down Time'])[period.label]
+    assert calls == [period, period]
+
+    store.append_week(period, random_week(period, 5, 2), 8235)
+    assert len(store.load_week(period)[0]) == 45
+    assert calls == [period, period, period]
+    assert [key[1] for key in store._history_cache] == [store.week_version(period)]
+
+
+# La quarantaine est versionnée avec sa semaine : un retour en arrière de la semaine
+# ou de tout l'historique la retrouve, le nettoyage garde celles encore référencées
+def test_quarantine_follows_week_versions(store_dir):
+    period = Period(2025, 10)
+    store.write_week(period, random_week(period, 20, 1), 8235, random_week(period, 2, 2))
+    first = store.week_version(period)
+    store.write_week(period, random_week(period, 20, 3), 8235)
+    assert store.read_quarantine(period).empty
+
+    store.rollback_week(period, first)
+    assert len(store.read_quarantine(period)) == 2
+    store.append_week(period, random_week(period, 5, 4), 8235, random_week(period, 3, 5))
+    assert len(store.read_quarantine(period)) == 5
+
+    before_reset = store.store_versions()['generation'].iloc[0]
+    store.clear_store()
+    store._collector['thread'].join()
+    assert store.read_quarantine(period).empty
+    store.rollback_store(before_reset)
+    assert len(store.read_quarantine(period)) == 5
+
+    store.collect_garbage(keep=1)
+    assert len(store.read_quarantine(period)) == 5
+    assert len(os.listdir(os.path.join(store.QUARANTINE_DIR, 'annee=2025', 'semaine=10'))) == 1
+
+
+# Un import groupé publie ses semaines et leurs quarantaines en une seule version
+def test_write_weeks_publishes_quarantines_together(store_dir):
+    periods = [Period(2025, week) for week in (10, 11)]
+    store.write_weeks({p: random_week(p, 10, p.week) for p in periods}, 8235,
+                      {periods[0]: random_week(periods[0], 2, 1)})
+    assert len(store.store_versions()) == 1
+    assert len(store.read_quarantine(periods[0])) == 2 and store.read_quarantine(periods[1]).empty
+
+
+# Anciennes pages : 'Down Time' déjà converti en heures, 'Delay Time' resté en
+# datetime.time. Seule la colonne non numérique est convertie, la quarantaine de la
+# semaine suit ses données
+def test_legacy_pickle_keeps_converted_hours(store_dir):
+    period = Period(2025, 10)
+    os.makedirs(store.DATA_DIR)
+    os.makedirs(store.QUARANTINE_DIR)
+    pd.DataFrame({
+        'Date': [date(2025, 3, 3)] * 2,
+        'Machine': 'KOMAX 01',
+        'Type Of Failure': 'CAPTEUR',
+        'Microstop Description': 'Capteur sale',
+        'Start Time': ['06:00:00', '07:00:00'],
+        'Down Time': [0.5, 1.5],
+        'Delay Time': [time(0, 10), time(0, 30)],
+    }).to_pickle(os.path.join(store.DATA_DIR, 'week_10.pkl'))
+    week_frame(1).to_pickle(os.path.join(store.QUARANTINE_DIR, 'week_10.pkl'))
+
+    # Conversion faite à la première lecture du catalogue
+    assert store.stored_periods() == [period]
+    df = store.read_week(period)
+    assert df['Down Time'].tolist() == [0.5, 1.5]
+    assert np.allclose(df['Delay Time'], [1 / 6, 0.5])
+    assert np.allclose(df['T, I'], [1 / 3, 1.0])
+    assert len(store.read_quarantine(period)) == 1
+    assert not os.path.exists(os.path.join(store.DATA_DIR, 'week_10.pkl'))
+    assert not os.path.exists(os.path.join(store.QUARANTINE_DIR, 'week_10.pkl'))
+
+
+# Exports journaliers qui se recouvrent, dont un sans 'Delay Time' : seules les
+# nouvelles lignes sont ajoutées
+def test_append_deduplicates_overlapping_rows(store_dir):
+    period = Period(2025, 10)
+    store.append_week(period, week_frame(100), 8235)
+    added = store.append_week(period, week_frame(100, start=50).drop(columns='Delay Time'), 8235)
+    assert len(added) == 50
+    assert store.week_totals(period)['NB'] == 150
+    assert store.append_week(period, week_frame(20, start=10), 8235).empty
+    assert len(store.read_week(period)) == 150
+
+
+# Le cumul du mois suit les écritures et les ajouts de ses semaines
+def test_month_summary_follows_writes(store_dir):
+    period = Period(2025, 10)
+    store.write_week(period, week_frame(4), 8235)
+    assert store.month_summary('2025-03')['NB'] == 4
+    store.append_week(period, week_frame(2, start=4), 8235)
+    summary = store.month_summary('2025-03')
+    assert summary['NB'] == 6 and summary['semaines'] == [period.label]
+    assert store.month_failures('2025-03')['NB'].tolist() == [6]
+
+
+# Historique vide (catalogue reconstruit sans semaine) : aucun mois, sans erreur
+def test_month_summaries_of_empty_store(store_dir):
+    assert store.month_summaries().empty
+    assert store.month_summary('2025-03') is None
+
+
+# Cache Arrow partagé : une copie par version de semaine, écrite au premier accès,
+# reprise telle quelle par un autre processus et remplacée quand la semaine est réécrite
+def test_shared_cache_keeps_one_file_per_week_version(store_dir):
+    period = Period(2025, 10)
+    df = random_week(period, 40, 1)
+    store.write_week(period, df, 8235)
+    loaded, TO = store.load_week(period)
+    assert TO == 8235 and np.isclose(loaded['Down Time'].sum(), df['Down Time'].sum())
+    first = f'{period.label}-{store.week_version(period)}.arrow'
+    assert os.listdir(store.SHARED_CACHE_DIR) == [first]
+
+    # Autre processus : mappe le fichier existant sans le réécrire
+    path = os.path.join(store.SHARED_CACHE_DIR, first)
+    written = os.stat(path).st_mtime_ns
+    store._mapped.clear()
+    store.clear_history_cache()
+    pd.testing.assert_frame_equal(store.load_week(period)[0], loaded)
+    assert os.stat(path).st_mtime_ns == written
+
+    store.write_week(period, random_week(period, 10, 2), 8235)
+    assert len(store.load_week(period)[0]) == 10
+    assert os.listdir(store.SHARED_CACHE_DIR) == [f'{period.label}-{store.week_version(period)}.arrow']
+
+
+# Historique à la demande : la liste et le résumé viennent du catalogue, seule la
+# semaine consultée est lue ; prefetch prépare ses voisines dans le cache partagé
+def test_lazy_history_reads_only_selected_weeks(store_dir, monkeypatch):
+    periods = [Period(2025, week) for week in range(10, 15)]
+    for period in periods:
+        store.write_week(period, random_week(period, 20 + period.week, period.week), 8235)
+    week_frame = store._week_frame
+    calls = []
+
+    def counted(period, *args):
+        calls.append(period)
+        return week_frame(period, *args)
+
+    monkeypatch.setattr(store, '_week_frame', counted)
+
+    history = store.LazyHistory(weeks_back=4)
+    assert len(history) == 4 and list(history) == ['2025-S14', '2025-S13', '2025-S12', '2025-S11']
+    assert '2025-S10' not in history and '2025-S12' in history
+    assert history.summary['lignes'].tolist() == [34, 33, 32, 31]
+    assert calls == []
+    assert len(history['2025-S12']['df']) == 32 and history['2025-S12']['Mois'] == '2025-03'
+    assert calls == [Period(2025, 12)]
+
+    history.prefetch('2025-S12')
+    for thread in threading.enumerate():
+        if thread.name == 'prechargement-semaines':
+            thread.join()
+    assert sorted(os.listdir(store.SHARED_CACHE_DIR)) == [
+        f'{label}-{store.week_version(Period(2025, week))}.arrow'
+        for label, week in (('2025-S11', 11), ('2025-S12', 12), ('2025-S13', 13))]
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+import store
+import watcher
+from conftest import export_bytes, export_row
+from periods import Period
+
+WEEK = Period(2025, 10)
+
+
+class _Stop(Exception):
+    pass
+
+
+# Passages de la boucle de surveillance, arrêtée après passes intervalles
+def _watch(folder, passes, monkeypatch, **options):
+    calls = []
+
+    def sleep(seconds):
+        calls.append(seconds)
+        if len(calls) == passes:
+            raise _Stop
+
+    monkeypatch.setattr(watcher.time, 'sleep', sleep)
+    with pytest.raises(_Stop):
+        watcher.watch(str(folder), 8235, settle=0, compaction=0, **options)
+
+
+# Un export déposé est importé une fois stable (vu inchangé à deux passages), un
+# fichier de verrouillage Excel est ignoré
+def test_watch_imports_settled_exports(store_dir, monkeypatch):
+    folder = store_dir / 'depot'
+    folder.mkdir()
+    (folder / 'Export_2025_S10.xlsx').write_bytes(export_bytes([export_row(n) for n in range(4)]))
+    (folder / '~$Export_2025_S10.xlsx').write_bytes(b'')
+
+    _watch(folder, 1, monkeypatch)
+    assert store.stored_periods() == []
+    _watch(folder, 2, monkeypatch)
+    assert store.stored_periods() == [WEEK]
+    assert store.week_totals(WEEK)['NB'] == 4
+
+
+# Nom sans semaine : période lue dans le classeur. Exports journaliers ajoutés
+def test_ingest_drop_appends_daily_exports(store_dir):
+    first = store_dir / 'arrets du jour.xlsx'
+    first.write_bytes(export_bytes([export_row(n) for n in range(3)]))
+    assert watcher.ingest_drop(str(first), 8235, append=True)[:2] == (WEEK, 'ajouté')
+    first.write_bytes(export_bytes([export_row(n) for n in range(2, 6)]))
+    assert watcher.ingest_drop(str(first), 8235, append=True)[:2] == (WEEK, 'ajouté')
+    assert store.week_totals(WEEK)['NB'] == 6
+
+
+# Erreur de compactage seulement journalisée
+def test_compact_store_logs_errors(store_dir, monkeypatch, caplog):
+    def failing(now=None, errors=None):
+        errors.append(('monthly_data/annee=2025/mois=01', "disque plein"))
+        return []
+
+    monkeypatch.setattr(watcher, 'compact', failing)
+    with caplog.at_level(logging.ERROR, logger='watcher'):
+        watcher.compact_store()
+    assert "disque plein" in caplog.text
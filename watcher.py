@@ -0,0 +1,134 @@
+# Service d'import automatique des exports MES déposés dans un dossier
+#
+# Le dossier de dépôt est scruté à intervalle régulier. Un fichier .xlsx nouveau
+# ou modifié n'est importé qu'une fois sa taille et sa date de modification stables
+# pendant le délai de stabilité (copie ou téléchargement terminé). L'import passe
+# par le même pipeline que les pages (ingest_upload) : un export déjà importé est
+# reconnu à son empreinte et ne réécrit rien. Avec --ajout (exports journaliers),
+# chaque export complète sa semaine au lieu de la remplacer.
+#
+# Le service compacte aussi l'historique au démarrage puis toutes les --compactage
+# heures : les semaines des mois et des années terminés sont regroupées par mois et
+# par année (store.compact), puis supprime les anciennes versions de l'historique
+# au-delà de celles conservées (store.collect_garbage).
+#
+# Usage : python watcher.py [--dossier depot_mes] [--to 8235] [--intervalle 2] [--stabilite 3] [--ajout]
+#                           [--compactage 24]
+import argparse
+import io
+import logging
+import os
+import time
+
+from ingest import clean_export, infer_period, ingest_upload, list_exports
+from store import collect_garbage, compact
+
+DROP_DIR = os.environ.get('INOVER_DEPOT', 'depot_mes')
+
+log = logging.getLogger('watcher')
+
+
+# Signature d'un fichier : (taille, date de modification), None s'il a disparu
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+# Import d'un export déposé, la période étant déduite du nom ou du contenu
+def ingest_drop(path, TO, append=False):
+    with open(path, 'rb') as f:
+        data = f.read()
+    period = infer_period(path)
+    if period is None:
+        df, _, _ = clean_export(io.BytesIO(data))
+        period = infer_period(path, df)
+    if period is None:
+        raise ValueError("Numéro de semaine introuvable (nom du fichier ou colonne Date)")
+    status, _, warnings = ingest_upload(data, period, TO, append=append)
+    return period, status, warnings
+
+
+# Compactage de l'historique puis nettoyage des anciennes versions, les erreurs
+# étant seulement journalisées (un mois en erreur n'empêche pas les suivants)
+def compact_store():
+    try:
+        errors = []
+        for path in compact(errors=errors):
+            log.info("Compactage : %s", path)
+        for folder, error in errors:
+            log.error("Compactage de %s : %s", folder, error)
+        removed = collect_garbage()
+        if removed:
+            log.info("Nettoyage : %d fichiers supprimés", removed)
+    except Exception as e:
+        log.error("Compactage : %s", e)
+
+
+# Boucle de surveillance du dossier de dépôt. compaction : intervalle entre deux
+# compactages de l'historique (heures, 0 pour ne pas compacter)
+def watch(folder, TO, interval=2.0, settle=3.0, append=False, compaction=24.0):
+    os.makedirs(folder, exist_ok=True)
+    log.info("Surveillance de %s (toutes les %g s)", os.path.abspath(folder), interval)
+    pending = {}  # chemin -> (signature, instant où elle a été vue pour la première fois)
+    done = {}     # chemin -> signature déjà importée
+    compacted = None  # instant du dernier compactage
+
+    while True:
+        now = time.monotonic()
+        if compaction and (compacted is None or now - compacted >= compaction * 3600):
+            compact_store()
+            compacted = now
+        paths = set(list_exports(folder))
+        for path in paths:
+            signature = _signature(path)
+            if signature is None or done.get(path) == signature:
+                continue
+            seen = pending.get(path)
+            if seen is None or seen[0] != signature:
+                pending[path] = (signature, now)
+                continue
+            if now - seen[1] < settle:
+                continue
+
+            del pending[path]
+            done[path] = signature
+            try:
+                period, status, warnings = ingest_drop(path, TO, append)
+                log.info("%s : semaine %s %s", os.path.basename(path), period.label, status)
+                for warning in warnings:
+                    log.warning("%s : %s", os.path.basename(path), warning)
+            except Exception as e:
+                log.error("%s : %s", os.path.basename(path), e)
+
+        for path in set(pending) - paths:
+            del pending[path]
+        for path in set(done) - paths:
+            del done[path]
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import automatique des exports MES")
+    parser.add_argument('--dossier', default=DROP_DIR, help="Dossier de dépôt des exports")
+    parser.add_argument('--to', type=float, default=8235, help="Temps d'ouverture (heures) des semaines importées")
+    parser.add_argument('--intervalle', type=float, default=2.0, help="Intervalle de scrutation (secondes)")
+    parser.add_argument('--stabilite', type=float, default=3.0,
+                        help="Durée sans modification avant import d'un fichier (secondes)")
+    parser.add_argument('--ajout', action='store_true',
+                        help="Ajouter les exports à leur semaine au lieu de la remplacer (exports journaliers)")
+    parser.add_argument('--compactage', type=float, default=24.0,
+                        help="Intervalle entre deux compactages de l'historique (heures, 0 pour désactiver)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        watch(args.dossier, args.to, args.intervalle, args.stabilite, args.ajout, args.compactage)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()